@@ -4,6 +4,7 @@ Baromètre de visibilité médiatique - Municipales Paris 2026
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
@@ -11,13 +12,25 @@ import requests
 import json
 import re
 import math
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from urllib.parse import quote_plus
 import xml.etree.ElementTree as ET
-from collections import Counter
+from collections import Counter, OrderedDict
+from bisect import bisect_left, bisect_right
+from email.utils import parsedate_to_datetime
 import anthropic
 import logging
 import sys
+import os
+import time
+import gzip
+import base64
+import hashlib
+import heapq
+import argparse
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuration logging pour Streamlit Cloud
 logging.basicConfig(
@@ -397,58 +410,264 @@ MEDIAS_TV_RADIO = [
     "Arte", "Public Sénat", "LCP", "C8", "TMC", "Sud Radio"
 ]
 
+# Variantes d'écriture des médias TV/Radio (sources Google News, titres)
+MEDIAS_TV_RADIO_ALIASES = {
+    "BFMTV": ["BFM TV"],
+    "France Info": ["Franceinfo"],
+    "France 24": ["France24"],
+    "Europe 1": ["Europe1"],
+    "Public Sénat": ["Publicsenat"],
+}
+
+# Chaînes YouTube de médias reconnus (match sur mots entiers, accents ignorés)
+KNOWN_MEDIA_CHANNELS = [
+    "bfm", "bfmtv", "cnews", "lci", "tf1", "rmc", "europe 1", "europe1", "rtl",
+    "france 2", "france 3", "france 5", "france 24", "france inter", "france info",
+    "franceinfo", "france culture", "france tv", "francetv", "sud radio", "lcp",
+    "figaro", "le monde", "parisien", "l'obs", "nouvel obs", "l'express", "le point", "marianne",
+    "public sénat", "c dans l'air", "quotidien", "touche pas", "hanouna",
+    "morandini", "praud", "zemmour", "ruquier", "ardisson", "bourdin",
+    "pujadas", "calvi", "elkabbach", "aphatie", "joffrin", "onfray",
+    "mediapart", "brut", "konbini", "hugodecrypte", "blast", "frontières",
+    "livre noir", "thinkerview", "interdit", "femelliste", "front populaire"
+]
+
 # =============================================================================
 # PERSISTANCE CLOUD (JSONBin.io)
 # =============================================================================
 
 JSONBIN_API_URL = "https://api.jsonbin.io/v3/b"
+JSONBIN_MAX_BYTES = 100 * 1024      # Taille max d'un bin (offre gratuite)
+HISTORY_CLOUD_FORMAT = "history-segments-v1"
+
+# Format segmenté : l'historique est découpé par mois, chaque segment est compressé (gzip +
+# base64) et identifié par un hash. Le bin principal porte le manifeste {mois: {hash, bin}} et
+# le mois en cours ; les mois précédents sont regroupés dans des bins annexes créés au besoin. Une
+# synchronisation ne réécrit que les bins dont un segment a changé, une lecture ne télécharge
+# que les bins dont les hashes sont inconnus. L'ancien format (liste complète) reste lisible.
+
+
+@st.cache_resource(show_spinner=False)
+def get_history_sync_store() -> Dict:
+    """État partagé de la synchronisation cloud : file d'attente, manifestes, segments connus et
+    résultat du dernier envoi, par bin"""
+    return {"lock": threading.Lock(), "idle": threading.Condition(), "pending": {}, "thread": None,
+            "manifests": {}, "segments": {}, "results": {}}
+
+
+def encode_history_segment(entries: List[Dict]) -> Tuple[str, str]:
+    """Segment compressé (gzip + base64) et hash de son contenu"""
+    raw = json.dumps(entries, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode()
+    return base64.b64encode(gzip.compress(raw, mtime=0)).decode(), hashlib.md5(raw).hexdigest()
+
+
+def decode_history_segment(payload: str) -> List[Dict]:
+    """Décompresse un segment"""
+    return json.loads(gzip.decompress(base64.b64decode(payload)))
+
+
+def _jsonbin_request(method: str, url: str, api_key: str, payload=None, etag: Optional[str] = None):
+    """Requête JSONBin (None en cas d'erreur réseau)"""
+    headers = {"X-Master-Key": api_key}
+    if etag:
+        headers["If-None-Match"] = etag
+    try:
+        if method == "GET":
+            return requests.get(url, headers=headers, timeout=10)
+        headers["Content-Type"] = "application/json"
+        if method == "POST":
+            headers["X-Bin-Private"] = "true"
+            return requests.post(url, headers=headers, json=payload, timeout=10)
+        return requests.put(url, headers=headers, json=payload, timeout=10)
+    except:
+        return None
 
-def load_history_cloud(bin_id: str, api_key: str) -> List[Dict]:
-    """Charge l'historique depuis JSONBin.io"""
+
+def load_history_cloud(bin_id: str, api_key: str, etag: Optional[str] = None) -> Dict:
+    """
+    Charge l'historique depuis JSONBin.io. Avec etag (validateur de la lecture précédente),
+    la requête est conditionnelle : not_modified=True si le bin principal n'a pas changé
+    (le manifeste qu'il porte change dès qu'un segment change). Seuls les bins annexes dont
+    un segment est inconnu sont téléchargés.
+    Retourne {"history": [...], "etag": ..., "not_modified": bool}.
+    """
+    empty = {"history": [], "etag": None, "not_modified": False}
     if not bin_id or not api_key:
-        return []
+        return empty
+
+    response = _jsonbin_request("GET", f"{JSONBIN_API_URL}/{bin_id}/latest", api_key, etag=etag)
+    if response is None:
+        return empty
+    if response.status_code == 304:
+        return {"history": [], "etag": etag, "not_modified": True}
+    if response.status_code != 200:
+        return empty
 
     try:
-        headers = {"X-Master-Key": api_key}
-        response = requests.get(
-            f"{JSONBIN_API_URL}/{bin_id}/latest",
-            headers=headers,
-            timeout=10
-        )
-        if response.status_code == 200:
-            data = response.json()
-            record = data.get("record", [])
-            if isinstance(record, list):
-                return record
-            return []
-    except Exception as e:
-        pass
+        record = response.json().get("record", [])
+        if isinstance(record, list):
+            # Ancien format : liste complète
+            return {"history": record, "etag": response.headers.get("ETag"), "not_modified": False}
+        if not isinstance(record, dict) or record.get("format") != HISTORY_CLOUD_FORMAT:
+            return empty
+
+        store = get_history_sync_store()
+        segments = record.get("segments", {})
+        payloads = dict(record.get("data", {}))
+        with store["lock"]:
+            known = dict(store["segments"].get(bin_id, {}))
+        missing_bins = {meta["bin"] for meta in segments.values() if meta["hash"] not in known and meta["bin"] != "root"}
+        for extra_bin in missing_bins:
+            extra = _jsonbin_request("GET", f"{JSONBIN_API_URL}/{extra_bin}/latest", api_key)
+            if extra is None or extra.status_code != 200:
+                return empty  # Historique partiel : on garde la copie locale
+            payloads.update(extra.json().get("record", {}).get("data", {}))
+
+        history = []
+        for key, meta in segments.items():
+            entries = known.get(meta["hash"])
+            if entries is None:
+                entries = decode_history_segment(payloads[key])
+                known[meta["hash"]] = entries
+            history.extend(entries)
+
+        with store["lock"]:
+            store["segments"][bin_id] = {meta["hash"]: known[meta["hash"]] for meta in segments.values()}
+            store["manifests"][bin_id] = segments
+        return {"history": history, "etag": response.headers.get("ETag"), "not_modified": False}
+    except:
+        return empty
 
-    return []
 
-def save_history_cloud(history: List[Dict], bin_id: str, api_key: str) -> bool:
-    """Sauvegarde l'historique sur JSONBin.io"""
+def save_history_cloud(history: List[Dict], bin_id: str, api_key: str, store: Optional[Dict] = None) -> bool:
+    """
+    Synchronise l'historique sur JSONBin.io au format segmenté : seuls les bins dont un
+    segment mensuel a changé sont réécrits ; un bin annexe est créé quand le bin principal
+    dépasserait JSONBIN_MAX_BYTES.
+    """
     if not bin_id or not api_key:
         return False
 
-    try:
-        cutoff = (datetime.now() - timedelta(days=60)).strftime("%Y-%m-%d")
-        history = [h for h in history if h.get("date", "") >= cutoff]
+    store = store or get_history_sync_store()
+    with store["lock"]:
+        previous = store["manifests"].get(bin_id)
+    if previous is None:
+        # Manifeste inconnu (premier envoi du processus) : relu depuis le bin principal
+        response = _jsonbin_request("GET", f"{JSONBIN_API_URL}/{bin_id}/latest", api_key)
+        if response is None or response.status_code != 200:
+            return False
+        record = response.json().get("record", [])
+        previous = record.get("segments", {}) if isinstance(record, dict) else {}
+
+    by_month = {}
+    for entry in compact_history(history):
+        by_month.setdefault(entry["date"][:7], []).append(entry)
+    encoded = {key: encode_history_segment(entries) for key, entries in by_month.items()}
+
+    # Affectation stable des segments aux bins. Le bin principal, réécrit à chaque envoi, ne
+    # garde que le mois en cours : le volume envoyé ne dépend pas de la longueur de l'historique
+    latest = max(encoded, default=None)
+    assignment = {key: previous[key]["bin"] for key in encoded
+                  if key in previous and (previous[key]["bin"] != "root" or key == latest)}
+    manifest_reserve = 1024 + 96 * len(encoded)
+
+    def bin_size(target):
+        return sum(len(encoded[k][0]) for k, b in assignment.items() if b == target)
+
+    def capacity(target):
+        return JSONBIN_MAX_BYTES - (manifest_reserve if target == "root" else 1024)
+
+    for key in sorted(encoded):
+        target = assignment.get(key)
+        if target is not None and bin_size(target) > capacity(target):
+            del assignment[key]  # Bin saturé : segment réaffecté
+    for key in sorted(encoded, reverse=True):
+        if key in assignment:
+            continue
+        size = len(encoded[key][0])
+        candidates = (["root"] if key == latest else []) + sorted({b for b in assignment.values() if b != "root"})
+        target = next((b for b in candidates if bin_size(b) + size <= capacity(b)), None)
+        if target is None:
+            response = _jsonbin_request("POST", JSONBIN_API_URL, api_key, {"format": HISTORY_CLOUD_FORMAT, "data": {}})
+            if response is None or response.status_code != 200:
+                return False
+            target = response.json().get("metadata", {}).get("id")
+        assignment[key] = target
+
+    manifest = {key: {"hash": encoded[key][1], "bin": assignment[key]} for key in encoded}
+    if manifest == previous:
+        return True
 
-        headers = {
-            "X-Master-Key": api_key,
-            "Content-Type": "application/json"
-        }
-        response = requests.put(
-            f"{JSONBIN_API_URL}/{bin_id}",
-            headers=headers,
-            json=history,
-            timeout=10
-        )
-        return response.status_code == 200
-    except Exception as e:
+    # Bins annexes touchés : segment modifié, ajouté ou retiré
+    touched = {meta["bin"] for key, meta in manifest.items() if previous.get(key) != meta}
+    touched |= {meta["bin"] for key, meta in previous.items() if manifest.get(key) != meta}
+    for target in sorted(touched - {"root"}):
+        data = {key: encoded[key][0] for key, b in assignment.items() if b == target}
+        response = _jsonbin_request("PUT", f"{JSONBIN_API_URL}/{target}", api_key,
+                                    {"format": HISTORY_CLOUD_FORMAT, "data": data})
+        if response is None or response.status_code != 200:
+            return False
+
+    # Bin principal en dernier : le manifeste ne référence que des segments déjà écrits
+    root = {
+        "format": HISTORY_CLOUD_FORMAT,
+        "updated": datetime.now().isoformat(),
+        "segments": manifest,
+        "data": {key: encoded[key][0] for key, b in assignment.items() if b == "root"}
+    }
+    response = _jsonbin_request("PUT", f"{JSONBIN_API_URL}/{bin_id}", api_key, root)
+    if response is None or response.status_code != 200:
         return False
 
+    with store["lock"]:
+        store["manifests"][bin_id] = manifest
+    return True
+
+
+def _history_sync_worker(store: Dict):
+    """Envoie les historiques en attente (le plus récent par bin) jusqu'à épuisement de la file"""
+    while True:
+        with store["lock"]:
+            if not store["pending"]:
+                store["thread"] = None
+                break
+            bin_id, (api_key, history) = store["pending"].popitem()
+        for attempt in range(3):
+            ok = save_history_cloud(history, bin_id, api_key, store)
+            if ok:
+                break
+            if attempt < 2:
+                time.sleep(5 * 2 ** attempt)
+        else:
+            logger.warning(f"[HISTORY SYNC] Échec de synchronisation du bin {bin_id}")
+        with store["lock"]:
+            store["results"][bin_id] = ok
+    with store["idle"]:
+        store["idle"].notify_all()
+
+
+def schedule_history_sync(history: List[Dict], bin_id: str, api_key: str):
+    """
+    Programme l'envoi en arrière-plan ; les sauvegardes rapprochées sont regroupées
+    (seule la dernière version en attente est envoyée).
+    """
+    if not bin_id or not api_key:
+        return
+    store = get_history_sync_store()
+    with store["lock"]:
+        store["pending"][bin_id] = (api_key, history)
+        store["results"].pop(bin_id, None)
+        if store["thread"] is None:
+            store["thread"] = threading.Thread(target=_history_sync_worker, args=(store,), daemon=True)
+            store["thread"].start()
+
+
+def wait_history_sync(timeout: float = 120) -> bool:
+    """Attend la fin des synchronisations en cours (processus en ligne de commande)"""
+    store = get_history_sync_store()
+    with store["idle"]:
+        return store["idle"].wait_for(lambda: store["thread"] is None, timeout)
+
 def get_cloud_config():
     """Récupère la config cloud depuis secrets ou session"""
     bin_id = None
@@ -473,6 +692,8 @@ def get_cloud_config():
 
 # Fichiers par défaut (seront surchargés selon le contexte)
 HISTORY_FILE = "history_paris.json"
+HISTORY_DAILY_DAYS = 60    # Résolution journalière
+HISTORY_WEEKLY_DAYS = 365  # Puis une entrée par semaine, une par mois au-delà
 YOUTUBE_CACHE_FILE = "youtube_cache_paris.json"
 TRENDS_CACHE_FILE = "trends_cache_paris.json"
 
@@ -494,6 +715,127 @@ def get_context_files(contexte: str) -> dict:
         }
 
 
+# =============================================================================
+# ENREGISTREMENTS COMPACTS - ARTICLES, VIDÉOS, MENTIONS TV/RADIO
+# =============================================================================
+
+class _Record:
+    """
+    Base des enregistrements compacts : __slots__ (pas de __dict__ par instance)
+    et chaînes répétitives (domaine, chaîne, média, date) internées.
+    Reste compatible avec l'accès dict utilisé partout : rec["title"], rec.get(...), "x" in rec.
+    Les fonctions st.cache_data continuent de renvoyer des dicts : la classe étant redéfinie
+    à chaque rerun du script, elle n'est pas retrouvable par pickle.
+    """
+    __slots__ = ()
+    _INTERNED = frozenset()
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        if key in self._INTERNED and isinstance(value, str):
+            value = sys.intern(value)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key, default)
+
+    def keys(self):
+        return [key for key in self.__slots__ if hasattr(self, key)]
+
+    def to_dict(self) -> Dict:
+        """Adaptateur de sérialisation (caches JSON)"""
+        return {key: getattr(self, key) for key in self.keys()}
+
+    @classmethod
+    def from_dict(cls, data: Dict):
+        """Adaptateur de désérialisation (les clés inconnues sont ignorées)"""
+        return cls(**{key: value for key, value in data.items() if key in cls.__slots__})
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Article(_Record):
+    """Article de presse (GDELT / Google News)"""
+    __slots__ = ("title", "url", "domain", "date", "source", "feed", "story_id")
+    _INTERNED = frozenset({"domain", "date", "source", "feed"})
+
+
+class Video(_Record):
+    """Vidéo YouTube"""
+    __slots__ = ("id", "title", "channel", "channel_id", "published", "url", "views", "likes",
+                 "comments", "duration", "is_short", "is_official", "source")
+    _INTERNED = frozenset({"channel", "channel_id", "published", "duration", "source"})
+
+
+class Mention(_Record):
+    """Mention TV/Radio"""
+    __slots__ = ("title", "source", "media", "date", "url")
+    _INTERNED = frozenset({"source", "media", "date"})
+
+
+def records_to_dicts(items: List) -> List[Dict]:
+    """Enregistrements -> dicts pour json.dump (les dicts déjà chargés passent tels quels)"""
+    return [item.to_dict() if hasattr(item, "to_dict") else item for item in items]
+
+
+# =============================================================================
+# INDEX DE DATES - DÉCOUPAGE PAR PÉRIODE EN O(log n)
+# =============================================================================
+
+def iso_to_ordinal(iso_date: str) -> Optional[int]:
+    """Convertit une date ISO ('YYYY-MM-DD...') en numéro de jour (date.toordinal), None si invalide"""
+    try:
+        return date.fromisoformat(iso_date[:10]).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def build_date_index(items: List[Dict], date_key: str) -> Dict:
+    """
+    Trie les items par date croissante et précalcule le tableau des jours (ordinaux).
+    Les items sans date valide sont écartés (ils ne tombent dans aucune période).
+    Retourne {"items": [...], "days": [...]} (listes alignées)
+    """
+    keyed = []
+    for item in items:
+        day = iso_to_ordinal(item.get(date_key) or "")
+        if day is not None:
+            keyed.append((day, item))
+    keyed.sort(key=lambda x: x[0])
+    return {"items": [item for _, item in keyed], "days": [day for day, _ in keyed]}
+
+
+def get_date_index(items: List[Dict], date_key: str, days: Optional[List[int]] = None) -> Dict:
+    """Réutilise l'index précalculé (items déjà triés + jours) ou le construit"""
+    if days is not None and len(days) == len(items):
+        return {"items": items, "days": days}
+    return build_date_index(items, date_key)
+
+
+def slice_date_index(index: Dict, start_date: date, end_date: date) -> List[Dict]:
+    """Items dont la date est dans [start_date, end_date] (bisect, aucun parsing par item)"""
+    lo = bisect_left(index["days"], start_date.toordinal())
+    hi = bisect_right(index["days"], end_date.toordinal())
+    return index["items"][lo:hi]
+
+
 # =============================================================================
 # CACHE YOUTUBE PERSISTANT + QUOTA MANAGEMENT
 # =============================================================================
@@ -610,6 +952,7 @@ def get_cached_youtube_data(candidate_name: str) -> Optional[Dict]:
     candidate_data = cache.get("data", {}).get(candidate_name)
 
     if candidate_data and candidate_data.get("videos"):
+        candidate_data["videos"] = [Video.from_dict(v) for v in candidate_data["videos"]]
         return candidate_data
 
     return None
@@ -625,8 +968,11 @@ def set_cached_youtube_data(candidate_name: str, data: Dict):
     if "data" not in cache:
         cache["data"] = {}
 
+    # Stockage trié par date + jours précalculés (découpage par période en bisect)
+    index = build_date_index(data.get("videos", []), "published")
     cache["data"][candidate_name] = {
-        "videos": data.get("videos", []),
+        "videos": records_to_dicts(index["items"]),
+        "days": index["days"],
         "official_channel": data.get("official_channel"),
         "fetched_at": datetime.now().isoformat()
     }
@@ -634,53 +980,34 @@ def set_cached_youtube_data(candidate_name: str, data: Dict):
     save_youtube_cache(cache)
 
 
-def filter_youtube_videos_by_period(videos: List[Dict], start_date: date, end_date: date) -> List[Dict]:
-    """Filtre les vidéos par période (côté client)"""
-    filtered = []
-    for v in videos:
-        try:
-            pub_date = datetime.strptime(v.get("published", "")[:10], "%Y-%m-%d").date()
-            if start_date <= pub_date <= end_date:
-                filtered.append(v)
-        except:
-            pass
-    return filtered
+def filter_youtube_videos_by_period(videos: List[Dict], start_date: date, end_date: date,
+                                    days: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Filtre les vidéos par période (côté client).
+    Si days est fourni (vidéos triées par date + jours du cache), simple découpage bisect.
+    Retourne les vidéos triées par vues décroissantes.
+    """
+    filtered = slice_date_index(get_date_index(videos, "published", days), start_date, end_date)
+    return sorted(filtered, key=lambda v: v.get("views", 0), reverse=True)
 
 
 def compute_youtube_stats_from_videos(videos: List[Dict]) -> Dict:
-    """Calcule les stats YouTube à partir d'une liste de vidéos filtrées"""
-    total_views = 0
-    total_likes = 0
-    total_comments = 0
-    shorts_views = 0
-    shorts_likes = 0
-    shorts_comments = 0
-    long_views = 0
-    long_likes = 0
-    long_comments = 0
-    shorts_count = 0
-    long_count = 0
-
-    for v in videos:
-        views = v.get("views", 0)
-        likes = v.get("likes", 0)
-        comments = v.get("comments", 0)
-        is_short = v.get("is_short", False)
-
-        total_views += views
-        total_likes += likes
-        total_comments += comments
-
-        if is_short:
-            shorts_views += views
-            shorts_likes += likes
-            shorts_comments += comments
-            shorts_count += 1
-        else:
-            long_views += views
-            long_likes += likes
-            long_comments += comments
-            long_count += 1
+    """Calcule les stats YouTube à partir d'une liste de vidéos filtrées (colonnes numpy, comme la table des mentions)"""
+    n = len(videos)
+    views = np.fromiter((v.get("views", 0) for v in videos), dtype=np.int64, count=n)
+    likes = np.fromiter((v.get("likes", 0) for v in videos), dtype=np.int64, count=n)
+    comments = np.fromiter((v.get("comments", 0) for v in videos), dtype=np.int64, count=n)
+    is_short = np.fromiter((bool(v.get("is_short", False)) for v in videos), dtype=bool, count=n)
+
+    shorts_count = int(is_short.sum())
+    total_views, total_likes, total_comments = int(views.sum()), int(likes.sum()), int(comments.sum())
+    shorts_views = int(views[is_short].sum())
+    shorts_likes = int(likes[is_short].sum())
+    shorts_comments = int(comments[is_short].sum())
+    long_views = total_views - shorts_views
+    long_likes = total_likes - shorts_likes
+    long_comments = total_comments - shorts_comments
+    long_count = n - shorts_count
 
     return {
         "available": len(videos) > 0,
@@ -743,7 +1070,10 @@ def is_press_cache_valid() -> bool:
 def get_cached_press_data(candidate_name: str) -> Optional[Dict]:
     """Récupère les articles en cache pour un candidat"""
     cache = load_press_cache()
-    return cache.get("data", {}).get(candidate_name)
+    candidate_data = cache.get("data", {}).get(candidate_name)
+    if candidate_data:
+        candidate_data["articles"] = [Article.from_dict(a) for a in candidate_data.get("articles", [])]
+    return candidate_data
 
 
 def set_cached_press_data(candidate_name: str, articles: List[Dict]):
@@ -752,8 +1082,11 @@ def set_cached_press_data(candidate_name: str, articles: List[Dict]):
     if "data" not in cache:
         cache["data"] = {}
 
+    # Stockage trié par date + jours précalculés (découpage par période en bisect)
+    index = build_date_index(articles, "date")
     cache["data"][candidate_name] = {
-        "articles": articles,
+        "articles": records_to_dicts(index["items"]),
+        "days": index["days"],
         "fetched_at": datetime.now().isoformat()
     }
     cache["last_refresh"] = datetime.now().isoformat()
@@ -761,20 +1094,6 @@ def set_cached_press_data(candidate_name: str, articles: List[Dict]):
     save_press_cache(cache)
 
 
-def filter_press_by_period(articles: List[Dict], start_date: date, end_date: date) -> List[Dict]:
-    """Filtre les articles par période"""
-    filtered = []
-    start_str = start_date.strftime("%Y-%m-%d")
-    end_str = end_date.strftime("%Y-%m-%d")
-
-    for art in articles:
-        art_date = art.get("date", "")
-        if art_date and start_str <= art_date <= end_str:
-            filtered.append(art)
-
-    return filtered
-
-
 # =============================================================================
 # CACHE SENTIMENT - ANALYSE IA DES TITRES
 # =============================================================================
@@ -900,8 +1219,9 @@ def analyze_and_cache_sentiments(titles: List[str], candidate_name: str, api_key
     Analyse les titres qui ne sont pas encore en cache.
     Retourne le nombre de nouveaux titres analysés.
     """
-    # Filtrer les titres pas encore analysés
-    new_titles = [t for t in titles if get_cached_sentiment(t) is None]
+    # Filtrer les titres pas encore analysés (une seule lecture du cache)
+    titres = load_sentiment_cache().get("titres", {})
+    new_titles = [t for t in titles if (titres.get(get_title_hash(t)) or {}).get("score") is None]
 
     if not new_titles:
         logger.info(f"[SENTIMENT CACHE JSON] {candidate_name}: {len(titles)} titres déjà en cache")
@@ -925,81 +1245,549 @@ def analyze_and_cache_sentiments(titles: List[str], candidate_name: str, api_key
     return total_analyzed
 
 
-def get_sentiment_for_items(items: List[Dict], title_key: str = "title", weight_key: str = None) -> Dict:
+# =============================================================================
+# TABLE COLUMNAIRE DES MENTIONS - AGRÉGATS VECTORISÉS (NUMPY)
+# =============================================================================
+
+MENTION_SOURCE_PRESS = 0
+MENTION_SOURCE_YOUTUBE = 1
+
+SENTIMENT_POSITIVE_THRESHOLD = 0.2
+SENTIMENT_NEGATIVE_THRESHOLD = -0.2
+
+
+def build_mention_table(candidate_names: List[str], articles_by_name: Dict[str, List], videos_by_name: Dict[str, List]) -> Dict:
     """
-    Calcule le sentiment moyen pour une liste d'items.
-    Si weight_key est fourni, pondère par cette valeur.
-    Retourne {avg: float, positive: int, neutral: int, negative: int, total: int}
+    Construit la table columnaire des mentions : une ligne par article ou vidéo datée.
+    Colonnes NumPy : jour (ordinal), candidat (index), source, domaine/chaîne (code),
+    sujet (code), vues, likes, commentaires, short, sentiment (NaN si non analysé).
+    Les lignes sont triées par date au sein de chaque candidat ; "items" reste aligné pour l'affichage.
     """
-    scores = []
-    weights = []
-    positive = 0
-    neutral = 0
-    negative = 0
+    items, hashes = [], []
+    day, cand, source, domain, story = [], [], [], [], []
+    views, likes, comments, is_short = [], [], [], []
+    domain_codes, story_codes = {}, {}
+
+    for ci, name in enumerate(candidate_names):
+        press_index = build_date_index(articles_by_name.get(name) or [], "date")
+        for art, art_day in zip(press_index["items"], press_index["days"]):
+            items.append(art)
+            day.append(art_day)
+            cand.append(ci)
+            source.append(MENTION_SOURCE_PRESS)
+            dom = art.get("domain") or ""
+            domain.append(domain_codes.setdefault(dom, len(domain_codes)) if dom else -1)
+            story.append(story_codes.setdefault(art.get("story_id") or art.get("url", ""), len(story_codes)))
+            views.append(0)
+            likes.append(0)
+            comments.append(0)
+            is_short.append(False)
+        video_index = build_date_index(videos_by_name.get(name) or [], "published")
+        for vid, vid_day in zip(video_index["items"], video_index["days"]):
+            items.append(vid)
+            day.append(vid_day)
+            cand.append(ci)
+            source.append(MENTION_SOURCE_YOUTUBE)
+            channel = vid.get("channel") or ""
+            domain.append(domain_codes.setdefault(channel, len(domain_codes)) if channel else -1)
+            story.append(-1)
+            views.append(vid.get("views", 0))
+            likes.append(vid.get("likes", 0))
+            comments.append(vid.get("comments", 0))
+            is_short.append(bool(vid.get("is_short", False)))
 
     for item in items:
-        title = item.get(title_key, "")
-        if not title:
-            continue
+        title = item.get("title", "")
+        hashes.append(get_title_hash(title) if title else None)
+
+    table = {
+        "candidates": list(candidate_names),
+        "domains": list(domain_codes),
+        "items": items,
+        "title_hashes": hashes,
+        "day": np.array(day, dtype=np.int64),
+        "cand": np.array(cand, dtype=np.int64),
+        "source": np.array(source, dtype=np.int8),
+        "domain": np.array(domain, dtype=np.int64),
+        "story": np.array(story, dtype=np.int64),
+        "views": np.array(views, dtype=np.int64),
+        "likes": np.array(likes, dtype=np.int64),
+        "comments": np.array(comments, dtype=np.int64),
+        "is_short": np.array(is_short, dtype=bool),
+    }
+    refresh_mention_sentiment(table)
+    return table
 
-        score = get_cached_sentiment(title)
-        if score is None:
-            continue
 
-        weight = item.get(weight_key, 1) if weight_key else 1
-        scores.append(score)
-        weights.append(weight)
+def refresh_mention_sentiment(table: Dict):
+    """(Re)charge la colonne sentiment depuis le cache JSON (une seule lecture du fichier)"""
+    titres = load_sentiment_cache().get("titres", {})
+    scores = [(titres.get(h) or {}).get("score") if h else None for h in table["title_hashes"]]
+    table["sentiment"] = np.array([np.nan if sc is None else sc for sc in scores], dtype=np.float64)
 
-        if score > 0.2:
-            positive += 1
-        elif score < -0.2:
-            negative += 1
-        else:
-            neutral += 1
 
-    if not scores:
-        return {"avg": 0, "positive": 0, "neutral": 0, "negative": 0, "total": 0}
+@st.cache_resource(show_spinner=False)
+def get_mention_table_store() -> Dict:
+    """Tables de mentions par contexte, partagées entre sessions"""
+    return {"lock": threading.Lock(), "tables": {}}
 
-    # Moyenne pondérée
-    total_weight = sum(weights)
-    if total_weight > 0:
-        avg = sum(s * w for s, w in zip(scores, weights)) / total_weight
-    else:
-        avg = sum(scores) / len(scores)
 
-    return {
-        "avg": avg,
-        "positive": positive,
-        "neutral": neutral,
-        "negative": negative,
-        "total": len(scores)
-    }
+def get_mention_table(candidate_names: List[str]) -> Dict:
+    """
+    Table des mentions du contexte courant construite depuis les caches 30j presse et YouTube.
+    Reconstruite seulement si un cache candidat a été rafraîchi (fetched_at).
+    """
+    press_data = load_press_cache().get("data", {})
+    youtube_data = load_youtube_cache().get("data", {})
+    signature = (
+        tuple(candidate_names),
+        tuple((press_data.get(n) or {}).get("fetched_at") for n in candidate_names),
+        tuple((youtube_data.get(n) or {}).get("fetched_at") for n in candidate_names),
+    )
+
+    store = get_mention_table_store()
+    with store["lock"]:
+        table = store["tables"].get(PRESS_CACHE_FILE)
+        if table is not None and table["signature"] == signature:
+            return table
+
+    table = build_mention_table(
+        candidate_names,
+        {n: [Article.from_dict(a) for a in press_data[n].get("articles", [])] for n in candidate_names if n in press_data},
+        {n: [Video.from_dict(v) for v in youtube_data[n].get("videos", [])] for n in candidate_names if n in youtube_data},
+    )
+    table["signature"] = signature
+    table["has_press"] = [n in press_data for n in candidate_names]
+    table["has_youtube"] = [bool((youtube_data.get(n) or {}).get("videos")) for n in candidate_names]
+    table["official_channels"] = {n: (youtube_data.get(n) or {}).get("official_channel") for n in candidate_names}
+
+    with store["lock"]:
+        store["tables"][PRESS_CACHE_FILE] = table
+    return table
+
+
+def _mention_rows(table: Dict, source: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> np.ndarray:
+    """Indices des lignes d'une source dans la fenêtre [start_date, end_date] (triés par candidat puis date)"""
+    mask = table["source"] == source
+    if start_date is not None:
+        mask &= table["day"] >= start_date.toordinal()
+    if end_date is not None:
+        mask &= table["day"] <= end_date.toordinal()
+    return np.flatnonzero(mask)
+
+
+def _split_by_candidate(table: Dict, rows: np.ndarray) -> List[np.ndarray]:
+    """Découpe des lignes (triées par candidat) en un tableau par candidat"""
+    bounds = np.searchsorted(table["cand"][rows], np.arange(len(table["candidates"]) + 1))
+    return [rows[bounds[i]:bounds[i + 1]] for i in range(len(table["candidates"]))]
+
+
+def table_press_stats(table: Dict, start_date: date, end_date: date) -> Dict[str, Dict]:
+    """
+    Stats presse par candidat sur la période (group-by vectorisé).
+    Même format que get_all_press_coverage : articles (du plus récent au plus ancien),
+    count, stories, domains, top_media, top_media_count, media_breakdown.
+    """
+    n_cand = len(table["candidates"])
+    rows = _mention_rows(table, MENTION_SOURCE_PRESS, start_date, end_date)
+    cand = table["cand"][rows]
+    counts = np.bincount(cand, minlength=n_cand)
+
+    n_story = len(table["items"]) + 1
+    story_pairs = np.unique(cand * n_story + table["story"][rows])
+    stories = np.bincount(story_pairs // n_story, minlength=n_cand)
+
+    # Comptage (candidat, domaine) ; égalités départagées par l'article le plus récent (comme Counter sur la liste triée)
+    dom = table["domain"][rows]
+    has_dom = dom >= 0
+    n_dom = len(table["domains"]) + 1
+    pair = cand[has_dom] * n_dom + dom[has_dom]
+    pairs, last_rev, pair_counts = np.unique(pair[::-1], return_index=True, return_counts=True)
+    last = len(pair) - 1 - last_rev
+    pair_cand = pairs // n_dom
+    domains = np.bincount(pair_cand, minlength=n_cand)
+    order = np.lexsort((-last, -pair_counts, pair_cand))
+    pair_bounds = np.searchsorted(pair_cand[order], np.arange(n_cand + 1))
+
+    stats = {}
+    for ci, cand_rows in enumerate(_split_by_candidate(table, rows)):
+        top = order[pair_bounds[ci]:pair_bounds[ci + 1]][:5]
+        breakdown = [(table["domains"][pairs[k] % n_dom], int(pair_counts[k])) for k in top]
+        stats[table["candidates"][ci]] = {
+            "articles": [table["items"][r] for r in cand_rows[::-1]],
+            "count": int(counts[ci]),
+            "stories": int(stories[ci]),
+            "domains": int(domains[ci]),
+            "top_media": breakdown[0][0] if breakdown else None,
+            "top_media_count": breakdown[0][1] if breakdown else 0,
+            "media_breakdown": breakdown
+        }
+    return stats
 
 
-def compute_combined_sentiment(press_articles: List[Dict], youtube_videos: List[Dict]) -> Dict:
+def table_video_lists(table: Dict, start_date: date, end_date: date) -> Dict[str, List]:
+    """Vidéos de la période par candidat, triées par vues décroissantes"""
+    rows = _mention_rows(table, MENTION_SOURCE_YOUTUBE, start_date, end_date)
+    lists = {}
+    for ci, cand_rows in enumerate(_split_by_candidate(table, rows)):
+        order = cand_rows[np.argsort(-table["views"][cand_rows], kind="stable")]
+        lists[table["candidates"][ci]] = [table["items"][r] for r in order]
+    return lists
+
+
+def table_sentiment(table: Dict, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                    bucket_days: Optional[int] = None) -> Dict:
     """
-    Calcule le sentiment combiné 50% presse + 50% YouTube.
+    Sentiment par candidat (et par tranche de bucket_days jours depuis start_date si fourni).
+    Presse : moyenne simple ; YouTube : moyenne pondérée par les vues ; combiné 50/50.
+    Retourne des tableaux indexés par groupe = candidat * n_buckets + tranche.
     """
-    press_sentiment = get_sentiment_for_items(press_articles, title_key="title")
-    youtube_sentiment = get_sentiment_for_items(youtube_videos, title_key="title", weight_key="views")
+    n_buckets = 1
+    if bucket_days:
+        n_buckets = (end_date - start_date).days // bucket_days + 1
+
+    agg = {"n_buckets": n_buckets}
+    n_groups = len(table["candidates"]) * n_buckets
+    for label, source, weight_col in (("press", MENTION_SOURCE_PRESS, None), ("youtube", MENTION_SOURCE_YOUTUBE, "views")):
+        rows = _mention_rows(table, source, start_date, end_date)
+        score = table["sentiment"][rows]
+        valid = ~np.isnan(score)
+        rows, score = rows[valid], score[valid]
+        group = table["cand"][rows] * n_buckets
+        if bucket_days:
+            group += (table["day"][rows] - start_date.toordinal()) // bucket_days
+
+        weight = table[weight_col][rows].astype(np.float64) if weight_col else np.ones(len(rows))
+        total = np.bincount(group, minlength=n_groups)
+        weight_sum = np.bincount(group, weights=weight, minlength=n_groups)
+        weighted = np.bincount(group, weights=score * weight, minlength=n_groups)
+        plain = np.bincount(group, weights=score, minlength=n_groups)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg = np.where(weight_sum > 0, weighted / weight_sum, plain / np.maximum(total, 1))
+
+        agg[label] = {
+            "avg": np.where(total > 0, avg, 0.0),
+            "positive": np.bincount(group[score > SENTIMENT_POSITIVE_THRESHOLD], minlength=n_groups),
+            "negative": np.bincount(group[score < SENTIMENT_NEGATIVE_THRESHOLD], minlength=n_groups),
+            "total": total
+        }
 
-    # Moyenne 50/50
-    if press_sentiment["total"] > 0 and youtube_sentiment["total"] > 0:
-        combined_avg = (press_sentiment["avg"] + youtube_sentiment["avg"]) / 2
-    elif press_sentiment["total"] > 0:
-        combined_avg = press_sentiment["avg"]
-    elif youtube_sentiment["total"] > 0:
-        combined_avg = youtube_sentiment["avg"]
-    else:
-        combined_avg = 0
+    return _combine_sentiment(agg)
+
+
+def _combine_sentiment(agg: Dict) -> Dict:
+    """Complète neutres et moyenne combinée 50% presse + 50% YouTube (sources sans données ignorées)"""
+    for label in ("press", "youtube"):
+        agg[label]["neutral"] = agg[label]["total"] - agg[label]["positive"] - agg[label]["negative"]
+    press, youtube = agg["press"], agg["youtube"]
+    agg["combined_avg"] = np.where(
+        (press["total"] > 0) & (youtube["total"] > 0), (press["avg"] + youtube["avg"]) / 2,
+        np.where(press["total"] > 0, press["avg"], np.where(youtube["total"] > 0, youtube["avg"], 0.0))
+    )
+    return agg
+
+
+def sentiment_entry(agg: Dict, group: int) -> Dict:
+    """Extrait le sentiment d'un groupe au format {combined_avg, press: {...}, youtube: {...}}"""
+    entry = {"combined_avg": float(agg["combined_avg"][group])}
+    for label in ("press", "youtube"):
+        entry[label] = {
+            "avg": float(agg[label]["avg"][group]),
+            "positive": int(agg[label]["positive"][group]),
+            "neutral": int(agg[label]["neutral"][group]),
+            "negative": int(agg[label]["negative"][group]),
+            "total": int(agg[label]["total"][group])
+        }
+    return entry
+
+
+# =============================================================================
+# ESQUISSES DE DOMAINES DISTINCTS (ENSEMBLE EXACT / HYPERLOGLOG, FUSIONNABLES)
+# =============================================================================
+
+DOMAIN_SKETCH_EXACT_MAX = 64   # Au-delà, l'esquisse journalière passe en HyperLogLog
+HLL_PRECISION = 10             # 2^10 registres (~3% d'erreur type)
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+
+def _domain_hash(domain: str) -> int:
+    """Hash 64 bits stable d'un domaine"""
+    return int.from_bytes(hashlib.blake2b(domain.encode(), digest_size=8).digest(), "big")
+
+
+def new_domain_sketch() -> Dict:
+    """Esquisse vide : ensemble exact tant qu'il est petit, registres HLL ensuite"""
+    return {"exact": set(), "registers": None}
+
+
+def _hll_add(registers: np.ndarray, domain: str):
+    h = _domain_hash(domain)
+    idx = h >> (64 - HLL_PRECISION)
+    rest = h & ((1 << (64 - HLL_PRECISION)) - 1)
+    rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+    if rank > registers[idx]:
+        registers[idx] = rank
 
+
+def _to_registers(domains) -> np.ndarray:
+    registers = np.zeros(HLL_REGISTERS, dtype=np.uint8)
+    for domain in domains:
+        _hll_add(registers, domain)
+    return registers
+
+
+def sketch_add(sketch: Dict, domain: str):
+    """Ajoute un domaine à l'esquisse"""
+    if sketch["registers"] is not None:
+        _hll_add(sketch["registers"], domain)
+        return
+    sketch["exact"].add(domain)
+    if len(sketch["exact"]) > DOMAIN_SKETCH_EXACT_MAX:
+        sketch["registers"] = _to_registers(sketch["exact"])
+        sketch["exact"] = set()
+
+
+def merge_domain_sketches(sketches: List[Dict]) -> Dict:
+    """Union de plusieurs esquisses : exacte si toutes le sont, sinon maximum des registres HLL"""
+    merged = new_domain_sketch()
+    hll = [sk["registers"] for sk in sketches if sk["registers"] is not None]
+    for sk in sketches:
+        merged["exact"] |= sk["exact"]
+    if hll:
+        registers = np.maximum.reduce(hll + [_to_registers(merged["exact"])])
+        merged = {"exact": set(), "registers": registers}
+    return merged
+
+
+def sketch_count(sketch: Dict) -> int:
+    """Nombre de domaines distincts (exact, ou estimation HyperLogLog avec correction petites valeurs)"""
+    if sketch["registers"] is None:
+        return len(sketch["exact"])
+    registers = sketch["registers"].astype(np.float64)
+    m = HLL_REGISTERS
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.exp2(-registers))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+
+# =============================================================================
+# ROLLUPS JOURNALIERS + SOMMES PRÉFIXES (FENÊTRES EN O(1))
+# =============================================================================
+
+# Métriques additives par (candidat, jour) ; une fenêtre = différence de deux préfixes
+ROLLUP_METRICS = (
+    "press_count", "video_count", "shorts_count",
+    "views", "likes", "comments", "shorts_views", "shorts_likes", "shorts_comments",
+    "press_sent_sum", "press_sent_n", "press_pos", "press_neg",
+    "yt_sent_wsum", "yt_sent_w", "yt_sent_sum", "yt_sent_n", "yt_pos", "yt_neg",
+)
+ROLLUP_INDEX = {metric: i for i, metric in enumerate(ROLLUP_METRICS)}
+# Colonnes de sentiment, recalculées seules quand de nouveaux titres sont analysés
+ROLLUP_SENTIMENT_COLUMNS = np.array([ROLLUP_INDEX[m] for m in ROLLUP_METRICS if "_sent_" in m or m.endswith(("_pos", "_neg"))])
+
+
+@st.cache_resource(show_spinner=False)
+def get_rollup_store() -> Dict:
+    """Rollups journaliers par contexte, partagés entre sessions"""
+    return {"lock": threading.Lock(), "rollups": {}}
+
+
+def _new_rollup(candidate_names: List[str]) -> Dict:
+    """Rollup vide : valeurs [candidat, jour, métrique] + esquisses de domaines par (candidat, jour)"""
     return {
-        "combined_avg": combined_avg,
-        "press": press_sentiment,
-        "youtube": youtube_sentiment
+        "candidates": list(candidate_names),
+        "day0": date.today().toordinal(),
+        "values": np.zeros((len(candidate_names), 0, len(ROLLUP_METRICS))),
+        "domain_sketches": {},                         # (candidat, jour) -> esquisse des domaines
+        "prefix": None
     }
 
 
+def _table_contributions(table: Dict) -> np.ndarray:
+    """Contribution de chaque ligne de la table aux métriques du rollup (n_lignes x n_métriques)"""
+    contrib = np.zeros((len(table["items"]), len(ROLLUP_METRICS)))
+    press = table["source"] == MENTION_SOURCE_PRESS
+    video = table["source"] == MENTION_SOURCE_YOUTUBE
+    short = video & table["is_short"]
+    sentiment = table["sentiment"]
+    scored = ~np.isnan(sentiment)
+    score = np.where(scored, sentiment, 0.0)
+    views = table["views"].astype(np.float64)
+
+    contrib[:, ROLLUP_INDEX["press_count"]] = press
+    contrib[:, ROLLUP_INDEX["video_count"]] = video
+    contrib[:, ROLLUP_INDEX["shorts_count"]] = short
+    for metric in ("views", "likes", "comments"):
+        values = np.where(video, table[metric], 0).astype(np.float64)
+        contrib[:, ROLLUP_INDEX[metric]] = values
+        contrib[:, ROLLUP_INDEX[f"shorts_{metric}"]] = np.where(short, values, 0.0)
+
+    press_scored = press & scored
+    contrib[:, ROLLUP_INDEX["press_sent_sum"]] = np.where(press_scored, score, 0.0)
+    contrib[:, ROLLUP_INDEX["press_sent_n"]] = press_scored
+    contrib[:, ROLLUP_INDEX["press_pos"]] = press_scored & (score > SENTIMENT_POSITIVE_THRESHOLD)
+    contrib[:, ROLLUP_INDEX["press_neg"]] = press_scored & (score < SENTIMENT_NEGATIVE_THRESHOLD)
+
+    video_scored = video & scored
+    contrib[:, ROLLUP_INDEX["yt_sent_wsum"]] = np.where(video_scored, score * views, 0.0)
+    contrib[:, ROLLUP_INDEX["yt_sent_w"]] = np.where(video_scored, views, 0.0)
+    contrib[:, ROLLUP_INDEX["yt_sent_sum"]] = np.where(video_scored, score, 0.0)
+    contrib[:, ROLLUP_INDEX["yt_sent_n"]] = video_scored
+    contrib[:, ROLLUP_INDEX["yt_pos"]] = video_scored & (score > SENTIMENT_POSITIVE_THRESHOLD)
+    contrib[:, ROLLUP_INDEX["yt_neg"]] = video_scored & (score < SENTIMENT_NEGATIVE_THRESHOLD)
+    return contrib
+
+
+def update_rollup_from_table(rollup: Dict, table: Dict, changed: Optional[List[int]] = None,
+                             sentiment_only: bool = False):
+    """
+    Met à jour le rollup depuis la table des mentions : une ligne par (candidat, item)
+    actuellement en cache, donc un item partagé compte pour chaque candidat et un item
+    sorti du cache ne compte plus. Les esquisses de domaines reçoivent chaque article
+    de chaque candidat.
+    changed : candidats dont le cache a changé, seuls recalculés (les autres gardent valeurs
+    et esquisses) ; None = reconstruction complète. sentiment_only : mêmes items, seules les
+    colonnes de sentiment sont recalculées (titres analysés entre-temps).
+    """
+    n_candidates = len(rollup["candidates"])
+    rollup["prefix"] = None
+    name_to_ci = {name: i for i, name in enumerate(rollup["candidates"])}
+    cand = np.array([name_to_ci[table["candidates"][c]] for c in table["cand"]], dtype=np.int64)
+    day = table["day"]
+
+    if sentiment_only:
+        values = rollup["values"]
+        values[:, :, ROLLUP_SENTIMENT_COLUMNS] = 0
+        if len(day):
+            contrib = _table_contributions(table)[:, ROLLUP_SENTIMENT_COLUMNS]
+            np.add.at(values, (cand[:, None], (day - rollup["day0"])[:, None], ROLLUP_SENTIMENT_COLUMNS[None, :]), contrib)
+        return
+
+    if not table["items"]:
+        rollup["values"] = np.zeros((n_candidates, 0, len(ROLLUP_METRICS)))
+        rollup["domain_sketches"] = {}
+        return
+
+    day0 = int(day.min())
+    values = np.zeros((n_candidates, int(day.max()) - day0 + 1, len(ROLLUP_METRICS)))
+    recompute = np.ones(n_candidates, dtype=bool)
+    sketches = {}
+    if changed is not None:
+        recompute[:] = False
+        recompute[list(changed)] = True
+        # Candidats inchangés : leurs items sont toujours dans la table, donc dans la nouvelle plage de jours
+        old = rollup["values"]
+        shift = rollup["day0"] - day0
+        lo, hi = max(shift, 0), min(shift + old.shape[1], values.shape[1])
+        if hi > lo:
+            values[~recompute, lo:hi] = old[~recompute, lo - shift:hi - shift]
+        sketches = {key: sk for key, sk in rollup["domain_sketches"].items() if not recompute[key[0]]}
+
+    rows = np.flatnonzero(recompute[cand])
+    np.add.at(values, (cand[rows], day[rows] - day0), _table_contributions(table)[rows])
+    press_rows = rows[(table["source"][rows] == MENTION_SOURCE_PRESS) & (table["domain"][rows] >= 0)]
+    for r in press_rows:
+        sketch = sketches.setdefault((int(cand[r]), int(day[r])), new_domain_sketch())
+        sketch_add(sketch, table["domains"][table["domain"][r]])
+
+    rollup["values"] = values
+    rollup["day0"] = day0
+    rollup["domain_sketches"] = sketches
+
+
+def get_context_rollup(table: Dict) -> Dict:
+    """
+    Rollup du contexte courant, mis à jour avec la table des mentions : seuls les candidats
+    dont un cache a été rafraîchi sont recalculés, et de nouveaux titres analysés ne
+    recalculent que le sentiment.
+    """
+    store = get_rollup_store()
+    with store["lock"]:
+        rollup = store["rollups"].get(PRESS_CACHE_FILE)
+        if rollup is None or rollup["candidates"] != table["candidates"]:
+            rollup = store["rollups"][PRESS_CACHE_FILE] = _new_rollup(table["candidates"])
+        # Version de la table : caches rafraîchis (fetched_at par candidat) et titres analysés
+        version = (table["signature"], int(np.count_nonzero(~np.isnan(table["sentiment"]))))
+        previous = rollup.get("table_version")
+        if previous is None:
+            update_rollup_from_table(rollup, table)
+        elif previous[0] != version[0]:
+            old_press, old_youtube = previous[0][1], previous[0][2]
+            changed = [ci for ci in range(len(table["candidates"]))
+                       if old_press[ci] != version[0][1][ci] or old_youtube[ci] != version[0][2][ci]]
+            update_rollup_from_table(rollup, table, changed)
+            if previous[1] != version[1]:
+                update_rollup_from_table(rollup, table, sentiment_only=True)
+        elif previous[1] != version[1]:
+            update_rollup_from_table(rollup, table, sentiment_only=True)
+        rollup["table_version"] = version
+    return rollup
+
+
+def rollup_window(rollup: Dict, start_date: date, end_date: date) -> np.ndarray:
+    """Totaux [candidat, métrique] sur [start_date, end_date] : différence de deux sommes préfixes"""
+    prefix = rollup["prefix"]
+    if prefix is None:
+        values = rollup["values"]
+        prefix = np.zeros((values.shape[0], values.shape[1] + 1, values.shape[2]))
+        np.cumsum(values, axis=1, out=prefix[:, 1:])
+        rollup["prefix"] = prefix
+    n_days = prefix.shape[1] - 1
+    lo = min(max(start_date.toordinal() - rollup["day0"], 0), n_days)
+    hi = min(max(end_date.toordinal() - rollup["day0"] + 1, 0), n_days)
+    return prefix[:, max(hi, lo)] - prefix[:, lo]
+
+
+def rollup_distinct_domains(rollup: Dict, start_date: date, end_date: date) -> np.ndarray:
+    """Domaines presse distincts par candidat sur la fenêtre, par fusion des esquisses journalières"""
+    first, last = start_date.toordinal(), end_date.toordinal()
+    per_candidate = [[] for _ in rollup["candidates"]]
+    for (ci, day), sketch in rollup["domain_sketches"].items():
+        if first <= day <= last:
+            per_candidate[ci].append(sketch)
+    return np.array([sketch_count(merge_domain_sketches(sks)) for sks in per_candidate], dtype=np.int64)
+
+
+def rollup_youtube_stats(window: np.ndarray, ci: int) -> Dict:
+    """Totaux YouTube d'un candidat depuis les totaux d'une fenêtre (format compute_youtube_stats_from_videos)"""
+    row = np.rint(window[ci]).astype(np.int64)
+    stats = {}
+    for metric in ("views", "likes", "comments"):
+        stats[f"total_{metric}"] = int(row[ROLLUP_INDEX[metric]])
+        stats[f"shorts_{metric}"] = int(row[ROLLUP_INDEX[f"shorts_{metric}"]])
+        stats[f"long_{metric}"] = stats[f"total_{metric}"] - stats[f"shorts_{metric}"]
+    stats["shorts_count"] = int(row[ROLLUP_INDEX["shorts_count"]])
+    stats["video_count"] = int(row[ROLLUP_INDEX["video_count"]])
+    stats["long_count"] = stats["video_count"] - stats["shorts_count"]
+    return stats
+
+
+def rollup_sentiment(window: np.ndarray) -> Dict:
+    """Sentiment par candidat depuis les totaux d'une fenêtre (même format que table_sentiment)"""
+    def col(metric):
+        return window[:, ROLLUP_INDEX[metric]]
+
+    agg = {"n_buckets": 1}
+    for label, total, wsum, w, plain, pos, neg in (
+        ("press", "press_sent_n", "press_sent_sum", "press_sent_n", "press_sent_sum", "press_pos", "press_neg"),
+        ("youtube", "yt_sent_n", "yt_sent_wsum", "yt_sent_w", "yt_sent_sum", "yt_pos", "yt_neg"),
+    ):
+        n = np.rint(col(total)).astype(np.int64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg = np.where(col(w) > 0, col(wsum) / col(w), col(plain) / np.maximum(n, 1))
+        agg[label] = {
+            "avg": np.where(n > 0, avg, 0.0),
+            "positive": np.rint(col(pos)).astype(np.int64),
+            "negative": np.rint(col(neg)).astype(np.int64),
+            "total": n
+        }
+
+    return _combine_sentiment(agg)
+
+
 # =============================================================================
 # CACHE THÈMES - ANALYSE IA DES THÈMES MÉDIATIQUES
 # =============================================================================
@@ -1200,145 +1988,456 @@ def get_or_analyze_themes(
 # CHATBOT IA - ANALYSE DES DONNÉES
 # =============================================================================
 
-def build_chatbot_context(result: Dict, contexte: str, period_label: str) -> str:
-    """Construit le contexte de données pour le chatbot"""
+CHATBOT_RETRIEVAL_K = 15                # Titres retrouvés par question
+CHATBOT_RETRIEVAL_MAX_CHARS = 4000      # Budget des titres retrouvés dans le contexte (en-tête compris)
+CHATBOT_RETRIEVAL_HEADER = "=== TITRES LES PLUS PERTINENTS POUR LA QUESTION ==="
+BM25_K1 = 1.5
+BM25_B = 0.75
+INDEX_STOPWORDS = frozenset({
+    "le", "la", "les", "un", "une", "des", "de", "du", "au", "aux", "et", "ou", "en", "dans", "sur",
+    "pour", "par", "avec", "sans", "que", "qui", "quoi", "quel", "quelle", "quels", "quelles", "est",
+    "sont", "ce", "cet", "cette", "ces", "il", "elle", "ils", "elles", "on", "se", "sa", "son", "ses",
+    "leur", "leurs", "ne", "pas", "plus", "a", "y", "l", "d", "s", "qu", "c", "j", "n", "t", "m",
+    "comment", "pourquoi", "combien", "parle", "parlent", "dit", "fait",
+})
+
+
+@st.cache_resource(show_spinner=False)
+def get_title_index_store() -> Dict:
+    """
+    Index BM25 des titres en cache (presse, TV/Radio, YouTube), partagé entre sessions.
+    docs : {doc_id: {"terms", "length", "line"}}, postings : {terme: {doc_id: tf}},
+    sources : {fichier|candidat: {"version", "doc_ids"}}, files : {fichier: mtime}.
+    """
+    return {"lock": threading.Lock(), "docs": {}, "postings": {}, "total_length": 0, "sources": {}, "files": {}}
+
+
+def tokenize_for_index(text: str) -> List[str]:
+    """Termes indexables d'un texte (replié, sans mots vides)"""
+    return [t for t in re.findall(r"\w+", fold_text(text)) if t not in INDEX_STOPWORDS]
+
+
+def _index_remove_source(store: Dict, source_key: str):
+    """Retire de l'index les documents d'une source (appelé sous le lock)"""
+    source = store["sources"].pop(source_key, None)
+    if not source:
+        return
+    for doc_id in source["doc_ids"]:
+        doc = store["docs"].pop(doc_id, None)
+        if not doc:
+            continue
+        store["total_length"] -= doc["length"]
+        for term in doc["terms"]:
+            postings = store["postings"].get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del store["postings"][term]
+
+
+def _index_add_source(store: Dict, source_key: str, version, docs: List[Tuple[str, str, str]]):
+    """Indexe les documents (doc_id, texte, ligne de contexte) d'une source (appelé sous le lock)"""
+    doc_ids = []
+    for doc_id, text, line in docs:
+        if doc_id in store["docs"]:
+            continue
+        terms = Counter(tokenize_for_index(text))
+        if not terms:
+            continue
+        length = sum(terms.values())
+        store["docs"][doc_id] = {"terms": terms, "length": length, "line": line}
+        store["total_length"] += length
+        for term, tf in terms.items():
+            store["postings"].setdefault(term, {})[doc_id] = tf
+        doc_ids.append(doc_id)
+    store["sources"][source_key] = {"version": version, "doc_ids": doc_ids}
+
+
+def _press_cache_docs(path: str, name: str, entry: Dict) -> List[Tuple[str, str, str]]:
+    """Documents d'index d'un candidat du cache presse (articles et mentions TV/Radio)"""
+    media_matcher = get_tv_radio_matcher()
+    docs = []
+    for art in entry.get("articles", []):
+        title = art.get("title", "")
+        source = art.get("domain") or art.get("source", "")
+        if not title:
+            continue
+        media = match_first(media_matcher, fold_text(source)) or match_first(media_matcher, fold_text(title))
+        kind = "TV/Radio" if media else "Presse"
+        line = f"- [{kind}] {name}: \"{title[:100]}\" ({media or source}, {art.get('date', '')})"
+        docs.append((f"{path}|{name}|{art.get('url') or title}", f"{name} {title} {source}", line))
+    return docs
+
+
+def _youtube_cache_docs(path: str, name: str, entry: Dict) -> List[Tuple[str, str, str]]:
+    """Documents d'index d'un candidat du cache YouTube"""
+    docs = []
+    for v in entry.get("videos", []):
+        title = v.get("title", "")
+        if not title:
+            continue
+        line = (f"- [YouTube] {name}: \"{title[:100]}\" | {v.get('views', 0):,} vues | "
+                f"{v.get('channel', '')} | {v.get('published', '')[:10]}")
+        docs.append((f"{path}|{name}|{v.get('id') or v.get('url') or title}", f"{name} {title} {v.get('channel', '')}", line))
+    return docs
+
+
+def index_tv_radio_mentions(name: str, mentions: List) -> None:
+    """
+    Indexe les mentions TV/Radio d'un candidat à chaque détection (elles ne sont pas dans les
+    caches de fichiers) ; remplacent celles de la détection précédente pour ce contexte.
+    """
+    source_key = f"tv_radio|{PRESS_CACHE_FILE}|{name}"
+    docs = []
+    for m in mentions:
+        title = m.get("title", "")
+        if not title:
+            continue
+        line = f"- [TV/Radio] {name}: \"{title[:100]}\" ({m.get('media', '')}, {m.get('date', '')})"
+        docs.append((f"{source_key}|{m.get('url') or title}", f"{name} {title} {m.get('media', '')}", line))
+    version = tuple(doc_id for doc_id, _, _ in docs)
+
+    store = get_title_index_store()
+    with store["lock"]:
+        source = store["sources"].get(source_key)
+        if source and source["version"] == version:
+            return
+        _index_remove_source(store, source_key)
+        _index_add_source(store, source_key, version, docs)
+
+
+def refresh_title_index(contextes: Tuple[str, ...] = ("paris", "national")):
+    """
+    Met à jour l'index de façon incrémentale : un fichier de cache n'est relu que si son mtime
+    a changé, et seuls les candidats dont fetched_at a changé sont réindexés. Les candidats
+    absents du cache relu sont retirés de l'index.
+    """
+    store = get_title_index_store()
+    for ctx in contextes:
+        files = get_context_files(ctx)
+        for path, to_docs in ((files["press_cache"], _press_cache_docs), (files["youtube_cache"], _youtube_cache_docs)):
+            try:
+                mtime = os.path.getmtime(path)
+            except:
+                continue
+            with store["lock"]:
+                if store["files"].get(path) == mtime:
+                    continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    cache_data = json.load(f).get("data", {})
+            except:
+                continue
+
+            with store["lock"]:
+                indexed = 0
+                current = {f"{path}|{name}" for name in cache_data}
+                for source_key in [key for key in store["sources"] if key.startswith(f"{path}|") and key not in current]:
+                    _index_remove_source(store, source_key)
+                    indexed += 1
+                for name, entry in cache_data.items():
+                    source_key = f"{path}|{name}"
+                    version = (entry or {}).get("fetched_at")
+                    source = store["sources"].get(source_key)
+                    if source and source["version"] == version and version is not None:
+                        continue
+                    _index_remove_source(store, source_key)
+                    _index_add_source(store, source_key, version, to_docs(path, name, entry or {}))
+                    indexed += 1
+                store["files"][path] = mtime
+            if indexed:
+                logger.info(f"[INDEX] {path}: {indexed} candidats réindexés ou retirés ({len(store['docs'])} titres)")
+
+
+def search_title_index(question: str, k: int = CHATBOT_RETRIEVAL_K,
+                       max_chars: int = CHATBOT_RETRIEVAL_MAX_CHARS) -> List[str]:
+    """Lignes de contexte des k titres les plus pertinents pour la question (BM25)"""
+    terms = set(tokenize_for_index(question))
+    store = get_title_index_store()
+    with store["lock"]:
+        n_docs = len(store["docs"])
+        if not terms or not n_docs:
+            return []
+        avg_length = store["total_length"] / n_docs
+        scores = {}
+        for term in terms:
+            postings = store["postings"].get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                length = store["docs"][doc_id]["length"]
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        # Un même titre peut venir du cache presse et des mentions TV/Radio : une seule ligne
+        top = heapq.nlargest(2 * k, scores.items(), key=lambda x: x[1])
+        lines = list(dict.fromkeys(store["docs"][doc_id]["line"] for doc_id, _ in top))[:k]
+
+    kept, size = [], 0
+    for line in lines:
+        if size + len(line) + 1 > max_chars:
+            break
+        kept.append(line)
+        size += len(line) + 1
+    return kept
+
+
+CHATBOT_CONTEXT_MAX_CHARS = 20000       # ≈ 5 000 tokens (≈ 4 caractères par token), tout compris
+CHATBOT_OTHER_CONTEXT_MAX_CHARS = 2000  # Résumé de l'autre contexte, pris sur le budget total
+CHATBOT_DETAIL_LEVELS = (5, 3, 1, 0)    # Titres listés par rubrique, du plus au moins détaillé
+
+
+def build_chatbot_context(result: Dict, contexte: str, period_label: str, max_items: int = 5) -> str:
+    """Construit le contexte de données pour le chatbot (max_items titres par rubrique)"""
     candidates_data = result.get("candidates", {})
+    weights = result.get("score_weights")
 
     context_parts = []
     context_parts.append(f"=== DONNEES {contexte.upper()} - Periode: {period_label} ===")
     context_parts.append("")
 
     for cid, data in candidates_data.items():
-        info = data.get("info", {})
-        name = info.get("name", cid)
-        party = info.get("party", "")
-        role = info.get("role", "")
-
-        # Score global (c'est un dict avec 'total', 'trends', 'press', etc.)
-        score_data = data.get("score", {})
-        if isinstance(score_data, dict):
-            score_total = score_data.get("total", 0)
-            score_trends = score_data.get("trends", 0)
-            score_press = score_data.get("press", 0)
-            score_wiki = score_data.get("wiki", 0)
-            score_youtube = score_data.get("youtube", 0)
-        else:
-            score_total = score_trends = score_press = score_wiki = score_youtube = 0
-
-        # Wikipedia
-        wiki = data.get("wikipedia", {})
-        wiki_views = wiki.get("views", 0)
-        wiki_variation = wiki.get("variation", 0)
-        wiki_avg_daily = wiki.get("avg_daily", 0)
-
-        # Presse
-        press = data.get("press", {})
-        press_count = press.get("count", 0)
-        press_domains_count = press.get("domains", 0)
-        top_media = press.get("top_media", "")
-        top_media_count = press.get("top_media_count", 0)
-        press_articles = press.get("articles", [])
-        media_breakdown = press.get("media_breakdown", [])
-
-        # TV/Radio
-        tv_radio = data.get("tv_radio", {})
-        tv_radio_count = tv_radio.get("count", 0)
-        tv_radio_mentions = tv_radio.get("mentions", [])
-        tv_radio_top = tv_radio.get("top_media", [])
-
-        # Google Trends
-        trends_score = data.get("trends_score", 0)
-
-        # YouTube
-        youtube = data.get("youtube", {})
-        yt_total_views = youtube.get("total_views", 0)
-        yt_videos = youtube.get("videos", [])
-        yt_count = len(yt_videos)
-        yt_shorts_views = youtube.get("shorts_views", 0)
-        yt_long_views = youtube.get("long_views", 0)
-        yt_shorts_count = youtube.get("shorts_count", 0)
-        yt_long_count = youtube.get("long_count", 0)
-
-        # Thèmes (analyse IA)
-        themes_data = data.get("themes", {})
-        if isinstance(themes_data, list):
-            # Ancien format
-            themes = themes_data
-            themes_summary = ""
-        else:
-            themes = themes_data.get("themes", [])
-            themes_summary = themes_data.get("summary", "")
-
-        # Construire le contexte pour ce candidat
-        context_parts.append(f"## {name}")
-        context_parts.append(f"Parti: {party} | Role: {role}")
-        context_parts.append(f"SCORE GLOBAL: {score_total}/100")
-        context_parts.append(f"  - Contribution Trends: {score_trends}/100 (poids 30%)")
-        context_parts.append(f"  - Contribution Presse: {score_press}/100 (poids 30%)")
-        context_parts.append(f"  - Contribution Wikipedia: {score_wiki}/100 (poids 25%)")
-        context_parts.append(f"  - Contribution YouTube: {score_youtube}/100 (poids 15%)")
-
-        # Wikipedia details
-        context_parts.append(f"WIKIPEDIA: {wiki_views:,} vues totales | Moyenne: {wiki_avg_daily:.0f}/jour | Variation: {wiki_variation:+.0f}%")
-
-        # Presse details
-        top_media_str = f" | Top media: {top_media} ({top_media_count} articles)" if top_media else ""
-        context_parts.append(f"PRESSE: {press_count} articles dans {press_domains_count} sources{top_media_str}")
-        if media_breakdown:
-            breakdown_str = ", ".join([f"{m}({c})" for m, c in media_breakdown[:5]])
-            context_parts.append(f"  Repartition: {breakdown_str}")
-        if press_articles:
-            context_parts.append("  Derniers articles:")
-            for art in press_articles[:5]:
-                art_title = art.get("title", "")[:70]
-                art_source = art.get("domain", "")
-                art_date = art.get("date", "")
-                context_parts.append(f"    - \"{art_title}\" ({art_source}, {art_date})")
-
-        # TV/Radio
-        if tv_radio_count > 0:
-            tv_top_str = ", ".join([f"{m}({c})" for m, c in tv_radio_top[:3]]) if tv_radio_top else ""
-            context_parts.append(f"TV/RADIO: {tv_radio_count} mentions | {tv_top_str}")
-            if tv_radio_mentions:
-                for mention in tv_radio_mentions[:3]:
-                    m_title = mention.get("title", "")[:60]
-                    m_media = mention.get("media", "")
-                    context_parts.append(f"    - \"{m_title}\" ({m_media})")
-
-        # Google Trends
-        context_parts.append(f"GOOGLE TRENDS: {trends_score}/100 (interet relatif)")
-
-        # YouTube details
-        context_parts.append(f"YOUTUBE: {yt_total_views:,} vues totales ({yt_count} videos)")
-        context_parts.append(f"  - Shorts: {yt_shorts_views:,} vues ({yt_shorts_count} videos)")
-        context_parts.append(f"  - Videos longues: {yt_long_views:,} vues ({yt_long_count} videos)")
-        if yt_videos:
-            context_parts.append("  Top videos:")
-            for v in yt_videos[:5]:
-                title = v.get("title", "")[:60]
-                views = v.get("views", 0)
-                channel = v.get("channel", "")
-                pub_date = v.get("published", "")
-                context_parts.append(f"    - \"{title}\" | {views:,} vues | {channel} | {pub_date}")
-
-        # Thèmes médiatiques (analyse IA)
-        if themes_summary:
-            context_parts.append(f"RESUME MEDIATIQUE: {themes_summary}")
-        if themes:
-            themes_str = ", ".join([f"{t['theme']} ({t.get('count', 0)} mentions, {t.get('tone', 'neutre')})" for t in themes[:5]])
-            context_parts.append(f"THEMES MEDIATIQUES: {themes_str}")
-
-        context_parts.append("")
+        context_parts.extend(_chatbot_candidate_block(cid, data, max_items, weights))
 
     return "\n".join(context_parts)
 
 
-def get_chatbot_response(question: str, data_context: str, api_key: str) -> str:
-    """Envoie une question au chatbot et retourne la réponse"""
-    if not api_key:
-        return "Assistant non configuré."
+def _chatbot_candidate_block(cid: str, data: Dict, max_items: int, weights=None) -> List[str]:
+    """Lignes de contexte d'un candidat (weights : pondération des scores, par défaut celle de la formule)"""
+    context_parts = []
+    info = data.get("info", {})
+    name = info.get("name", cid)
+    party = info.get("party", "")
+    role = info.get("role", "")
+
+    # Score global (c'est un dict avec 'total', 'trends', 'press', etc.)
+    score_data = data.get("score", {})
+    if isinstance(score_data, dict):
+        score_total = score_data.get("total", 0)
+        score_trends = score_data.get("trends", 0)
+        score_press = score_data.get("press", 0)
+        score_wiki = score_data.get("wiki", 0)
+        score_youtube = score_data.get("youtube", 0)
+    else:
+        score_total = score_trends = score_press = score_wiki = score_youtube = 0
+
+    # Wikipedia
+    wiki = data.get("wikipedia", {})
+    wiki_views = wiki.get("views", 0)
+    wiki_variation = wiki.get("variation", 0)
+    wiki_avg_daily = wiki.get("avg_daily", 0)
+
+    # Presse
+    press = data.get("press", {})
+    press_count = press.get("count", 0)
+    press_stories = press.get("stories", press_count)
+    press_domains_count = press.get("domains", 0)
+    top_media = press.get("top_media", "")
+    top_media_count = press.get("top_media_count", 0)
+    press_articles = press.get("articles", [])
+    media_breakdown = press.get("media_breakdown", [])
+
+    # TV/Radio
+    tv_radio = data.get("tv_radio", {})
+    tv_radio_count = tv_radio.get("count", 0)
+    tv_radio_mentions = tv_radio.get("mentions", [])
+    tv_radio_top = tv_radio.get("top_media", [])
+
+    # Google Trends
+    trends_score = data.get("trends_score", 0)
+
+    # YouTube
+    youtube = data.get("youtube", {})
+    yt_total_views = youtube.get("total_views", 0)
+    yt_videos = youtube.get("videos", [])
+    yt_count = len(yt_videos)
+    yt_shorts_views = youtube.get("shorts_views", 0)
+    yt_long_views = youtube.get("long_views", 0)
+    yt_shorts_count = youtube.get("shorts_count", 0)
+    yt_long_count = youtube.get("long_count", 0)
+
+    # Thèmes (analyse IA)
+    themes_data = data.get("themes", {})
+    if isinstance(themes_data, list):
+        # Ancien format
+        themes = themes_data
+        themes_summary = ""
+    else:
+        themes = themes_data.get("themes", [])
+        themes_summary = themes_data.get("summary", "")
+
+    # Construire le contexte pour ce candidat
+    context_parts.append(f"## {name}")
+    context_parts.append(f"Parti: {party} | Role: {role}")
+    context_parts.append(f"SCORE GLOBAL: {score_total}/100")
+    weight_pct = dict(zip(SCORE_COMPONENTS, DEFAULT_SCORE_WEIGHTS if weights is None else weights))
+    context_parts.append(f"  - Contribution Trends: {score_trends}/100 (poids {weight_pct['trends']:.0%})")
+    context_parts.append(f"  - Contribution Presse: {score_press}/100 (poids {weight_pct['press']:.0%})")
+    context_parts.append(f"  - Contribution Wikipedia: {score_wiki}/100 (poids {weight_pct['wiki']:.0%})")
+    context_parts.append(f"  - Contribution YouTube: {score_youtube}/100 (poids {weight_pct['youtube']:.0%})")
+
+    # Wikipedia details
+    context_parts.append(f"WIKIPEDIA: {wiki_views:,} vues totales | Moyenne: {wiki_avg_daily:.0f}/jour | Variation: {wiki_variation:+.0f}%")
+
+    # Presse details
+    top_media_str = f" | Top media: {top_media} ({top_media_count} articles)" if top_media else ""
+    context_parts.append(f"PRESSE: {press_count} articles ({press_stories} sujets distincts) dans {press_domains_count} sources{top_media_str}")
+    if media_breakdown:
+        breakdown_str = ", ".join([f"{m}({c})" for m, c in media_breakdown[:max(max_items, 1)]])
+        context_parts.append(f"  Repartition: {breakdown_str}")
+    if press_articles and max_items:
+        context_parts.append("  Derniers articles:")
+        for art in press_articles[:max_items]:
+            art_title = art.get("title", "")[:70]
+            art_source = art.get("domain", "")
+            art_date = art.get("date", "")
+            context_parts.append(f"    - \"{art_title}\" ({art_source}, {art_date})")
+
+    # TV/Radio
+    if tv_radio_count > 0:
+        tv_top_str = ", ".join([f"{m}({c})" for m, c in tv_radio_top[:3]]) if tv_radio_top else ""
+        context_parts.append(f"TV/RADIO: {tv_radio_count} mentions | {tv_top_str}")
+        if tv_radio_mentions:
+            for mention in tv_radio_mentions[:min(max_items, 3)]:
+                m_title = mention.get("title", "")[:60]
+                m_media = mention.get("media", "")
+                context_parts.append(f"    - \"{m_title}\" ({m_media})")
+
+    # Google Trends
+    context_parts.append(f"GOOGLE TRENDS: {trends_score}/100 (interet relatif)")
+
+    # YouTube details
+    context_parts.append(f"YOUTUBE: {yt_total_views:,} vues totales ({yt_count} videos)")
+    context_parts.append(f"  - Shorts: {yt_shorts_views:,} vues ({yt_shorts_count} videos)")
+    context_parts.append(f"  - Videos longues: {yt_long_views:,} vues ({yt_long_count} videos)")
+    if yt_videos and max_items:
+        context_parts.append("  Top videos:")
+        for v in yt_videos[:max_items]:
+            title = v.get("title", "")[:60]
+            views = v.get("views", 0)
+            channel = v.get("channel", "")
+            pub_date = v.get("published", "")
+            context_parts.append(f"    - \"{title}\" | {views:,} vues | {channel} | {pub_date}")
+
+    # Thèmes médiatiques (analyse IA)
+    if themes_summary and max_items:
+        context_parts.append(f"RESUME MEDIATIQUE: {themes_summary}")
+    if themes:
+        themes_str = ", ".join([f"{t['theme']} ({t.get('count', 0)} mentions, {t.get('tone', 'neutre')})" for t in themes[:max(max_items, 1)]])
+        context_parts.append(f"THEMES MEDIATIQUES: {themes_str}")
+
+    context_parts.append("")
+
+    return context_parts
+
+
+def build_bounded_chatbot_context(result: Dict, contexte: str, period_label: str,
+                                  max_chars: int = CHATBOT_CONTEXT_MAX_CHARS,
+                                  detail_levels: Tuple[int, ...] = CHATBOT_DETAIL_LEVELS) -> str:
+    """
+    Contexte borné à max_chars : le niveau de détail le plus riche de detail_levels qui tient
+    dans le budget (par défaut 5, 3, 1 puis aucun titre par rubrique) ; si même le résumé ne tient pas, les candidats
+    les mieux classés sont gardés et le nombre d'omis est signalé.
+    """
+    for max_items in detail_levels:
+        text = build_chatbot_context(result, contexte, period_label, max_items)
+        if len(text) <= max_chars:
+            return text
+
+    candidates_data = result.get("candidates", {})
+    ranked = sorted(candidates_data.items(), key=lambda x: x[1].get("score", {}).get("total", 0), reverse=True)
+    lines = [f"=== DONNEES {contexte.upper()} - Periode: {period_label} ===", ""]
+    size = sum(len(line) + 1 for line in lines)
+    kept = 0
+    for cid, data in ranked:
+        block = _chatbot_candidate_block(cid, data, 0, result.get("score_weights"))
+        block_size = sum(len(line) + 1 for line in block)
+        if size + block_size > max_chars - 100:
+            break
+        lines.extend(block)
+        size += block_size
+        kept += 1
+    if kept < len(ranked):
+        lines.append(f"({len(ranked) - kept} autres candidats omis, moins bien classés)")
+    return "\n".join(lines)
+
+
+@st.cache_data(show_spinner=False)
+def summarize_other_context(cache_file: str, mtime: float, contexte: str,
+                            max_chars: int = CHATBOT_OTHER_CONTEXT_MAX_CHARS) -> str:
+    """
+    Résumé YouTube de l'autre contexte depuis son cache, recalculé seulement quand le fichier
+    change (mtime fait partie de la clé). Candidats classés par vues, borné à max_chars.
+    """
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            other_cache = json.load(f)
+    except:
+        return ""  # Pas de cache disponible pour l'autre contexte
+    if not other_cache.get("data"):
+        return ""
+
+    totals = []
+    for name, cdata in other_cache.get("data", {}).items():
+        if cdata.get("videos"):
+            totals.append((sum(v.get("views", 0) for v in cdata["videos"]), name, len(cdata["videos"])))
+    totals.sort(reverse=True)
+
+    lines = [f"\n\n--- Données {contexte.upper()} (cache) ---\n"]
+    size = len(lines[0])
+    for total_views, name, count in totals:
+        line = f"- {name}: {total_views:,} vues YouTube ({count} vidéos)"
+        if size + len(line) + 1 > max_chars:
+            break
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def get_chatbot_context(result: Dict, contexte: str, period_label: str, snapshot_key: str,
+                        question: str = "") -> str:
+    """
+    Contexte complet du chatbot. Les chiffres (données affichées + résumé de l'autre contexte)
+    sont matérialisés une fois par instantané de résultats et mémorisés en session ; les titres
+    sont ceux de l'index BM25 les plus pertinents pour la question. Sans titre pertinent, on
+    retombe sur les titres récents par candidat. Chiffres, titres retrouvés, résumé de l'autre
+    contexte et sauts de ligne de jonction tiennent ensemble dans CHATBOT_CONTEXT_MAX_CHARS.
+    """
+    other_contexte = "national" if contexte == "paris" else "paris"
+    other_cache_file = get_context_files(other_contexte)["youtube_cache"]
+    try:
+        other_mtime = os.path.getmtime(other_cache_file)
+    except:
+        other_mtime = None
+
+    memo_key = (snapshot_key, period_label, other_mtime)
+    memo = st.session_state.get("chatbot_context_memo")
+    if not memo or memo["key"] != memo_key:
+        numbers_max = CHATBOT_CONTEXT_MAX_CHARS - CHATBOT_OTHER_CONTEXT_MAX_CHARS - 1
+        memo = {
+            "key": memo_key,
+            "detailed": build_bounded_chatbot_context(result, contexte, period_label, max_chars=numbers_max),
+            "compact": build_bounded_chatbot_context(
+                result, contexte, period_label,
+                max_chars=numbers_max - CHATBOT_RETRIEVAL_MAX_CHARS, detail_levels=(0,)),
+            "other": summarize_other_context(other_cache_file, other_mtime, other_contexte) if other_mtime is not None else "",
+        }
+        st.session_state.chatbot_context_memo = memo
+
+    refresh_title_index()
+    retrieval_max = CHATBOT_RETRIEVAL_MAX_CHARS - len(CHATBOT_RETRIEVAL_HEADER) - 2
+    hits = search_title_index(question, max_chars=retrieval_max) if question else []
+    if hits:
+        context_parts = [memo["compact"], CHATBOT_RETRIEVAL_HEADER, *hits]
+    else:
+        context_parts = [memo["detailed"]]
+    context_parts.append(memo["other"])
+    return "\n".join(part for part in context_parts if part)
+
 
-    system_prompt = """Tu es un assistant pour Reconquête qui analyse la visibilité médiatique des personnalités politiques françaises.
+def build_chatbot_system_prompt(data_context: str) -> str:
+    """Prompt système du chatbot avec les données actuelles"""
+    return """Tu es un assistant pour Reconquête qui analyse la visibilité médiatique des personnalités politiques françaises.
 
 CONTEXTE :
 - Sarah Knafo est la candidate Reconquête à suivre pour Paris 2026
@@ -1385,6 +2484,14 @@ DONNÉES ACTUELLES :
 
 """ + data_context
 
+
+def get_chatbot_response(question: str, data_context: str, api_key: str) -> str:
+    """Envoie une question au chatbot et retourne la réponse"""
+    if not api_key:
+        return "Assistant non configuré."
+
+    system_prompt = build_chatbot_system_prompt(data_context)
+
     try:
         client = anthropic.Anthropic(api_key=api_key)
         response = client.messages.create(
@@ -1406,47 +2513,215 @@ DONNÉES ACTUELLES :
         return "Une erreur est survenue, réessayez plus tard."
 
 
-def log_chatbot_conversation(question: str, response: str, contexte: str, period: str, candidats: List[str]):
-    """Log silencieux des conversations vers JSONBin (privé)"""
-    if not JSONBIN_API_KEY or not JSONBIN_BIN_ID:
-        return
+def stream_chatbot_response(question: str, data_context: str, api_key: str):
+    """
+    Générateur de la réponse du chatbot, morceau par morceau (API messages en streaming).
+    Renvoie (valeur de StopIteration) True si la réponse est complète. Si le flux échoue avant
+    le premier morceau, repli sur get_chatbot_response ; s'il s'interrompt en cours de route,
+    la réponse partielle est gardée mais marquée incomplète.
+    """
+    if not api_key:
+        yield "Assistant non configuré."
+        return False
 
+    started = False
     try:
-        # Récupérer les conversations existantes
-        headers = {
-            "X-Master-Key": JSONBIN_API_KEY,
-            "Content-Type": "application/json"
-        }
-
-        get_url = f"https://api.jsonbin.io/v3/b/{JSONBIN_BIN_ID}/latest"
-        resp = requests.get(get_url, headers=headers, timeout=5)
-
-        if resp.status_code == 200:
-            data = resp.json().get("record", {"conversations": []})
-        else:
-            data = {"conversations": []}
-
-        # Ajouter la nouvelle conversation
-        data["conversations"].append({
-            "timestamp": datetime.now().isoformat(),
-            "contexte": contexte,
-            "period": period,
-            "candidats": candidats,
-            "question": question,
-            "response": response
-        })
-
-        # Garder les 100 dernières conversations max (limite 100KB JSONBin gratuit)
-        data["conversations"] = data["conversations"][-100:]
+        client = anthropic.Anthropic(api_key=api_key)
+        with client.messages.stream(
+            model="claude-3-haiku-20240307",
+            max_tokens=1024,
+            system=build_chatbot_system_prompt(data_context),
+            messages=[{"role": "user", "content": question}]
+        ) as stream:
+            for text in stream.text_stream:
+                started = True
+                yield text
+        return started
+    except Exception as e:
+        if started:
+            logger.warning(f"[CHATBOT] Flux interrompu: {e}")
+            return False
+        logger.warning(f"[CHATBOT] Streaming indisponible, réponse complète: {e}")
+
+    response = get_chatbot_response(question, data_context, api_key)
+    yield response
+    return response not in CHATBOT_UNCACHED_RESPONSES
+
+
+CHATBOT_ANSWER_TTL = 3600       # Secondes de validité d'une réponse en cache
+CHATBOT_ANSWER_MAX_ENTRIES = 256
+# Réponses de repli (erreurs, assistant absent) jamais mises en cache
+CHATBOT_UNCACHED_RESPONSES = {
+    "Assistant non configuré.",
+    "Demandez à Kléothime de recharger l'assistant.",
+    "Une erreur est survenue, réessayez plus tard.",
+}
+
+
+@st.cache_resource(show_spinner=False)
+def get_chatbot_answer_store() -> Dict:
+    """Cache LRU des réponses du chatbot, partagé entre sessions"""
+    return {"lock": threading.Lock(), "entries": OrderedDict()}
+
+
+def normalize_question(question: str) -> str:
+    """Forme normalisée d'une question : minuscules, sans accents ni ponctuation, espaces réduits"""
+    return " ".join(re.findall(r"\w+", fold_text(question)))
+
+
+def stream_cached_chatbot_response(question: str, data_context: str, api_key: str):
+    """
+    Réponse du chatbot en flux via le cache : clé = question normalisée + hash du contexte de
+    données, durée de vie CHATBOT_ANSWER_TTL, éviction LRU au-delà de CHATBOT_ANSWER_MAX_ENTRIES.
+    Une réponse en cache sort d'un bloc ; seules les réponses complètes sont mises en cache.
+    Le lock n'est jamais tenu pendant un yield (le consommateur peut s'arrêter en cours de route).
+    """
+    key = hashlib.md5(f"{normalize_question(question)}\0{data_context}".encode()).hexdigest()
+    store = get_chatbot_answer_store()
+    cached_response = None
+    with store["lock"]:
+        cached = store["entries"].get(key)
+        if cached and time.monotonic() - cached["at"] < CHATBOT_ANSWER_TTL:
+            store["entries"].move_to_end(key)
+            cached_response = cached["response"]
+    if cached_response is not None:
+        yield cached_response
+        return
+
+    chunks = []
+    stream = stream_chatbot_response(question, data_context, api_key)
+    while True:
+        try:
+            chunk = next(stream)
+        except StopIteration as stop:
+            complete = stop.value
+            break
+        chunks.append(chunk)
+        yield chunk
+
+    if complete:
+        with store["lock"]:
+            store["entries"][key] = {"response": "".join(chunks), "at": time.monotonic()}
+            store["entries"].move_to_end(key)
+            while len(store["entries"]) > CHATBOT_ANSWER_MAX_ENTRIES:
+                store["entries"].popitem(last=False)
 
-        # Sauvegarder
-        put_url = f"https://api.jsonbin.io/v3/b/{JSONBIN_BIN_ID}"
-        requests.put(put_url, headers=headers, json=data, timeout=5)
 
+CHAT_LOG_SPOOL_FILE = "chat_log_spool.jsonl"           # Conversations en attente d'envoi
+CHAT_LOG_SENDING_FILE = "chat_log_spool.sending.jsonl"  # Lot en cours d'envoi (repris après échec)
+CHAT_LOG_BATCH_DELAY = 2  # Secondes d'attente pour regrouper les conversations d'un même lot
+CHAT_LOG_MAX_CONVERSATIONS = 100  # Limite 100KB JSONBin gratuit
+
+
+@st.cache_resource(show_spinner=False)
+def get_chat_log_store() -> Dict:
+    """File d'envoi des conversations, partagée entre sessions"""
+    return {"lock": threading.Lock(), "thread": None}
+
+
+def log_chatbot_conversation(question: str, response: str, contexte: str, period: str, candidats: List[str]):
+    """
+    Log silencieux des conversations vers JSONBin (privé), sans attente : la conversation est
+    ajoutée au spool JSONL local, un envoyeur en arrière-plan l'expédie par lots.
+    """
+    if not JSONBIN_API_KEY or not JSONBIN_BIN_ID:
+        return
+
+    record = {
+        "timestamp": datetime.now().isoformat(),
+        "contexte": contexte,
+        "period": period,
+        "candidats": candidats,
+        "question": question,
+        "response": response
+    }
+    store = get_chat_log_store()
+    try:
+        with store["lock"]:
+            with open(CHAT_LOG_SPOOL_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if store["thread"] is None:
+                store["thread"] = threading.Thread(target=_chat_log_worker, args=(store,), daemon=True)
+                store["thread"].start()
     except Exception:
         pass  # Silencieux - ne jamais bloquer l'app
 
 
+def upload_chat_logs(conversations: List[Dict]) -> bool:
+    """Fusionne un lot de conversations dans le bin JSONBin (une lecture, une écriture)"""
+    resp = _jsonbin_request("GET", f"{JSONBIN_API_URL}/{JSONBIN_BIN_ID}/latest", JSONBIN_API_KEY)
+    if resp is None or resp.status_code not in (200, 404):
+        return False
+    data = resp.json().get("record", {}) if resp.status_code == 200 else {}
+    if not isinstance(data, dict):
+        data = {}
+    previous = data.get("conversations")
+    if not isinstance(previous, list):
+        previous = []
+
+    # Garder les 100 dernières conversations max
+    data["conversations"] = (previous + conversations)[-CHAT_LOG_MAX_CONVERSATIONS:]
+
+    resp = _jsonbin_request("PUT", f"{JSONBIN_API_URL}/{JSONBIN_BIN_ID}", JSONBIN_API_KEY, data)
+    return resp is not None and resp.status_code == 200
+
+
+def _chat_log_worker(store: Dict):
+    """
+    Envoie le spool par lots jusqu'à ce qu'il soit vide. Une erreur pendant un tour compte comme
+    un envoi échoué (3 échecs consécutifs : abandon jusqu'au prochain log) ; le thread est
+    toujours libéré en sortie pour qu'un prochain log puisse en relancer un.
+    """
+    failures = 0
+    try:
+        while True:
+            time.sleep(CHAT_LOG_BATCH_DELAY)
+            batch = []
+            try:
+                with store["lock"]:
+                    # Lot à envoyer = reliquat d'un envoi échoué + nouvelles conversations
+                    if os.path.exists(CHAT_LOG_SPOOL_FILE):
+                        with open(CHAT_LOG_SPOOL_FILE, "r", encoding="utf-8") as src:
+                            pending = src.read()
+                        with open(CHAT_LOG_SENDING_FILE, "a", encoding="utf-8") as dst:
+                            dst.write(pending)
+                        os.remove(CHAT_LOG_SPOOL_FILE)
+                    if not os.path.exists(CHAT_LOG_SENDING_FILE):
+                        store["thread"] = None
+                        return
+
+                try:
+                    with open(CHAT_LOG_SENDING_FILE, "r", encoding="utf-8") as f:
+                        for line in f:
+                            try:
+                                batch.append(json.loads(line))
+                            except:
+                                continue  # Ligne tronquée : ignorée
+                except:
+                    pass
+
+                sent = upload_chat_logs(batch)
+                if sent:
+                    os.remove(CHAT_LOG_SENDING_FILE)
+            except Exception as e:
+                logger.warning(f"[CHAT LOG] Erreur pendant l'envoi: {e}")
+                sent = False
+
+            if sent:
+                failures = 0
+                continue
+
+            failures += 1
+            if failures >= 3:
+                logger.warning(f"[CHAT LOG] Envoi impossible, {len(batch)} conversations gardées dans le spool")
+                return
+            time.sleep(5 * 2 ** failures)
+    finally:
+        with store["lock"]:
+            if store["thread"] is threading.current_thread():
+                store["thread"] = None
+
+
 # =============================================================================
 # CACHE GOOGLE TRENDS - SYSTÈME INTELLIGENT PAR PÉRIODE
 # =============================================================================
@@ -1454,6 +2729,7 @@ def log_chatbot_conversation(question: str, response: str, contexte: str, period
 # TRENDS_CACHE_FILE est défini plus haut et sera mis à jour dynamiquement selon le contexte
 TRENDS_24H_COOLDOWN_HOURS = 2  # Cooldown de 2h pour la période 24h
 TRENDS_LONG_PERIOD_MAX_PER_DAY = 1  # Max 1 requête/jour pour 7j, 14j, 30j
+TRENDS_FIXED_PERIOD_DAYS = (1, 7, 14, 30)  # Périodes se terminant aujourd'hui, servies par get_google_trends
 
 
 def get_period_type(start_date: date, end_date: date) -> str:
@@ -1631,53 +2907,194 @@ def get_trends_cache_age_hours(cache_key: str = None) -> float:
         return float('inf')
 
 
-def load_history() -> List[Dict]:
-    """Charge l'historique (cloud prioritaire, sinon local)"""
-    bin_id, api_key = get_cloud_config()
+HISTORY_CACHE_TTL = 120  # Secondes pendant lesquelles l'historique mémorisé est servi sans vérification
 
-    if bin_id and api_key:
-        cloud_history = load_history_cloud(bin_id, api_key)
-        if cloud_history:
-            return cloud_history
 
+@st.cache_resource(show_spinner=False)
+def get_history_store() -> Dict:
+    """Historique mémorisé par fichier de contexte et bin cloud, partagé entre sessions"""
+    return {"lock": threading.Lock(), "entries": {}}
+
+
+def _history_file_mtime() -> Optional[float]:
+    """Date de modification du fichier d'historique local (validateur de la copie locale)"""
+    try:
+        return os.path.getmtime(HISTORY_FILE)
+    except:
+        return None
+
+
+def _read_local_history() -> List[Dict]:
+    """Lit le fichier d'historique local"""
     try:
         with open(HISTORY_FILE, "r", encoding="utf-8") as f:
             return json.load(f)
     except:
         return []
 
-def save_history(history: List[Dict]) -> bool:
-    """Sauvegarde l'historique (cloud + local)"""
-    bin_id, api_key = get_cloud_config()
-
-    cloud_ok = False
-    if bin_id and api_key:
-        cloud_ok = save_history_cloud(history, bin_id, api_key)
 
+def _write_local_history(history: List[Dict]) -> bool:
+    """Écrit le fichier d'historique local"""
     try:
-        cutoff = (datetime.now() - timedelta(days=60)).strftime("%Y-%m-%d")
-        history = [h for h in history if h.get("date", "") >= cutoff]
         with open(HISTORY_FILE, "w", encoding="utf-8") as f:
             json.dump(history, f, indent=2, ensure_ascii=False)
+        return True
     except:
-        pass
+        return False
 
-    return cloud_ok
 
-def add_to_history(data: Dict, period_label: str, end_date) -> List[Dict]:
-    """Ajoute les données actuelles à l'historique (enregistre à la date de fin de période)"""
-    history = load_history()
+def merge_histories(remote: List[Dict], local: List[Dict], today: Optional[date] = None) -> List[Dict]:
+    """
+    Fusion case par case (history_bucket). Sans agrégat, union par date : à date égale, l'entrée
+    au timestamp le plus récent l'emporte. Si un côté a un agrégat hebdo/mensuel dans la case, ses
+    journalières y sont peut-être déjà comptées : on garde le côté qui couvre le plus de jours
+    ("samples") et, de l'autre, seules les journalières postérieures à ce qu'il couvre.
+    """
+    buckets = {}
+    for side, entries in enumerate((remote, local)):
+        for entry in entries:
+            buckets.setdefault(history_bucket(entry["date"], today), ([], []))[side].append(entry)
+
+    merged = []
+    for sides in buckets.values():
+        if any(h.get("resolution") for entries in sides for h in entries):
+            coverage = [(sum(h.get("samples", 1) for h in entries),
+                         max((h.get("timestamp") or "" for h in entries), default="")) for entries in sides]
+            kept, other = (sides[1], sides[0]) if coverage[1] >= coverage[0] else sides
+            last_covered = max(h["date"] for h in kept)
+            candidates = kept + [h for h in other if not h.get("resolution") and h["date"] > last_covered]
+        else:
+            candidates = sides[0] + sides[1]
+
+        by_date = {}
+        for entry in candidates:
+            current = by_date.get(entry["date"])
+            if current is None or (entry.get("timestamp") or "") >= (current.get("timestamp") or ""):
+                by_date[entry["date"]] = entry
+        merged.extend(by_date.values())
+    return compact_history(merged, today)
 
-    # Utiliser la date de fin de période analysée
-    record_date = end_date.strftime("%Y-%m-%d")
+
+def load_history() -> List[Dict]:
+    """
+    Charge l'historique, local d'abord, via la copie mémorisée : aucune lecture pendant
+    HISTORY_CACHE_TTL, puis revalidation (date de modification du fichier local, requête
+    conditionnelle sur l'ETag du bin cloud). Une version cloud modifiée est fusionnée avec
+    le local, les entrées pas encore synchronisées sont conservées et renvoyées au cloud.
+    Les requêtes réseau se font hors du verrou partagé.
+    """
+    bin_id, api_key = get_cloud_config()
+    store = get_history_store()
+    key = f"{HISTORY_FILE}|{bin_id or ''}"
+
+    with store["lock"]:
+        memo = store["entries"].get(key)
+        if memo and time.monotonic() - memo["checked_at"] < HISTORY_CACHE_TTL:
+            return list(memo["history"])
+        etag = memo["etag"] if memo else None
+
+    cloud = load_history_cloud(bin_id, api_key, etag) if bin_id and api_key else None
+
+    with store["lock"]:
+        # Relu après les requêtes : une sauvegarde a pu passer entre-temps
+        memo = store["entries"].get(key)
+        mtime = _history_file_mtime()
+        local = memo["history"] if memo and memo["mtime"] == mtime else _read_local_history()
+        history = local
+
+        if cloud and not cloud["not_modified"]:
+            etag = cloud["etag"]
+            if cloud["history"]:
+                history = merge_histories(cloud["history"], local)
+                if history != local:
+                    _write_local_history(history)
+                    mtime = _history_file_mtime()
+                if history != cloud["history"]:
+                    schedule_history_sync(history, bin_id, api_key)
+
+        store["entries"][key] = {"history": history, "etag": etag, "mtime": mtime,
+                                 "checked_at": time.monotonic()}
+        return list(history)
+
+def save_history(history: List[Dict], wait_cloud: bool = False) -> bool:
+    """
+    Sauvegarde l'historique en local (compacté), met à jour la copie mémorisée et programme
+    l'envoi cloud en arrière-plan. Retourne le succès cloud, comme avant : avec wait_cloud,
+    attend la fin de l'envoi ; sinon l'envoi n'est pas attendu et le retour indique seulement
+    qu'il a été programmé (False sans configuration cloud).
+    """
+    bin_id, api_key = get_cloud_config()
+    # Compactage par paliers à chaque écriture (taille bornée)
+    history = compact_history(history)
+    if not _write_local_history(history):
+        logger.warning(f"[HISTORY] Écriture locale impossible ({HISTORY_FILE})")
+
+    store = get_history_store()
+    key = f"{HISTORY_FILE}|{bin_id or ''}"
+    with store["lock"]:
+        memo = store["entries"].get(key)
+        store["entries"][key] = {"history": history, "etag": memo["etag"] if memo else None,
+                                 "mtime": _history_file_mtime(), "checked_at": time.monotonic()}
+
+    if not bin_id or not api_key:
+        return False
+    schedule_history_sync(history, bin_id, api_key)
+    if not wait_cloud:
+        return True
+    wait_history_sync()
+    sync_store = get_history_sync_store()
+    with sync_store["lock"]:
+        return bool(sync_store["results"].get(bin_id))
+
+
+# Version du calcul enregistrée dans l'historique (entrées sans version : 1) et composantes
+# dont l'entrée a changé à chaque version (2 : presse comptée en sujets distincts, dédupliqués)
+SCORE_VERSION = 2
+SCORE_VERSION_CHANGES = {2: ("press",)}
+
+
+def score_version_changes(version_a: int, version_b: int) -> set:
+    """Composantes calculées différemment entre deux versions du score"""
+    low, high = sorted((version_a, version_b))
+    return {c for version, components in SCORE_VERSION_CHANGES.items() if low < version <= high for c in components}
+
+
+# Entrées du score conservées dans l'historique (même noms que calculate_scores_batch)
+HISTORY_METRIC_KEYS = ("wiki_views", "press_count", "press_domains", "trends_score", "youtube_views", "youtube_available")
+
+
+def add_to_history(data: Dict, period_label: str, end_date, metrics: Dict = None,
+                   missing: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Ajoute les données actuelles à l'historique (enregistre à la date de fin de période).
+    Si metrics est fourni, l'entrée garde aussi le vecteur brut d'entrée du score en colonnes
+    (une liste par métrique, alignée sur "candidates") pour pouvoir la re-scorer plus tard.
+    missing : composantes non reconstituées d'une entrée « date passée » (voir make_history_entry).
+    """
+    history = load_history()
+    entry = make_history_entry(data, period_label, end_date, metrics, missing)
 
     # Supprimer l'entrée existante pour cette date si elle existe
-    history = [h for h in history if h.get("date") != record_date]
+    history = [h for h in history if h.get("date") != entry["date"]]
+    history.append(entry)
+    save_history(history)
+
+    return history
 
+
+def make_history_entry(data: Dict, period_label: str, end_date, metrics: Dict = None,
+                       missing: Optional[List[str]] = None) -> Dict:
+    """
+    Construit une entrée d'historique datée de la fin de période, avec la contribution de chaque
+    composante au total et la version du calcul (SCORE_VERSION). Une entrée « date passée »
+    (missing fourni) est marquée as_of et liste les composantes non reconstituées, exclues des
+    comparaisons (history_comparable_score).
+    """
     entry = {
-        "date": record_date,
+        "date": end_date.strftime("%Y-%m-%d"),
         "timestamp": datetime.now().isoformat(),
         "period": period_label,
+        "score_version": SCORE_VERSION,
         "scores": {}
     }
 
@@ -1689,31 +3106,223 @@ def add_to_history(data: Dict, period_label: str, end_date) -> List[Dict]:
             "wiki": d["wikipedia"]["views"],
             "youtube": d["youtube"].get("total_views", 0) if d["youtube"].get("available") else 0
         }
+        for component in SCORE_COMPONENTS:
+            if f"contrib_{component}" in d["score"]:
+                entry["scores"][d["info"]["name"]][f"contrib_{component}"] = d["score"][f"contrib_{component}"]
 
-    history.append(entry)
-    save_history(history)
+    if missing is not None:
+        entry["as_of"] = True
+        entry["missing"] = sorted(missing)
 
-    return history
+    if metrics:
+        entry["period_days"] = metrics["period_days"]
+        entry["candidates"] = [CANDIDATES[cid]["name"] for cid in metrics["candidates"]]
+        entry["metrics"] = {key: list(metrics[key]) for key in HISTORY_METRIC_KEYS}
 
-def get_historical_comparison(candidate_name: str, current_score: float, reference_date: str = None) -> Dict:
-    """Compare le score actuel avec l'historique sur plusieurs périodes"""
-    history = load_history()
+    return entry
 
-    if not history:
-        return {"available": False}
 
-    past_scores = []
+def history_bucket(date_str: str, today: Optional[date] = None) -> str:
+    """
+    Case de rétention d'une date : le jour même dans les HISTORY_DAILY_DAYS derniers jours,
+    la semaine ISO jusqu'à HISTORY_WEEKLY_DAYS, le mois au-delà.
+    """
+    today = today or date.today()
+    day = date.fromisoformat(date_str)
+    age = (today - day).days
+    if age < HISTORY_DAILY_DAYS:
+        return f"d:{date_str}"
+    if age < HISTORY_WEEKLY_DAYS:
+        iso_year, iso_week, _ = day.isocalendar()
+        return f"w:{iso_year}-W{iso_week:02d}"
+    return f"m:{date_str[:7]}"
+
+
+def _merge_history_entries(entries: List[Dict], bucket: str) -> Dict:
+    """
+    Agrège les entrées d'une même semaine ou d'un même mois : scores et métriques brutes
+    moyennés par candidat, pondérés par le nombre de jours déjà agrégés ("samples").
+    """
+    entries = sorted(entries, key=lambda h: h["date"])
+    weights = [h.get("samples", 1) for h in entries]
+    resolution = "week" if bucket.startswith("w:") else "month"
+
+    score_sums, score_weights, field_weights = {}, {}, {}
+    for entry, w in zip(entries, weights):
+        for name, values in entry.get("scores", {}).items():
+            sums = score_sums.setdefault(name, {})
+            fields = field_weights.setdefault(name, {})
+            for field, value in values.items():
+                sums[field] = sums.get(field, 0) + value * w
+                fields[field] = fields.get(field, 0) + w
+            score_weights[name] = score_weights.get(name, 0) + w
+    # Contributions gardées seulement si toutes les entrées agrégées les portent
+    for name, sums in score_sums.items():
+        for field in [f for f in sums if f.startswith("contrib_")]:
+            if field_weights[name][field] != score_weights[name]:
+                del sums[field]
+
+    merged = {
+        "date": entries[-1]["date"],
+        "timestamp": entries[-1].get("timestamp"),
+        "period": f"{'Semaine' if resolution == 'week' else 'Mois'} {bucket[2:]}",
+        "resolution": resolution,
+        "samples": sum(weights),
+        "score_version": min(h.get("score_version", 1) for h in entries),
+        "scores": {
+            name: {field: round(total / score_weights[name], 1) for field, total in sums.items()}
+            for name, sums in score_sums.items()
+        }
+    }
+    if any(h.get("as_of") for h in entries):
+        merged["as_of"] = True
+        merged["missing"] = sorted({c for h in entries for c in h.get("missing", [])})
+
+    # Métriques brutes moyennées (re-scoring des agrégats), candidat par candidat
+    with_metrics = [(h, w) for h, w in zip(entries, weights) if h.get("metrics") and h.get("candidates")]
+    if with_metrics:
+        metric_sums, metric_weights = {}, {}
+        for entry, w in with_metrics:
+            for pos, name in enumerate(entry["candidates"]):
+                sums = metric_sums.setdefault(name, dict.fromkeys(HISTORY_METRIC_KEYS, 0.0))
+                for key in HISTORY_METRIC_KEYS:
+                    sums[key] += float(entry["metrics"][key][pos]) * w
+                metric_weights[name] = metric_weights.get(name, 0) + w
+        names = list(metric_sums)
+        merged["period_days"] = with_metrics[-1][0].get("period_days")
+        merged["candidates"] = names
+        merged["metrics"] = {
+            key: [metric_sums[name][key] / metric_weights[name] for name in names]
+            for key in HISTORY_METRIC_KEYS
+        }
+        # Disponibilité YouTube : vraie si au moins une entrée l'avait
+        merged["metrics"]["youtube_available"] = [v > 0 for v in merged["metrics"]["youtube_available"]]
+
+    return merged
+
+
+def compact_history(history: List[Dict], today: Optional[date] = None) -> List[Dict]:
+    """
+    Rétention par paliers : entrées journalières sur HISTORY_DAILY_DAYS jours, une entrée
+    agrégée par semaine ISO jusqu'à HISTORY_WEEKLY_DAYS jours, une par mois au-delà.
+    Idempotent : un agrégat seul dans sa case est conservé tel quel.
+    """
+    buckets = {}
     for entry in history:
-        if candidate_name in entry.get("scores", {}):
-            past_scores.append({
-                "date": entry["date"],
-                "score": entry["scores"][candidate_name]["total"]
-            })
+        buckets.setdefault(history_bucket(entry["date"], today), []).append(entry)
+
+    compacted = []
+    for bucket, entries in buckets.items():
+        if bucket.startswith("d:") or len(entries) == 1 and entries[0].get("resolution"):
+            compacted.extend(entries)
+        else:
+            compacted.append(_merge_history_entries(entries, bucket))
+    return sorted(compacted, key=lambda h: h["date"])
 
-    if not past_scores:
-        return {"available": False}
 
-    past_scores.sort(key=lambda x: x["date"])
+def rescore_history(history: List[Dict], weights=None) -> List[Dict]:
+    """
+    Re-score toutes les entrées ayant leur vecteur brut, selon la formule actuelle et la pondération
+    donnée, en un seul calcul vectorisé (une colonne par entrée). Les entrées anciennes sans
+    métriques gardent leur total enregistré. Retourne des copies, l'historique n'est pas modifié.
+    La version du score est conservée : les métriques d'une entrée antérieure (presse non
+    dédupliquée en version 1) ne peuvent pas être recalculées par la formule seule.
+    """
+    scorable = [i for i, h in enumerate(history) if h.get("metrics") and h.get("candidates")]
+    if not scorable:
+        return history
+
+    names = sorted({name for i in scorable for name in history[i]["candidates"]})
+    name_pos = {name: k for k, name in enumerate(names)}
+    shape = (len(names), len(scorable))
+    columns = {key: np.zeros(shape) for key in HISTORY_METRIC_KEYS}
+    present = np.zeros(shape, dtype=bool)
+
+    for col, i in enumerate(scorable):
+        rows = [name_pos[name] for name in history[i]["candidates"]]
+        present[rows, col] = True
+        for key in HISTORY_METRIC_KEYS:
+            columns[key][rows, col] = history[i]["metrics"][key]
+
+    # Candidats absents d'une entrée : métriques nulles, sans effet sur les maxima de la colonne
+    batch = calculate_scores_batch(
+        wiki_views=columns["wiki_views"],
+        press_count=columns["press_count"],
+        press_domains=columns["press_domains"],
+        trends_score=columns["trends_score"],
+        youtube_views=columns["youtube_views"],
+        youtube_available=columns["youtube_available"].astype(bool),
+        period_days=[history[i].get("period_days", 7) for i in scorable],
+        weights=weights
+    )
+    fields = ["total"] + [f"contrib_{component}" for component in SCORE_COMPONENTS]
+
+    rescored = list(history)
+    for col, i in enumerate(scorable):
+        entry = dict(history[i])
+        entry["scores"] = {
+            name: dict(values, **{field: float(batch[field][name_pos[name], col]) for field in fields})
+            if present[name_pos[name], col] else values
+            for name, values in history[i].get("scores", {}).items()
+        }
+        rescored[i] = entry
+    return rescored
+
+
+def build_history_index(history: List[Dict]) -> Dict[str, Dict[str, List]]:
+    """
+    Index de l'historique par candidat, construit en une passe : {nom: {"dates": [...],
+    "scores": [...], "values": [...], "missing": [...], "versions": [...]}} triés par date (ordre
+    d'origine conservé à date égale) ; values = scores détaillés, missing = composantes non
+    reconstituées, versions = version du calcul du score.
+    """
+    index = {}
+    for entry in sorted(history, key=lambda h: h["date"]):
+        for name, values in entry.get("scores", {}).items():
+            column = index.setdefault(name, {"dates": [], "scores": [], "values": [], "missing": [], "versions": []})
+            column["dates"].append(entry["date"])
+            column["scores"].append(values["total"])
+            column["values"].append(values)
+            column["missing"].append(tuple(entry.get("missing", ())))
+            column["versions"].append(entry.get("score_version", 1))
+    return index
+
+
+def history_position_at(column: Dict[str, List], target_date: str) -> Optional[int]:
+    """Position de la dernière entrée à la date donnée ou avant (recherche dichotomique)"""
+    pos = bisect_right(column["dates"], target_date)
+    return pos - 1 if pos else None
+
+
+def history_comparable_score(values: Dict, excluded) -> Optional[float]:
+    """Total sans les composantes exclues (None si leurs contributions ne sont pas enregistrées)"""
+    if not excluded:
+        return values["total"]
+    contribs = [values.get(f"contrib_{component}") for component in excluded]
+    if any(c is None for c in contribs):
+        return None
+    return values["total"] - sum(contribs)
+
+
+def get_historical_comparison(candidate_name: str, current_score: float, reference_date: str = None,
+                              history: List[Dict] = None, history_index: Dict = None,
+                              current_values: Dict = None, current_missing=(),
+                              current_version: int = SCORE_VERSION) -> Dict:
+    """
+    Compare le score actuel avec l'historique sur plusieurs périodes. L'index par candidat
+    (build_history_index) peut être fourni pour enchaîner les candidats sans le reconstruire.
+    Si l'une des deux entrées est une « date passée », les composantes qu'elle n'a pas pu
+    reconstituer sont retirées des deux totaux comparés (listées dans "excluded") ; de même pour
+    les composantes dont le calcul a changé entre leurs deux versions du score.
+    """
+    if history_index is None:
+        if history is None:
+            history = load_history()
+        history_index = build_history_index(history)
+
+    column = history_index.get(candidate_name)
+    if not column:
+        return {"available": False}
 
     # Utiliser la date de référence fournie ou la date du jour
     if reference_date:
@@ -1727,28 +3336,28 @@ def get_historical_comparison(candidate_name: str, current_score: float, referen
         "14j": (ref_date - timedelta(days=14)).strftime("%Y-%m-%d"),
         "30j": (ref_date - timedelta(days=30)).strftime("%Y-%m-%d"),
     }
-
-    scores_at_periods = {}
-    for period_name, target_date in periods.items():
-        # Trouver le score le plus proche avant ou à cette date
-        score = None
-        for ps in past_scores:
-            if ps["date"] <= target_date:
-                score = ps["score"]
-        scores_at_periods[period_name] = score
+    current_values = current_values or {"total": current_score}
 
     # Calculer les variations pour chaque période
-    changes = {}
-    for period_name, old_score in scores_at_periods.items():
-        if old_score is not None:
-            changes[period_name] = round(current_score - old_score, 1)
-        else:
+    changes, excluded_by_period = {}, {}
+    for period_name, target_date in periods.items():
+        pos = history_position_at(column, target_date)
+        if pos is None:
             changes[period_name] = None
+            continue
+        excluded = sorted(set(current_missing) | set(column["missing"][pos])
+                          | score_version_changes(current_version, column["versions"][pos]))
+        current = history_comparable_score(current_values, excluded)
+        old = history_comparable_score(column["values"][pos], excluded)
+        changes[period_name] = round(current - old, 1) if current is not None and old is not None else None
+        if excluded:
+            excluded_by_period[period_name] = excluded
 
     return {
         "available": True,
-        "history": past_scores[-30:],
-        "changes": changes
+        "history": [{"date": d, "score": sc} for d, sc in zip(column["dates"][-30:], column["scores"][-30:])],
+        "changes": changes,
+        "excluded": excluded_by_period
     }
 
 # =============================================================================
@@ -1778,6 +3387,383 @@ def is_sarah_knafo(name: str, contexte: str = "paris") -> bool:
     return name == "Sarah Knafo" and contexte == "paris"
 
 
+# =============================================================================
+# MATCHING MULTI-MOTIFS (MÉDIAS, NOMS DE CANDIDATS)
+# =============================================================================
+
+# Apostrophes typographiques et tirets ramenés à une forme unique
+_FOLD_TRANSLATION = str.maketrans({"’": "'", "‘": "'", "`": "'", "-": " ", "–": " ", "—": " "})
+
+
+def fold_text(text: str) -> str:
+    """Normalise un texte pour le matching : minuscules, sans accents, apostrophes/tirets unifiés"""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).translate(_FOLD_TRANSLATION)
+
+
+@st.cache_resource(show_spinner=False)
+def compile_matcher(keywords: tuple) -> Dict:
+    """
+    Compile un ensemble de mots-clés en UNE regex d'alternation (mots entiers, accents ignorés).
+    keywords: tuple de str ou de paires (variante, forme canonique).
+    Les variantes les plus longues passent en premier ("bfmtv" avant "bfm").
+    Retourne {"pattern": re.Pattern, "canonical": {variante normalisée: forme canonique}}
+    """
+    canonical = {}
+    for kw in keywords:
+        variant, name = kw if isinstance(kw, tuple) else (kw, kw)
+        folded = " ".join(fold_text(variant).split())
+        if folded:
+            canonical.setdefault(folded, name)
+
+    if not canonical:
+        return {"pattern": None, "canonical": {}}
+
+    alternatives = sorted(canonical, key=len, reverse=True)
+    body = "|".join(re.escape(a).replace(r"\ ", r"\s+") for a in alternatives)
+    return {
+        "pattern": re.compile(rf"(?<!\w)(?:{body})(?!\w)"),
+        "canonical": canonical
+    }
+
+
+def match_first(matcher: Dict, folded_text: str) -> Optional[str]:
+    """Retourne la forme canonique du premier mot-clé trouvé dans un texte déjà normalisé"""
+    if matcher["pattern"] is None or not folded_text:
+        return None
+    m = matcher["pattern"].search(folded_text)
+    if not m:
+        return None
+    return matcher["canonical"].get(" ".join(m.group(0).split()))
+
+
+def get_name_matcher(candidate_name: str, last_name_only: bool = True) -> Dict:
+    """Matcher du nom de famille (ou de toutes les parties >= 3 lettres) d'un candidat"""
+    parts = candidate_name.split()
+    if last_name_only:
+        return compile_matcher(tuple(parts[-1:]))
+    return compile_matcher(tuple(p for p in parts if len(p) >= 3))
+
+
+def get_tv_radio_matcher() -> Dict:
+    """Matcher des médias TV/Radio (MEDIAS_TV_RADIO + variantes)"""
+    keywords = [(m, m) for m in MEDIAS_TV_RADIO]
+    for media, aliases in MEDIAS_TV_RADIO_ALIASES.items():
+        keywords += [(alias, media) for alias in aliases]
+    return compile_matcher(tuple(keywords))
+
+
+# =============================================================================
+# DÉDUPLICATION - CLUSTERING MINHASH/LSH DES TITRES
+# =============================================================================
+
+MINHASH_NUM_PERM = 64       # Taille de la signature MinHash
+MINHASH_BANDS = 16          # 16 bandes x 4 lignes -> seuil LSH ~0.5
+MINHASH_SHINGLE_SIZE = 5    # Shingles de 5 caractères
+MINHASH_SIMILARITY = 0.7    # Jaccard estimé minimal pour regrouper deux titres
+
+# Permutations par hachage multiply-shift ((a*h + b) mod 2^64) >> 32, a impair.
+# Graine fixe : mêmes signatures d'un refresh à l'autre
+_minhash_rng = np.random.default_rng(2026)
+_MINHASH_A = _minhash_rng.integers(0, 2**63, size=MINHASH_NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_MINHASH_B = _minhash_rng.integers(0, 2**63, size=MINHASH_NUM_PERM, dtype=np.uint64)
+
+
+def normalize_title(title: str, domain: str = "") -> str:
+    """Normalise un titre (sans accents ni ponctuation, sans le suffixe " - Source" de Google News)"""
+    if domain and title.endswith(domain):
+        title = re.sub(r"\s*[-–—|]\s*$", "", title[:-len(domain)])
+    return " ".join(re.sub(r"[^\w\s]", " ", fold_text(title)).split())
+
+
+def _minhash_signatures(texts: List[str]) -> np.ndarray:
+    """
+    Signatures MinHash (len(texts) x MINHASH_NUM_PERM) sur les shingles de caractères.
+    Tous les titres sont traités d'un bloc : hash glissant sur le texte concaténé,
+    puis minimum par titre via np.minimum.reduceat (pas de boucle Python par titre).
+    """
+    k = MINHASH_SHINGLE_SIZE
+    padded = [t.ljust(k) for t in texts]
+    lengths = np.array([len(t) for t in padded], dtype=np.int64)
+    codes = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+    # Hash glissant de chaque fenêtre de k caractères (arithmétique modulo 2^64)
+    n_windows = len(codes) - k + 1
+    rolling = np.zeros(n_windows, dtype=np.uint64)
+    for j in range(k):
+        rolling = rolling * np.uint64(1000003) + codes[j:j + n_windows]
+    rolling &= np.uint64(0xFFFFFFFF)
+
+    # Ne garder que les fenêtres entièrement contenues dans un titre
+    ends = np.cumsum(lengths)
+    owners = np.repeat(np.arange(len(padded)), lengths)[:n_windows]
+    valid = np.arange(n_windows) + k <= ends[owners]
+    shingles = rolling[valid]
+    starts = np.flatnonzero(np.r_[True, owners[valid][1:] != owners[valid][:-1]])
+
+    signatures = np.empty((len(padded), MINHASH_NUM_PERM), dtype=np.uint64)
+    for i in range(MINHASH_NUM_PERM):
+        permuted = (_MINHASH_A[i] * shingles + _MINHASH_B[i]) >> np.uint64(32)
+        signatures[:, i] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+
+def cluster_near_duplicates(texts: List[str]) -> np.ndarray:
+    """
+    Regroupe les textes quasi-identiques (MinHash + LSH par bandes).
+    Retourne pour chaque texte l'indice du représentant de son cluster (premier texte du cluster).
+    Complexité ~linéaire : seules les paires qui partagent un bucket LSH sont comparées.
+    Les textes vides restent isolés.
+    """
+    n = len(texts)
+    labels = np.arange(n)
+    non_empty = np.array([i for i, t in enumerate(texts) if t], dtype=np.int64)
+    if len(non_empty) < 2:
+        return labels
+
+    signatures = _minhash_signatures([texts[i] for i in non_empty])
+    rows = MINHASH_NUM_PERM // MINHASH_BANDS
+
+    # Paires candidates : voisins dans le tri des clés de bande
+    pairs_i, pairs_j = [], []
+    for band in range(MINHASH_BANDS):
+        cols = signatures[:, band * rows:(band + 1) * rows]
+        key = cols[:, 0].copy()
+        for c in range(1, rows):
+            key = key * np.uint64(0x9E3779B97F4A7C15) ^ cols[:, c]
+        order = np.argsort(key, kind="stable")
+        same = key[order][1:] == key[order][:-1]
+        pairs_i.append(order[:-1][same])
+        pairs_j.append(order[1:][same])
+
+    pi = np.concatenate(pairs_i)
+    pj = np.concatenate(pairs_j)
+    if len(pi) == 0:
+        return labels
+
+    # Vérification : similarité estimée = part des composantes MinHash identiques
+    similar = (signatures[pi] == signatures[pj]).mean(axis=1) >= MINHASH_SIMILARITY
+    pi, pj = non_empty[pi[similar]], non_empty[pj[similar]]
+
+    # Composantes connexes par propagation du plus petit indice (union-find vectorisé)
+    while len(pi):
+        merged = np.minimum(labels[pi], labels[pj])
+        before = labels.copy()
+        np.minimum.at(labels, pi, merged)
+        np.minimum.at(labels, pj, merged)
+        labels = labels[labels]
+        if np.array_equal(labels, before):
+            break
+
+    return labels
+
+
+def assign_story_ids(articles: List[Dict]) -> int:
+    """
+    Attribue un "story_id" à chaque article (copies syndiquées = même sujet).
+    Retourne le nombre de sujets distincts.
+    """
+    if not articles:
+        return 0
+    texts = [normalize_title(art.get("title", ""), art.get("domain", "")) for art in articles]
+    labels = cluster_near_duplicates(texts)
+    for art, label in zip(articles, labels):
+        representative = texts[label]
+        art["story_id"] = get_title_hash(representative)[:12] if representative else art.get("url", "")
+    return len(set(labels.tolist()))
+
+
+# =============================================================================
+# CACHES JOURNALIERS PERMANENTS (MODE « AS OF »)
+# =============================================================================
+# Une journée terminée ne change plus : ses vues Wikipedia et ses articles GDELT sont
+# conservés sans expiration. Seuls les jours absents sont demandés, en une requête par
+# plage contiguë ; les jours récents (encore susceptibles d'évoluer) ne sont jamais figés.
+# Les séries Trends journalières (relatives à leur requête) sont gardées d'un bloc par jeu
+# de mots-clés et ré-échelonnées sur chaque fenêtre.
+
+WIKI_DAILY_CACHE_FILE = "wiki_daily_cache.json"
+GDELT_DAILY_CACHE_FILE = "gdelt_daily_cache.json"
+TRENDS_DAILY_CACHE_FILE = "trends_daily_cache.json"
+TRENDS_DAILY_MAX_DAYS = 260     # Au-delà, Google Trends passe en résolution hebdomadaire
+DAILY_CACHE_SETTLE_DAYS = 2     # Jours récents non figés (données encore en cours de consolidation)
+GDELT_MAX_RECORDS = 250         # Plafond GDELT par requête
+GDELT_DAILY_CHUNK_DAYS = 7      # Taille max d'une plage GDELT (limite la troncature à 250 articles)
+AS_OF_MAX_DAYS = 365            # Recul maximal du mode « as of »
+
+# Intervalle minimal (secondes) entre deux requêtes d'une même source ; vide dans l'app,
+# renseigné par le backfill pour respecter les limites de chaque API
+SOURCE_MIN_INTERVAL = {}
+_source_last_call = {}
+
+
+def throttle_source(source: str):
+    """Attend si la requête précédente vers cette source est trop récente"""
+    interval = SOURCE_MIN_INTERVAL.get(source)
+    if not interval:
+        return
+    wait = _source_last_call.get(source, 0) + interval - time.monotonic()
+    if wait > 0:
+        time.sleep(wait)
+    _source_last_call[source] = time.monotonic()
+
+
+def load_daily_cache(path: str) -> Dict:
+    """Charge un cache journalier permanent {clé: {YYYY-MM-DD: valeur}}"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except:
+        return {}
+
+
+def save_daily_cache(path: str, cache: Dict) -> bool:
+    """Sauvegarde un cache journalier permanent"""
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        return True
+    except:
+        return False
+
+
+def is_settled_day(day: date) -> bool:
+    """Jour suffisamment ancien pour être figé dans un cache permanent"""
+    return day <= date.today() - timedelta(days=DAILY_CACHE_SETTLE_DAYS)
+
+
+def missing_day_ranges(known: Dict, start_date: date, end_date: date,
+                       max_days: Optional[int] = None) -> List[Tuple[date, date]]:
+    """
+    Plages contiguës de jours à demander : jours figés absents du cache et jours récents.
+    Les plages sont découpées à max_days jours si fourni.
+    """
+    ranges = []
+    run_start = None
+    day = start_date
+    while day <= end_date:
+        needed = not is_settled_day(day) or day.strftime("%Y-%m-%d") not in known
+        if needed and run_start is None:
+            run_start = day
+        if run_start is not None and (not needed or (max_days and (day - run_start).days >= max_days)):
+            ranges.append((run_start, day - timedelta(days=1)))
+            run_start = day if needed else None
+        day += timedelta(days=1)
+    if run_start is not None:
+        ranges.append((run_start, end_date))
+    return ranges
+
+
+def get_wikipedia_daily(page_title: str, start_date: date, end_date: date) -> Tuple[Dict[str, int], Optional[str]]:
+    """
+    Vues Wikipedia jour par jour sur la plage, depuis le cache permanent ; les jours
+    manquants sont récupérés en une requête par plage contiguë.
+    Retourne ({YYYY-MM-DD: vues}, erreur éventuelle).
+    """
+    cache = load_daily_cache(WIKI_DAILY_CACHE_FILE)
+    known = cache.get(page_title, {})
+    fresh = {}
+    error = None
+    settled_added = False
+
+    for range_start, range_end in missing_day_ranges(known, start_date, end_date):
+        url = (
+            f"https://wikimedia.org/api/rest_v1/metrics/pageviews/per-article/"
+            f"fr.wikipedia/all-access/user/{quote_plus(page_title)}/daily/"
+            f"{range_start.strftime('%Y%m%d')}/{range_end.strftime('%Y%m%d')}"
+        )
+        try:
+            throttle_source("wikipedia")
+            response = requests.get(url, headers={"User-Agent": "VisibilityIndex/8.0"}, timeout=15)
+        except Exception as e:
+            error = str(e)[:50]
+            continue
+        if response.status_code != 200:
+            error = f"Erreur HTTP {response.status_code}"
+            continue
+
+        got = {}
+        for item in response.json().get("items", []):
+            ts = item.get("timestamp", "")[:8]
+            if len(ts) == 8:
+                got[f"{ts[:4]}-{ts[4:6]}-{ts[6:]}"] = item.get("views", 0)
+
+        day = range_start
+        while day <= range_end:
+            day_str = day.strftime("%Y-%m-%d")
+            if is_settled_day(day):
+                # Jour figé absent de la réponse = aucune vue ce jour-là
+                known[day_str] = got.get(day_str, 0)
+                settled_added = True
+            elif day_str in got:
+                fresh[day_str] = got[day_str]
+            day += timedelta(days=1)
+
+    if settled_added:
+        cache[page_title] = known
+        save_daily_cache(WIKI_DAILY_CACHE_FILE, cache)
+
+    start_str = start_date.strftime("%Y-%m-%d")
+    end_str = end_date.strftime("%Y-%m-%d")
+    daily = {d: v for d, v in known.items() if start_str <= d <= end_str}
+    daily.update(fresh)
+    return daily, error
+
+
+def _fetch_gdelt_range_split(search_term: str, start_date: date, end_date: date) -> Optional[List[Dict]]:
+    """Requête GDELT sur une plage, redécoupée en deux tant que le plafond de 250 articles est atteint"""
+    articles = fetch_gdelt_range(search_term, start_date, end_date)
+    if articles is None or len(articles) < GDELT_MAX_RECORDS or start_date == end_date:
+        return articles
+    middle = start_date + timedelta(days=(end_date - start_date).days // 2)
+    first = _fetch_gdelt_range_split(search_term, start_date, middle)
+    second = _fetch_gdelt_range_split(search_term, middle + timedelta(days=1), end_date)
+    if first is None or second is None:
+        return None
+    return first + second
+
+
+def get_gdelt_articles_daily(search_term: str, start_date: date, end_date: date) -> List[Dict]:
+    """
+    Articles GDELT de la plage depuis le cache journalier permanent ; les jours manquants
+    sont récupérés par plages contiguës (7 jours max), les jours récents toujours en direct.
+    """
+    cache = load_daily_cache(GDELT_DAILY_CACHE_FILE)
+    known = cache.get(search_term, {})
+    fresh = []
+    settled_added = False
+
+    for range_start, range_end in missing_day_ranges(known, start_date, end_date, GDELT_DAILY_CHUNK_DAYS):
+        articles = _fetch_gdelt_range_split(search_term, range_start, range_end)
+        if articles is None:
+            continue  # Échec réseau : rien n'est figé, nouvel essai au prochain appel
+
+        by_day = {}
+        for art in articles:
+            by_day.setdefault(art["date"], []).append(art)
+
+        day = range_start
+        while day <= range_end:
+            day_str = day.strftime("%Y-%m-%d")
+            if is_settled_day(day):
+                known[day_str] = by_day.get(day_str, [])
+                settled_added = True
+            else:
+                fresh.extend(by_day.get(day_str, []))
+            day += timedelta(days=1)
+
+    if settled_added:
+        cache[search_term] = known
+        save_daily_cache(GDELT_DAILY_CACHE_FILE, cache)
+
+    start_str = start_date.strftime("%Y-%m-%d")
+    end_str = end_date.strftime("%Y-%m-%d")
+    articles = [art for d in sorted(known) if start_str <= d <= end_str for art in known[d]]
+    return articles + fresh
+
+
 # =============================================================================
 # FONCTIONS DE COLLECTE
 # =============================================================================
@@ -1790,38 +3776,24 @@ def get_wikipedia_views(page_title: str, start_date: date, end_date: date) -> Di
         ref_end = start_date - timedelta(days=1)
         ref_start = ref_end - timedelta(days=days_in_period - 1)
 
-        url = (
-            f"https://wikimedia.org/api/rest_v1/metrics/pageviews/per-article/"
-            f"fr.wikipedia/all-access/user/{quote_plus(page_title)}/daily/"
-            f"{ref_start.strftime('%Y%m%d')}/{end_date.strftime('%Y%m%d')}"
-        )
-
-        response = requests.get(url, headers={"User-Agent": "VisibilityIndex/8.0"}, timeout=15)
-
-        if response.status_code != 200:
+        # Jours figés lus dans le cache permanent, seuls les jours manquants sont demandés
+        all_daily, error = get_wikipedia_daily(page_title, ref_start, end_date)
+        if error and not all_daily:
             return {"views": 0, "variation": 0, "daily": {}, "avg_daily": 0,
-                    "ref_views": 0, "ref_avg": 0, "error": f"Erreur HTTP {response.status_code}"}
-
-        items = response.json().get("items", [])
+                    "ref_views": 0, "ref_avg": 0, "error": error}
 
         period_views = 0
         reference_views = 0
         daily = {}
 
-        for item in items:
-            ts = item.get("timestamp", "")[:8]
-            views = item.get("views", 0)
-
-            try:
-                item_date = datetime.strptime(ts, "%Y%m%d").date()
-
-                if start_date <= item_date <= end_date:
-                    period_views += views
-                    daily[item_date.strftime("%Y-%m-%d")] = views
-                elif ref_start <= item_date <= ref_end:
-                    reference_views += views
-            except:
-                continue
+        start_str = start_date.strftime("%Y-%m-%d")
+        ref_end_str = ref_end.strftime("%Y-%m-%d")
+        for day_str, views in sorted(all_daily.items()):
+            if day_str >= start_str:
+                period_views += views
+                daily[day_str] = views
+            elif day_str <= ref_end_str:
+                reference_views += views
 
         avg_period = period_views / max(days_in_period, 1)
         avg_ref = reference_views / max(days_in_period, 1)
@@ -1849,94 +3821,178 @@ def get_wikipedia_views(page_title: str, start_date: date, end_date: date) -> Di
 @st.cache_data(ttl=1800, show_spinner=False)
 def get_gdelt_articles(search_term: str, start_date: date, end_date: date) -> List[Dict]:
     """Récupère les articles de presse via GDELT"""
-    articles = []
+    return fetch_gdelt_range(search_term, start_date, end_date) or []
+
 
+def fetch_gdelt_range(search_term: str, start_date: date, end_date: date) -> Optional[List[Dict]]:
+    """Requête GDELT brute sur une plage de dates (None en cas d'échec)"""
     try:
         url = "https://api.gdeltproject.org/api/v2/doc/doc"
         params = {
             "query": f'"{search_term}"',
             "mode": "ArtList",
             "format": "json",
-            "maxrecords": 250,
+            "maxrecords": GDELT_MAX_RECORDS,
             "startdatetime": start_date.strftime("%Y%m%d000000"),
             "enddatetime": end_date.strftime("%Y%m%d235959"),
             "sourcelang": "french"
         }
 
+        throttle_source("gdelt")
         response = requests.get(url, params=params, timeout=30)
+        if response.status_code != 200:
+            return None
 
-        if response.status_code == 200 and response.text.strip():
+        articles = []
+        if response.text.strip():
             data = json.loads(response.text)
             for art in data.get("articles", []):
+                # seendate au format 20260115T120000Z : ramené à YYYY-MM-DD comme les autres sources
+                seendate = "".join(ch for ch in art.get("seendate", "")[:10] if ch.isdigit())
                 articles.append({
                     "title": art.get("title", ""),
                     "url": art.get("url", ""),
                     "domain": art.get("domain", ""),
-                    "date": art.get("seendate", "")[:10] if art.get("seendate") else "",
+                    "date": f"{seendate[:4]}-{seendate[4:6]}-{seendate[6:8]}" if len(seendate) >= 8 else "",
                     "source": "GDELT"
                 })
+        return articles
     except:
-        pass
+        return None
+
+
+# =============================================================================
+# GOOGLE NEWS - INGESTION UNIFIÉE (PRESSE + TV/RADIO)
+# =============================================================================
+
+GOOGLE_NEWS_RSS_URL = "https://news.google.com/rss/search"
+TV_RADIO_QUERY_GROUP_SIZE = 5  # Médias par requête OR (4 groupes pour MEDIAS_TV_RADIO)
+
+# Requêtes simultanées max par hôte (tous utilisateurs confondus)
+HOST_MAX_CONCURRENCY = {
+    "news.google.com": 8,
+}
+
+
+def parse_google_news_date(pub_date_raw: str) -> str:
+    """Convertit un pubDate RSS (RFC 822) en date ISO YYYY-MM-DD"""
+    if not pub_date_raw:
+        return ""
+    try:
+        return parsedate_to_datetime(pub_date_raw).strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return ""
+
+
+def _fetch_google_news_rss(query: str, feed: str) -> List[Dict]:
+    """Télécharge un flux Google News RSS et normalise ses items (fonction interne)"""
+    items = []
+
+    try:
+        url = f"{GOOGLE_NEWS_RSS_URL}?q={quote_plus(query)}&hl=fr&gl=FR&ceid=FR:fr"
+        response = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=15)
+
+        if response.status_code == 200:
+            root = ET.fromstring(response.content)
+
+            for item in root.findall(".//item"):
+                items.append({
+                    "title": item.findtext("title", "") or "",
+                    "url": item.findtext("link", "") or "",
+                    "domain": item.findtext("source", "") or "",
+                    "date": parse_google_news_date(item.findtext("pubDate", "")),
+                    "source": "Google News",
+                    "feed": feed
+                })
+    except Exception as e:
+        logger.warning(f"[GOOGLE NEWS ERROR] {query}: {e}")
+
+    return items
+
+
+def build_tv_radio_queries(candidate_name: str) -> List[str]:
+    """
+    Construit les requêtes Google News ciblant les médias TV/Radio.
+    MEDIAS_TV_RADIO est découpé en groupes pour couvrir TOUS les médias
+    (une requête OR trop longue est tronquée par Google News).
+    """
+    queries = []
+    for i in range(0, len(MEDIAS_TV_RADIO), TV_RADIO_QUERY_GROUP_SIZE):
+        group = MEDIAS_TV_RADIO[i:i + TV_RADIO_QUERY_GROUP_SIZE]
+        media_query = " OR ".join(f'"{m}"' if " " in m else m for m in group)
+        queries.append(f"{candidate_name} ({media_query})")
+    return queries
+
 
-    return articles
+@st.cache_resource(show_spinner=False)
+def get_host_semaphore(host: str) -> threading.BoundedSemaphore:
+    """Sémaphore partagé par tout le process pour limiter les requêtes simultanées vers un hôte"""
+    return threading.BoundedSemaphore(HOST_MAX_CONCURRENCY.get(host, 2))
 
 
 @st.cache_data(ttl=1800, show_spinner=False)
-def get_google_news_articles(search_term: str) -> List[Dict]:
-    """Récupère les articles via Google News RSS"""
-    articles = []
+def get_google_news_items(candidate_name: str, search_terms: List[str]) -> List[Dict]:
+    """
+    Récupère UNE fois par rafraîchissement tous les flux Google News d'un candidat
+    (termes de recherche presse + groupes de médias TV/Radio), dédupliqués par lien.
+    Chaque item porte "feed" = "press" ou "tv_radio" selon la requête d'origine.
+    La presse et la TV/Radio sont ensuite des filtres sur cet ensemble partagé.
 
-    try:
-        url = f"https://news.google.com/rss/search?q={quote_plus(search_term)}&hl=fr&gl=FR&ceid=FR:fr"
-        response = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=15)
+    Les requêtes partent en parallèle (latence ~ une seule requête), dans la limite
+    de HOST_MAX_CONCURRENCY pour news.google.com.
+    """
+    queries = [(term, "press") for term in search_terms]
+    queries += [(q, "tv_radio") for q in build_tv_radio_queries(candidate_name)]
 
-        if response.status_code == 200:
-            root = ET.fromstring(response.content)
+    semaphore = get_host_semaphore("news.google.com")
 
-            for item in root.findall(".//item"):
-                title = item.find("title")
-                link = item.find("link")
-                pubdate = item.find("pubDate")
-                source = item.find("source")
-
-                date_str = ""
-                if pubdate is not None and pubdate.text:
-                    try:
-                        dt = datetime.strptime(pubdate.text[:25], "%a, %d %b %Y %H:%M:%S")
-                        date_str = dt.strftime("%Y-%m-%d")
-                    except:
-                        pass
+    def fetch(query_feed):
+        with semaphore:
+            return _fetch_google_news_rss(*query_feed)
 
-                articles.append({
-                    "title": title.text if title is not None else "",
-                    "url": link.text if link is not None else "",
-                    "domain": source.text if source is not None else "",
-                    "date": date_str,
-                    "source": "Google News"
-                })
-    except:
-        pass
+    max_workers = min(len(queries), HOST_MAX_CONCURRENCY.get("news.google.com", 2))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        feeds = list(executor.map(fetch, queries))
+
+    # Fusion dans l'ordre des requêtes (presse d'abord), dédupliquée par lien
+    items = []
+    seen_urls = set()
+    for feed_items in feeds:
+        for item in feed_items:
+            if item["url"] and item["url"] not in seen_urls:
+                seen_urls.add(item["url"])
+                items.append(item)
 
-    return articles
+    logger.info(f"[GOOGLE NEWS] {candidate_name}: {len(items)} items ({len(queries)} requêtes)")
+    return items
 
 
-def get_all_press_coverage(candidate_name: str, search_terms: List[str], start_date: date, end_date: date) -> Dict:
-    """Récupère tous les articles pour un candidat avec déduplication"""
+def get_all_press_coverage(candidate_name: str, search_terms: List[str], start_date: date, end_date: date,
+                           as_of: bool = False) -> Dict:
+    """
+    Récupère tous les articles pour un candidat avec déduplication.
+    En mode as_of (période passée), GDELT est lu depuis le cache journalier permanent
+    et Google News, qui ne couvre que l'actualité récente, est ignoré.
+    """
     all_articles = []
     seen_urls = set()
 
     for term in search_terms:
-        gdelt_arts = get_gdelt_articles(term, start_date, end_date)
+        if as_of:
+            gdelt_arts = get_gdelt_articles_daily(term, start_date, end_date)
+        else:
+            gdelt_arts = get_gdelt_articles(term, start_date, end_date)
         for art in gdelt_arts:
             if art["url"] not in seen_urls:
                 seen_urls.add(art["url"])
                 all_articles.append(art)
 
-        gnews_arts = get_google_news_articles(term)
-        for art in gnews_arts:
-            if art["url"] not in seen_urls:
-                seen_urls.add(art["url"])
-                all_articles.append(art)
+    # Google News : flux partagé avec la détection TV/Radio, on garde les items "presse"
+    gnews_arts = [] if as_of else [item for item in get_google_news_items(candidate_name, search_terms) if item["feed"] == "press"]
+    for art in gnews_arts:
+        if art["url"] not in seen_urls:
+            seen_urls.add(art["url"])
+            all_articles.append(art)
 
     start_str = start_date.strftime("%Y-%m-%d")
     end_str = end_date.strftime("%Y-%m-%d")
@@ -1947,22 +4003,26 @@ def get_all_press_coverage(candidate_name: str, search_terms: List[str], start_d
         if art_date and start_str <= art_date <= end_str:
             date_filtered.append(art)
 
-    name_parts = candidate_name.lower().split()
-    last_name = name_parts[-1] if name_parts else ""
+    last_name_matcher = get_name_matcher(candidate_name)
 
     filtered = []
     for art in date_filtered:
-        title_lower = art["title"].lower()
-        if last_name and last_name in title_lower:
+        if match_first(last_name_matcher, fold_text(art["title"])):
             filtered.append(art)
 
+    # Doublons exacts (même titre chez le même média) retirés, les reprises
+    # chez d'autres médias restent des articles mais partagent un même sujet
     seen_titles = set()
     unique = []
     for art in filtered:
-        title_norm = re.sub(r'[^\w\s]', '', art["title"].lower())[:60]
-        if title_norm and title_norm not in seen_titles:
-            seen_titles.add(title_norm)
-            unique.append(art)
+        title_norm = normalize_title(art["title"], art["domain"])
+        key = (title_norm, art["domain"])
+        if title_norm and key not in seen_titles:
+            seen_titles.add(key)
+            # Les fonctions st.cache_data renvoient des dicts (pickle), on passe en enregistrements ici
+            unique.append(Article.from_dict(art))
+
+    stories = assign_story_ids(unique)
 
     unique.sort(key=lambda x: x.get("date", ""), reverse=True)
     domains = set(art["domain"] for art in unique if art["domain"])
@@ -1974,6 +4034,7 @@ def get_all_press_coverage(candidate_name: str, search_terms: List[str], start_d
     return {
         "articles": unique,
         "count": len(unique),
+        "stories": stories,
         "domains": len(domains),
         "raw_count": len(all_articles),
         "date_filtered_count": len(date_filtered),
@@ -2247,6 +4308,117 @@ def get_google_trends(keywords: List[str], start_date: date, end_date: date) ->
         return return_with_fallback(f"Erreur: {error_str}")
 
 
+def fetch_trends_daily_series(keywords: List[str], start_date: date, end_date: date) -> Dict:
+    """
+    Série Google Trends jour par jour sur une plage (≤ 269 jours pour garder la résolution
+    journalière). Au-delà de 5 mots-clés, les lots sont ramenés à l'échelle du premier
+    via un pivot commun, comme _fetch_google_trends_api.
+    Retourne {"series": {mot-clé: {YYYY-MM-DD: valeur}}, "errors": [...]}.
+    """
+    from pytrends.request import TrendReq
+    import time
+    import random
+
+    timeframe = f"{start_date.strftime('%Y-%m-%d')} {end_date.strftime('%Y-%m-%d')}"
+    pivot = keywords[0]
+    pivot_mean = None
+    series = {}
+    errors = []
+    batches = [keywords] if len(keywords) <= 5 else [
+        keywords[i:i + 4] if pivot in keywords[i:i + 4] else [pivot] + keywords[i:i + 4]
+        for i in range(0, len(keywords), 4)
+    ]
+
+    for b, batch in enumerate(batches):
+        for attempt in range(3):
+            try:
+                throttle_source("trends")
+                pytrends = TrendReq(hl="fr-FR", tz=60)
+                pytrends.build_payload(batch, timeframe=timeframe, geo="FR")
+                df = pytrends.interest_over_time()
+                if df is None or df.empty:
+                    raise ValueError("Données vides retournées par Google Trends")
+
+                # Mise à l'échelle du lot sur le premier lot via le pivot
+                batch_pivot = float(df[pivot].mean()) if pivot in df.columns else 0.0
+                if pivot_mean is None:
+                    pivot_mean = batch_pivot
+                factor = pivot_mean / batch_pivot if batch_pivot > 0 and pivot_mean else 1.0
+                days = [ts.strftime("%Y-%m-%d") for ts in df.index]
+                for kw in batch:
+                    if kw in df.columns and kw not in series:
+                        series[kw] = {d: float(v) * factor for d, v in zip(days, df[kw].tolist())}
+                break
+            except Exception as e:
+                if attempt < 2:
+                    time.sleep(10 * (attempt + 1) + random.uniform(0, 5))
+                else:
+                    errors.append(f"Lot {b + 1}: {str(e)[:50]}")
+
+    return {"series": series, "errors": errors}
+
+
+def trends_scores_for_window(series: Dict[str, Dict[str, float]], keywords: List[str],
+                             start_date: date, end_date: date) -> Dict:
+    """
+    Scores Trends d'une fenêtre depuis une série journalière plus longue : moyenne de la
+    fenêtre ramenée au pic de la fenêtre (tous mots-clés confondus) = 100, soit la même
+    normalisation que Google pour une requête sur cette seule fenêtre.
+    """
+    start_str = start_date.strftime("%Y-%m-%d")
+    end_str = end_date.strftime("%Y-%m-%d")
+    window = {kw: [v for d, v in (series.get(kw) or {}).items() if start_str <= d <= end_str] for kw in keywords}
+    peak = max((max(values) for values in window.values() if values), default=0)
+
+    scores = {}
+    for kw in keywords:
+        values = window[kw]
+        scores[kw] = round(sum(values) / len(values) / peak * 100, 1) if values and peak > 0 else 0.0
+    return {"success": peak > 0, "scores": scores, "errors": None, "from_cache": True}
+
+
+@st.cache_data(ttl=3600, show_spinner=False)  # Cache Streamlit 1h
+def get_trends_window(keywords: List[str], start_date: date, end_date: date) -> Dict:
+    """
+    Scores Trends d'une fenêtre hors périodes fixes (date passée, plage personnalisée) depuis
+    une série journalière gardée par jeu de mots-clés : une fenêtre figée dans une série déjà
+    obtenue est servie sans requête, sinon une seule série est demandée (au plus une par jour
+    pour les jours récents).
+    Ne touche ni aux compteurs de refresh ni aux dernières données valides de get_google_trends.
+    """
+    key = ",".join(sorted(keywords))
+    cache = load_daily_cache(TRENDS_DAILY_CACHE_FILE)
+    chunks = cache.get(key, [])
+    today = date.today()
+    start_str, end_str = start_date.isoformat(), end_date.isoformat()
+
+    def usable(chunk: Dict) -> bool:
+        # Fenêtre contenue dans la série et figée au moment de la requête (ou série du jour)
+        settled_at_fetch = date.fromisoformat(chunk["fetched"]) - timedelta(days=DAILY_CACHE_SETTLE_DAYS)
+        return (chunk["start"] <= start_str and end_str <= chunk["end"]
+                and (end_date <= settled_at_fetch or chunk["fetched"] == today.isoformat()))
+
+    chunk = next((ch for ch in chunks if usable(ch)), None)
+    if chunk is None:
+        # Série la plus longue possible autour de la fenêtre, jusqu'à aujourd'hui si elle est récente
+        chunk_start = min(start_date, today - timedelta(days=TRENDS_DAILY_MAX_DAYS - 1))
+        chunk_end = min(chunk_start + timedelta(days=TRENDS_DAILY_MAX_DAYS - 1), today)
+        try:
+            fetched = fetch_trends_daily_series(keywords, chunk_start, chunk_end)
+        except Exception as e:
+            fetched = {"series": {}, "errors": [str(e)[:100]]}
+        if fetched["errors"] or not fetched["series"]:
+            return {"success": False, "scores": {kw: 0.0 for kw in keywords},
+                    "errors": fetched["errors"] or ["Série Trends vide"], "from_cache": False}
+        chunk = {"start": chunk_start.isoformat(), "end": chunk_end.isoformat(),
+                 "fetched": today.isoformat(), "series": fetched["series"]}
+        # La nouvelle série remplace celles qu'elle couvre entièrement
+        cache[key] = [ch for ch in chunks if not (chunk["start"] <= ch["start"] and ch["end"] <= chunk["end"])] + [chunk]
+        save_daily_cache(TRENDS_DAILY_CACHE_FILE, cache)
+
+    return trends_scores_for_window(chunk["series"], keywords, start_date, end_date)
+
+
 def _is_short(duration: str) -> bool:
     """Détermine si une vidéo est un YouTube Short (<= 60 secondes)"""
     if not duration:
@@ -2365,14 +4537,14 @@ def _get_channel_videos(channel_id: str, api_key: str, start_date: date, end_dat
             for item in response.json().get("items", []):
                 vid_id = item.get("id", {}).get("videoId", "")
                 if vid_id:
-                    videos.append({
-                        "id": vid_id,
-                        "title": item.get("snippet", {}).get("title", ""),
-                        "channel": item.get("snippet", {}).get("channelTitle", ""),
-                        "channel_id": channel_id,
-                        "published": item.get("snippet", {}).get("publishedAt", "")[:10],
-                        "source": "official_channel"
-                    })
+                    videos.append(Video(
+                        id=vid_id,
+                        title=item.get("snippet", {}).get("title", ""),
+                        channel=item.get("snippet", {}).get("channelTitle", ""),
+                        channel_id=channel_id,
+                        published=item.get("snippet", {}).get("publishedAt", "")[:10],
+                        source="official_channel"
+                    ))
     except Exception:
         pass
 
@@ -2429,14 +4601,14 @@ def _search_videos_mentioning(candidate_name: str, api_key: str, start_date: dat
                         continue
 
                     seen_ids.add(vid_id)
-                    videos.append({
-                        "id": vid_id,
-                        "title": item.get("snippet", {}).get("title", ""),
-                        "channel": item.get("snippet", {}).get("channelTitle", ""),
-                        "channel_id": channel_id,
-                        "published": item.get("snippet", {}).get("publishedAt", "")[:10],
-                        "source": "search"
-                    })
+                    videos.append(Video(
+                        id=vid_id,
+                        title=item.get("snippet", {}).get("title", ""),
+                        channel=item.get("snippet", {}).get("channelTitle", ""),
+                        channel_id=channel_id,
+                        published=item.get("snippet", {}).get("publishedAt", "")[:10],
+                        source="search"
+                    ))
         except Exception:
             pass
 
@@ -2449,19 +4621,10 @@ def _filter_relevant_videos(videos: List[Dict], candidate_name: str) -> List[Dic
     Les vidéos de la chaîne officielle passent automatiquement.
     Les autres doivent mentionner le candidat dans le titre OU venir d'une chaîne média reconnue.
     """
-    name_parts = [p.lower() for p in candidate_name.split() if len(p) >= 3]
-    last_name = candidate_name.split()[-1].lower()
-
+    name_matcher = get_name_matcher(candidate_name, last_name_only=False)
+    last_name_matcher = get_name_matcher(candidate_name)
     # Médias connus (les vidéos de ces chaînes sont plus fiables)
-    known_media_keywords = [
-        "bfm", "cnews", "lci", "tf1", "france", "rmc", "europe1", "rtl",
-        "figaro", "monde", "parisien", "obs", "express", "point", "marianne",
-        "public sénat", "c dans l'air", "quotidien", "touche pas", "hanouna",
-        "morandini", "praud", "zemmour", "ruquier", "ardisson", "bourdin",
-        "pujadas", "calvi", "elkabbach", "aphatie", "joffrin", "onfray",
-        "mediapart", "brut", "konbini", "hugodecrypte", "blast", "frontières",
-        "livre noir", "thinkerview", "interdit", "femelliste", "front populaire"
-    ]
+    media_matcher = compile_matcher(tuple(KNOWN_MEDIA_CHANNELS))
 
     filtered = []
     for v in videos:
@@ -2470,15 +4633,14 @@ def _filter_relevant_videos(videos: List[Dict], candidate_name: str) -> List[Dic
             filtered.append(v)
             continue
 
-        title_lower = v["title"].lower()
-        channel_lower = v["channel"].lower()
+        title_folded = fold_text(v["title"])
 
         # Vérifier si le nom est dans le titre
-        name_in_title = any(part in title_lower for part in name_parts)
-        last_name_in_title = last_name in title_lower
+        name_in_title = match_first(name_matcher, title_folded) is not None
+        last_name_in_title = match_first(last_name_matcher, title_folded) is not None
 
         # Vérifier si c'est un média connu
-        is_known_media = any(media in channel_lower for media in known_media_keywords)
+        is_known_media = match_first(media_matcher, fold_text(v["channel"])) is not None
 
         # Accepter si: nom dans le titre OU (nom de famille dans titre ET média connu)
         if name_in_title or (last_name_in_title and is_known_media):
@@ -2571,13 +4733,13 @@ def fetch_youtube_videos_30d(search_term: str, api_key: str) -> Dict:
             for item in response.json().get("items", []):
                 vid_id = item.get("id", {}).get("videoId", "")
                 if vid_id:
-                    all_videos.append({
-                        "id": vid_id,
-                        "title": item.get("snippet", {}).get("title", ""),
-                        "channel": item.get("snippet", {}).get("channelTitle", ""),
-                        "published": item.get("snippet", {}).get("publishedAt", "")[:10],
-                        "source": "search"
-                    })
+                    all_videos.append(Video(
+                        id=vid_id,
+                        title=item.get("snippet", {}).get("title", ""),
+                        channel=item.get("snippet", {}).get("channelTitle", ""),
+                        published=item.get("snippet", {}).get("publishedAt", "")[:10],
+                        source="search"
+                    ))
     except Exception:
         pass
 
@@ -2605,19 +4767,19 @@ def fetch_youtube_videos_30d(search_term: str, api_key: str) -> Dict:
         duration = vid_stats.get("duration", "")
         is_short = _is_short(duration)
 
-        final_videos.append({
-            "id": v["id"],
-            "title": v["title"],
-            "channel": v["channel"],
-            "published": v["published"],
-            "url": f"https://www.youtube.com/watch?v={v['id']}",
-            "views": views,
-            "likes": likes,
-            "comments": comments,
-            "duration": duration,
-            "is_short": is_short,
-            "is_official": v.get("source") == "official_channel"
-        })
+        final_videos.append(Video(
+            id=v["id"],
+            title=v["title"],
+            channel=v["channel"],
+            published=v["published"],
+            url=f"https://www.youtube.com/watch?v={v['id']}",
+            views=views,
+            likes=likes,
+            comments=comments,
+            duration=duration,
+            is_short=is_short,
+            is_official=v.get("source") == "official_channel"
+        ))
 
     # Trier par vues décroissantes
     final_videos.sort(key=lambda x: x.get("views", 0), reverse=True)
@@ -2638,7 +4800,7 @@ def get_youtube_data_for_period(candidate_name: str, api_key: str, start_date: d
 
     if cached and cached.get("videos"):
         # Filtrer les vidéos par période
-        filtered_videos = filter_youtube_videos_by_period(cached["videos"], start_date, end_date)
+        filtered_videos = filter_youtube_videos_by_period(cached["videos"], start_date, end_date, cached.get("days"))
         stats = compute_youtube_stats_from_videos(filtered_videos)
         stats["official_channel"] = cached.get("official_channel")
         stats["from_cache"] = True
@@ -2654,64 +4816,40 @@ def get_youtube_data_for_period(candidate_name: str, api_key: str, start_date: d
     }
 
 
-@st.cache_data(ttl=1800, show_spinner=False)
-def get_tv_radio_mentions(candidate_name: str, start_date: date, end_date: date) -> Dict:
-    """Recherche les mentions TV/Radio via Google News avec détails complets"""
+def get_tv_radio_mentions(candidate_name: str, search_terms: List[str], start_date: date, end_date: date) -> Dict:
+    """Détecte les mentions TV/Radio en filtrant le flux Google News partagé du candidat"""
     mentions = []
     media_counts = {}
 
-    last_name = candidate_name.split()[-1].lower()
-    media_query = " OR ".join(MEDIAS_TV_RADIO[:6])
-    search_query = f"{candidate_name} ({media_query})"
-
-    try:
-        rss_url = f"https://news.google.com/rss/search?q={quote_plus(search_query)}&hl=fr&gl=FR&ceid=FR:fr"
-        response = requests.get(rss_url, timeout=15)
-
-        if response.status_code == 200:
-            root = ET.fromstring(response.content)
+    last_name_matcher = get_name_matcher(candidate_name)
+    media_matcher = get_tv_radio_matcher()
+    start_str = start_date.strftime("%Y-%m-%d")
+    end_str = end_date.strftime("%Y-%m-%d")
 
-            start_str = start_date.strftime("%Y-%m-%d")
-            end_str = end_date.strftime("%Y-%m-%d")
+    for item in get_google_news_items(candidate_name, search_terms):
+        title = item["title"]
+        source = item["domain"]
+        art_date = item["date"]
 
-            for item in root.findall(".//item"):
-                title = item.findtext("title", "")
-                source = item.findtext("source", "")
-                link = item.findtext("link", "")
-                pub_date_raw = item.findtext("pubDate", "")
-
-                art_date = ""
-                if pub_date_raw:
-                    try:
-                        from email.utils import parsedate_to_datetime
-                        dt = parsedate_to_datetime(pub_date_raw)
-                        art_date = dt.strftime("%Y-%m-%d")
-                    except:
-                        pass
-
-                if art_date and not (start_str <= art_date <= end_str):
-                    continue
+        if art_date and not (start_str <= art_date <= end_str):
+            continue
 
-                if last_name not in title.lower():
-                    continue
+        title_folded = fold_text(title)
+        if not match_first(last_name_matcher, title_folded):
+            continue
 
-                detected_media = None
-                for media in MEDIAS_TV_RADIO:
-                    if media.lower() in source.lower() or media.lower() in title.lower():
-                        detected_media = media
-                        break
+        # La source fait foi, sinon média cité dans le titre
+        detected_media = match_first(media_matcher, fold_text(source)) or match_first(media_matcher, title_folded)
 
-                if detected_media:
-                    mentions.append({
-                        "title": title,
-                        "source": source,
-                        "media": detected_media,
-                        "date": art_date,
-                        "url": link
-                    })
-                    media_counts[detected_media] = media_counts.get(detected_media, 0) + 1
-    except:
-        pass
+        if detected_media:
+            mentions.append(Mention(
+                title=title,
+                source=source,
+                media=detected_media,
+                date=art_date,
+                url=item["url"]
+            ))
+            media_counts[detected_media] = media_counts.get(detected_media, 0) + 1
 
     return {
         "count": len(mentions),
@@ -2728,12 +4866,17 @@ def get_tv_radio_mentions(candidate_name: str, start_date: date, end_date: date)
 def calculate_score(wiki_views: int, press_count: int, press_domains: int,
                     trends_score: float, youtube_views: int, youtube_available: bool,
                     period_days: int = 7, all_candidates_press: List[int] = None,
-                    all_candidates_wiki: List[int] = None, all_candidates_youtube: List[int] = None) -> Dict:
+                    all_candidates_wiki: List[int] = None, all_candidates_youtube: List[int] = None,
+                    press_stories: int = None, all_candidates_stories: List[int] = None) -> Dict:
     """Calcule le score de visibilité
     Pondération: Presse 30%, Trends 30%, Wikipedia 25%, YouTube 15%
 
     Tous les scores sont RELATIFS aux autres candidats pour garantir une différenciation.
+    La presse est comptée en sujets distincts (press_stories) quand ils sont fournis,
+    pour que les reprises d'une même dépêche ne gonflent pas le score ; sinon en articles.
     """
+    if press_stories is not None and all_candidates_stories:
+        press_count, all_candidates_press = press_stories, all_candidates_stories
 
     # Score Wikipedia RELATIF : basé sur le max des candidats
     if all_candidates_wiki and max(all_candidates_wiki) > 0:
@@ -2784,20 +4927,254 @@ def calculate_score(wiki_views: int, press_count: int, press_domains: int,
     }
 
 
+# Pondération par défaut, dans l'ordre de sommation du score total
+SCORE_COMPONENTS = ("trends", "press", "wiki", "youtube")
+DEFAULT_SCORE_WEIGHTS = np.array([0.30, 0.30, 0.25, 0.15])
+
+
+def round_half_even_1(x: np.ndarray) -> np.ndarray:
+    """
+    Équivalent vectorisé exact de round(x, 1) de Python (arrondi de la valeur binaire exacte,
+    égalités au pair). x*10 est corrigé de son erreur d'arrondi (produit exact de Dekker),
+    qui ne change le résultat que lorsque x*10 tombe pile sur un demi-entier.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = x * 10
+    c = 134217729.0 * x  # Découpage de Veltkamp : x = hi + lo, 10 est exact sur 26 bits
+    hi = c - (c - x)
+    lo = x - hi
+    err = (hi * 10 - y) + lo * 10  # x*10 = y + err exactement
+    n = np.rint(y)
+    frac = y - np.floor(y)
+    tie = frac == 0.5
+    n = np.where(tie & (err > 0), np.floor(y) + 1, n)
+    n = np.where(tie & (err < 0), np.floor(y), n)
+    return n / 10
+
+
+def calculate_scores_batch(wiki_views, press_count, press_domains, trends_score, youtube_views,
+                           youtube_available, period_days, weights=None,
+                           column_weights: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Version vectorisée de calculate_score : métriques brutes en matrices (candidats x périodes),
+    les maxima relatifs étant pris sur l'axe des candidats de chaque période (colonne).
+    period_days : scalaire ou vecteur (une valeur par période).
+    weights : vecteur (trends, press, wiki, youtube) ou matrice (k, 4) de pondérations,
+    auquel cas les résultats ont une dimension de tête k.
+    column_weights : weights est une matrice (périodes, 4), une pondération par colonne
+    (tirages Monte-Carlo appariés métriques/pondération).
+    Mêmes nombres que calculate_score (press_count = sujets distincts si disponibles).
+    Le repli logarithmique de calculate_score ne s'applique qu'à défaut de liste de comparaison :
+    ici, un maximum nul implique des vues nulles, donc un score nul dans les deux cas.
+    """
+    def matrix(values, dtype=np.float64):
+        arr = np.asarray(values, dtype=dtype)
+        return arr[:, None] if arr.ndim == 1 else arr
+
+    wiki = matrix(wiki_views)
+    press = matrix(press_count)
+    domains = matrix(press_domains)
+    trends = matrix(trends_score)
+    yt = matrix(youtube_views)
+    yt_available = matrix(youtube_available, dtype=bool)
+    days = np.broadcast_to(np.asarray(period_days), (wiki.shape[1],))
+
+    def relative(values: np.ndarray, scale: float) -> np.ndarray:
+        max_values = values.max(axis=0, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(max_values > 0, (values / max_values) * scale, 0.0)
+
+    wiki_score = relative(wiki, 100)
+
+    diversity_threshold = np.maximum(5, days * 2)
+    diversity_bonus = np.minimum((domains / diversity_threshold) * 20, 20)
+    press_score = np.where(press.max(axis=0, keepdims=True) > 0,
+                           np.minimum(relative(press, 80) + diversity_bonus, 100), 0.0)
+
+    trends_norm = np.minimum(np.maximum(trends, 0), 100)
+    yt_score = np.where(yt_available & (yt > 0), relative(yt, 100), 0.0)
+
+    w = DEFAULT_SCORE_WEIGHTS if weights is None else np.asarray(weights, dtype=np.float64)
+    w = w[None, :, :] if column_weights else w[..., None, None, :]
+    components = (trends_norm, press_score, wiki_score, yt_score)
+    contribs = [comp * w[..., k] for k, comp in enumerate(components)]
+    total = contribs[0] + contribs[1] + contribs[2] + contribs[3]
+    total = np.minimum(np.maximum(total, 0), 100)
+
+    result = {"total": round_half_even_1(total)}
+    for name, comp in zip(SCORE_COMPONENTS, components):
+        result[name] = round_half_even_1(np.broadcast_to(comp, total.shape))
+    for name, contrib in zip(SCORE_COMPONENTS, contribs):
+        result[f"contrib_{name}"] = round_half_even_1(contrib)
+    return result
+
+
+def extract_score_metrics(results: Dict, candidate_ids: List[str], period_days: int) -> Dict:
+    """Métriques brutes d'entrée du score, en colonnes alignées sur candidate_ids"""
+    return {
+        "candidates": list(candidate_ids),
+        "period_days": period_days,
+        "wiki_views": [results[cid]["wikipedia"]["views"] for cid in candidate_ids],
+        "press_count": [results[cid]["press"].get("stories", results[cid]["press"]["count"]) for cid in candidate_ids],
+        "press_domains": [results[cid]["press"]["domains"] for cid in candidate_ids],
+        "trends_score": [results[cid]["trends_score"] for cid in candidate_ids],
+        "youtube_views": [results[cid]["youtube"].get("total_views", 0) for cid in candidate_ids],
+        "youtube_available": [results[cid]["youtube"].get("available", False) for cid in candidate_ids],
+    }
+
+
+def rescore_candidates(metrics: Dict, weights=None) -> Dict[str, Dict]:
+    """Scores {cid: score} recalculés depuis les métriques brutes (aucune collecte)"""
+    scores = calculate_scores_batch(
+        wiki_views=metrics["wiki_views"],
+        press_count=metrics["press_count"],
+        press_domains=metrics["press_domains"],
+        trends_score=metrics["trends_score"],
+        youtube_views=metrics["youtube_views"],
+        youtube_available=metrics["youtube_available"],
+        period_days=metrics["period_days"],
+        weights=weights
+    )
+    return {
+        cid: {key: float(values[i, 0]) for key, values in scores.items()}
+        for i, cid in enumerate(metrics["candidates"])
+    }
+
+
+def reset_score_weights():
+    """Remet les curseurs de pondération aux valeurs par défaut"""
+    for name, weight in zip(SCORE_COMPONENTS, DEFAULT_SCORE_WEIGHTS):
+        st.session_state[f"weight_{name}"] = int(round(weight * 100))
+
+
+# =============================================================================
+# SENSIBILITÉ DU CLASSEMENT - MONTE-CARLO (PONDÉRATIONS + BOOTSTRAP)
+# =============================================================================
+
+SENSITIVITY_SAMPLES = 2000
+SENSITIVITY_CONCENTRATION = 50  # Dirichlet(50 x poids) : écart type ~6 points autour de 30%
+
+
+def _bootstrap_press(rng: np.random.Generator, articles: List[Dict], n_samples: int):
+    """
+    Ré-échantillonne les articles (tirage avec remise) : sujets et domaines distincts par tirage.
+    Biaisé vers le bas (≈ 63% des éléments distincts retenus en moyenne) : à recentrer avec _recenter.
+    """
+    if not articles:
+        return np.zeros(n_samples), np.zeros(n_samples)
+    story_codes, domain_codes = {}, {"": 0}
+    story_of = np.array([story_codes.setdefault(art.get("story_id") or art.get("url", ""), len(story_codes)) for art in articles])
+    domain_of = np.array([domain_codes.setdefault(art.get("domain") or "", len(domain_codes)) for art in articles])
+
+    draws = rng.integers(0, len(articles), size=(n_samples, len(articles)))
+    rows = np.arange(n_samples)[:, None]
+    story_seen = np.zeros((n_samples, len(story_codes)), dtype=bool)
+    story_seen[rows, story_of[draws]] = True
+    domain_seen = np.zeros((n_samples, len(domain_codes)), dtype=bool)
+    domain_seen[rows, domain_of[draws]] = True
+    # Colonne 0 = articles sans domaine, non comptée
+    return story_seen.sum(axis=1).astype(np.float64), domain_seen[:, 1:].sum(axis=1).astype(np.float64)
+
+
+def _recenter(samples: np.ndarray, observed: float) -> np.ndarray:
+    """Ramène la moyenne des tirages sur la valeur observée, en gardant leur dispersion relative"""
+    mean = samples.mean()
+    if mean <= 0:
+        return np.full(len(samples), float(observed))
+    return samples * (observed / mean)
+
+
+def _bootstrap_views(rng: np.random.Generator, videos: List[Dict], n_samples: int) -> np.ndarray:
+    """Ré-échantillonne les vidéos (tirage avec remise) : total des vues par tirage"""
+    if not videos:
+        return np.zeros(n_samples)
+    views = np.array([v.get("views", 0) for v in videos], dtype=np.float64)
+    return views[rng.integers(0, len(videos), size=(n_samples, len(videos)))].sum(axis=1)
+
+
+def rank_stability(data: Dict, metrics: Dict, weights=None, n_samples: int = SENSITIVITY_SAMPLES,
+                   seed: int = 2026, display_order: Optional[List[str]] = None) -> Dict:
+    """
+    Distribution du rang de chaque candidat sous incertitude :
+    - pondérations tirées selon une Dirichlet centrée sur les poids actifs
+    - articles et vidéos ré-échantillonnés (bootstrap) par candidat ; les comptes distincts
+      (sujets, domaines) sont recentrés sur les valeurs observées
+    Tous les tirages sont scorés en un seul appel vectorisé (une colonne par tirage).
+    Les égalités sont départagées par display_order (classement affiché), à défaut par l'ordre des métriques.
+    Retourne {"candidates", "ranks" (tirages x candidats, 0 = premier), "rank_probs" (candidat x rang)}
+    """
+    rng = np.random.default_rng(seed)
+    cids = metrics["candidates"]
+    n_cand = len(cids)
+
+    center = DEFAULT_SCORE_WEIGHTS if weights is None else np.asarray(weights, dtype=np.float64)
+    sampled_weights = rng.dirichlet(np.maximum(center * SENSITIVITY_CONCENTRATION, 1e-3), size=n_samples)
+
+    press_count = np.empty((n_cand, n_samples))
+    press_domains = np.empty((n_cand, n_samples))
+    youtube_views = np.empty((n_cand, n_samples))
+    for ci, cid in enumerate(cids):
+        stories, domains = _bootstrap_press(rng, data[cid]["press"].get("articles", []), n_samples)
+        press_count[ci] = _recenter(stories, metrics["press_count"][ci])
+        press_domains[ci] = _recenter(domains, metrics["press_domains"][ci])
+        youtube_views[ci] = _bootstrap_views(rng, data[cid]["youtube"].get("videos", []), n_samples)
+
+    def fixed(values):
+        return np.repeat(np.asarray(values)[:, None], n_samples, axis=1)
+
+    totals = calculate_scores_batch(
+        wiki_views=fixed(metrics["wiki_views"]),
+        press_count=press_count,
+        press_domains=press_domains,
+        trends_score=fixed(metrics["trends_score"]),
+        youtube_views=youtube_views,
+        youtube_available=fixed(metrics["youtube_available"]),
+        period_days=metrics["period_days"],
+        weights=sampled_weights,
+        column_weights=True
+    )["total"]
+
+    # Rang par tirage (égalités dans l'ordre du classement affiché)
+    display_rank = {cid: i for i, cid in enumerate(display_order or cids)}
+    tiebreak = np.array([display_rank.get(cid, n_cand + ci) for ci, cid in enumerate(cids)], dtype=np.float64)
+    order = np.lexsort((np.broadcast_to(tiebreak[:, None], totals.shape), -totals), axis=0)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(n_cand)[:, None], axis=0)
+    ranks = ranks.T
+    rank_probs = np.bincount((np.arange(n_cand) * n_cand + ranks).ravel(),
+                             minlength=n_cand * n_cand).reshape(n_cand, n_cand) / n_samples
+    return {"candidates": list(cids), "ranks": ranks, "rank_probs": rank_probs}
+
+
 # =============================================================================
 # COLLECTE PRINCIPALE
 # =============================================================================
 
-def collect_data(candidate_ids: List[str], start_date: date, end_date: date, youtube_key: Optional[str]) -> Dict:
-    """Collecte toutes les données pour les candidats sélectionnés"""
+def collect_data(candidate_ids: List[str], start_date: date, end_date: date, youtube_key: Optional[str],
+                 as_of: bool = False, trends: Optional[Dict] = None, analyze: bool = True) -> Dict:
+    """
+    Collecte toutes les données pour les candidats sélectionnés.
+    En mode as_of (date de fin passée), aucun cache 30j n'est rafraîchi : Wikipedia et GDELT
+    viennent des caches journaliers permanents, YouTube du cache existant.
+    trends permet de fournir des scores Trends déjà calculés (backfill) ; analyze=False
+    saute les analyses IA (sentiment, thèmes).
+    """
     results = {}
+    # Période antérieure à la fenêtre des caches presse 30j : articles GDELT jour par jour
+    press_from_daily = as_of and start_date < date.today() - timedelta(days=30)
 
     progress = st.progress(0)
     status = st.empty()
 
     status.text("Chargement des données Google Trends...")
     names = [CANDIDATES[cid]["name"] for cid in candidate_ids]
-    trends = get_google_trends(names, start_date, end_date)
+    fixed_period = end_date == date.today() and (end_date - start_date).days + 1 in TRENDS_FIXED_PERIOD_DAYS
+    if trends is None and (as_of or not fixed_period):
+        # Date passée ou plage personnalisée : série journalière, sans consommer le refresh
+        # quotidien ni écraser les dernières données valides des périodes fixes
+        trends = get_trends_window(names, start_date, end_date)
+    elif trends is None:
+        trends = get_google_trends(names, start_date, end_date)
 
     # Détecter si quota Trends épuisé
     trends_quota_exhausted = False
@@ -2815,7 +5192,11 @@ def collect_data(candidate_ids: List[str], start_date: date, end_date: date, you
     youtube_mode = "disabled"
     youtube_api_called = False
 
-    if youtube_key:
+    if youtube_key and as_of:
+        # Période passée : pas d'appel API, vidéos de la période lues dans le cache (vues actuelles)
+        youtube_mode = "cache"
+        youtube_refresh_reason = "Date passée : données YouTube issues du cache"
+    elif youtube_key:
         # Vérifier si le cache existe pour au moins un candidat
         cache_exists = any(get_cached_youtube_data(CANDIDATES[cid]["name"]) for cid in candidate_ids)
 
@@ -2852,7 +5233,7 @@ def collect_data(candidate_ids: List[str], start_date: date, end_date: date, you
 
     # === PRESSE: Système de cache 30j (comme YouTube) ===
     press_cache_valid = is_press_cache_valid()
-    press_refresh_needed = not press_cache_valid
+    press_refresh_needed = not press_cache_valid and not as_of
 
     if press_refresh_needed:
         status.text("Rafraîchissement des données presse (30 jours)...")
@@ -2870,6 +5251,17 @@ def collect_data(candidate_ids: List[str], start_date: date, end_date: date, you
 
     progress.progress(0.15)
 
+    # Table columnaire des mentions (caches 30j) : stats presse et listes de la période en group-by vectorisé
+    mention_table = get_mention_table([c["name"] for c in CANDIDATES.values()])
+    table_index = {name: i for i, name in enumerate(mention_table["candidates"])}
+    press_stats = table_press_stats(mention_table, start_date, end_date)
+    video_lists = table_video_lists(mention_table, start_date, end_date)
+
+    # Rollup journalier (reconstruit quand la table change) : totaux additifs de la période par différence de préfixes
+    rollup = get_context_rollup(mention_table)
+    window = rollup_window(rollup, start_date, end_date)
+    distinct_domains = rollup_distinct_domains(rollup, start_date, end_date)
+
     total = len(candidate_ids)
 
     for i, cid in enumerate(candidate_ids):
@@ -2880,31 +5272,30 @@ def collect_data(candidate_ids: List[str], start_date: date, end_date: date, you
 
         wiki = get_wikipedia_views(c["wikipedia"], start_date, end_date)
 
-        # Presse: utiliser le cache et filtrer par période
-        cached_press = get_cached_press_data(name)
-        if cached_press:
-            all_articles = cached_press.get("articles", [])
-            filtered_articles = filter_press_by_period(all_articles, start_date, end_date)
-            # Recalculer les stats sur les articles filtrés
-            domains = set(art["domain"] for art in filtered_articles if art.get("domain"))
-            domain_counts = Counter(art["domain"] for art in filtered_articles if art.get("domain"))
-            top_media = domain_counts.most_common(1)[0] if domain_counts else (None, 0)
-            press = {
-                "articles": filtered_articles,
-                "count": len(filtered_articles),
-                "domains": len(domains),
-                "top_media": top_media[0],
-                "top_media_count": top_media[1],
-                "media_breakdown": domain_counts.most_common(5)
-            }
+        ti = table_index[name]
+
+        # Presse: stats de la période depuis la table (cache 30j)
+        if press_from_daily:
+            press = get_all_press_coverage(name, c["search_terms"], start_date, end_date, as_of=True)
+        elif mention_table["has_press"][ti]:
+            press = press_stats[name]
+            # Diversité des sources depuis les esquisses fusionnées du rollup
+            press["domains"] = int(distinct_domains[ti])
         else:
             # Fallback: requête directe si pas de cache
             press = get_all_press_coverage(name, c["search_terms"], start_date, end_date)
 
-        tv_radio = get_tv_radio_mentions(name, start_date, end_date)
+        tv_radio = get_tv_radio_mentions(name, c["search_terms"], start_date, end_date)
+        index_tv_radio_mentions(name, tv_radio["mentions"])
 
-        # YouTube: récupérer depuis le cache 30j et filtrer par période
-        youtube = get_youtube_data_for_period(name, youtube_key, start_date, end_date)
+        # YouTube: stats de la période depuis la table (cache 30j)
+        if mention_table["has_youtube"][ti]:
+            youtube = {"available": bool(video_lists[name]), "videos": video_lists[name]}
+            youtube.update(rollup_youtube_stats(window, ti))
+            youtube["official_channel"] = mention_table["official_channels"][name]
+            youtube["from_cache"] = True
+        else:
+            youtube = get_youtube_data_for_period(name, youtube_key, start_date, end_date)
         if not youtube.get("available") and youtube_mode == "disabled":
             youtube["disabled"] = True
 
@@ -2926,31 +5317,15 @@ def collect_data(candidate_ids: List[str], start_date: date, end_date: date, you
         progress.progress((i + 1) / total)
 
     # === CALCUL DES SCORES (après collecte de tous les candidats) ===
-    # Collecter tous les comptages pour calcul relatif
-    all_press_counts = [results[cid]["press"]["count"] for cid in candidate_ids]
-    all_wiki_views = [results[cid]["wikipedia"]["views"] for cid in candidate_ids]
-    all_youtube_views = [results[cid]["youtube"].get("total_views", 0) for cid in candidate_ids]
-    period_days = (end_date - start_date).days + 1
-
+    # Métriques brutes conservées avec le résultat : re-pondération sans nouvelle collecte
+    metrics = extract_score_metrics(results, candidate_ids, (end_date - start_date).days + 1)
+    scores = rescore_candidates(metrics)
     for cid in candidate_ids:
-        d = results[cid]
-        score = calculate_score(
-            wiki_views=d["wikipedia"]["views"],
-            press_count=d["press"]["count"],
-            press_domains=d["press"]["domains"],
-            trends_score=d["trends_score"],
-            youtube_views=d["youtube"].get("total_views", 0),
-            youtube_available=d["youtube"].get("available", False),
-            period_days=period_days,
-            all_candidates_press=all_press_counts,
-            all_candidates_wiki=all_wiki_views,
-            all_candidates_youtube=all_youtube_views
-        )
-        results[cid]["score"] = score
+        results[cid]["score"] = scores[cid]
 
     # === ANALYSE SENTIMENT (si clé Anthropic disponible) ===
     sentiment_analyzed = 0
-    if ANTHROPIC_API_KEY:
+    if ANTHROPIC_API_KEY and analyze:
         status.text("Analyse sentiment des titres...")
         for cid in candidate_ids:
             d = results[cid]
@@ -2970,15 +5345,26 @@ def collect_data(candidate_ids: List[str], start_date: date, end_date: date, you
                 analyzed = analyze_and_cache_sentiments(all_titles, name, ANTHROPIC_API_KEY)
                 sentiment_analyzed += analyzed
 
-            # Calculer le sentiment combiné pour ce candidat
-            sentiment = compute_combined_sentiment(
-                d["press"].get("articles", []),
-                d["youtube"].get("videos", [])
+        if press_from_daily:
+            # Articles hors table des mentions : table de la période construite depuis les résultats
+            period_table = build_mention_table(
+                candidate_ids,
+                {cid: results[cid]["press"].get("articles", []) for cid in candidate_ids},
+                {cid: results[cid]["youtube"].get("videos", []) for cid in candidate_ids}
             )
-            results[cid]["sentiment"] = sentiment
+            sentiment_agg = table_sentiment(period_table, start_date, end_date)
+            for ci, cid in enumerate(candidate_ids):
+                results[cid]["sentiment"] = sentiment_entry(sentiment_agg, ci)
+        else:
+            # Sentiment combiné de tous les candidats depuis le rollup (nouveaux scores intégrés en delta)
+            refresh_mention_sentiment(mention_table)
+            rollup = get_context_rollup(mention_table)
+            sentiment_agg = rollup_sentiment(rollup_window(rollup, start_date, end_date))
+            for cid in candidate_ids:
+                results[cid]["sentiment"] = sentiment_entry(sentiment_agg, table_index[CANDIDATES[cid]["name"]])
 
     # === ANALYSE THÈMES (si clé Anthropic disponible) ===
-    if ANTHROPIC_API_KEY:
+    if ANTHROPIC_API_KEY and analyze:
         status.text("Analyse des thèmes médiatiques...")
         for cid in candidate_ids:
             d = results[cid]
@@ -3015,8 +5401,22 @@ def collect_data(candidate_ids: List[str], start_date: date, end_date: date, you
         )
         youtube_quota_exhausted = all_yt_zero and (any_yt_error or get_youtube_quota_remaining() == 0)
 
+    # Composantes qu'une date passée ne permet pas de reconstituer : pas d'historique des vues
+    # YouTube (0 ou vues actuelles), presse GDELT seule avant la fenêtre 30j, Trends de secours
+    # ou indisponible
+    as_of_missing = None
+    if as_of:
+        as_of_missing = ["youtube"]
+        if press_from_daily:
+            as_of_missing.append("press")
+        if trends.get("is_fallback") or not trends.get("success", True):
+            as_of_missing.append("trends")
+
     return {
         "candidates": results,
+        "metrics": metrics,
+        "as_of": end_date.isoformat() if as_of else None,
+        "as_of_missing": as_of_missing,
         "youtube": {
             "mode": youtube_mode,
             "refresh_count_today": get_youtube_refresh_count_today(),
@@ -3032,10 +5432,271 @@ def collect_data(candidate_ids: List[str], start_date: date, end_date: date, you
     }
 
 
+# =============================================================================
+# BACKFILL DE L'HISTORIQUE (REPRISE SUR POINT DE CONTRÔLE)
+# =============================================================================
+# python app.py --backfill 2026-09-01 2026-10-15 [--contexte national] [--periode 14]
+# Reconstruit une entrée d'historique par jour en mode as of (caches journaliers permanents),
+# avec des scores Trends tirés d'une série journalière ré-échelonnée sur chaque fenêtre.
+# Les entrées sont marquées as_of avec les composantes non reconstituables (vues YouTube,
+# presse GDELT seule avant la fenêtre 30j), exclues des comparaisons d'historique.
+# La progression est enregistrée tous les quelques jours : relancer la même commande reprend.
+
+BACKFILL_RATE_LIMITS = {"wikipedia": 0.5, "gdelt": 6.0, "trends": 20.0}  # Secondes entre requêtes
+BACKFILL_CHECKPOINT_DAYS = 7
+
+
+def load_backfill_state(path: str) -> Dict:
+    """Charge le point de contrôle du backfill"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except:
+        return {}
+
+
+def save_backfill_state(path: str, state: Dict) -> bool:
+    """Sauvegarde le point de contrôle du backfill"""
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        return True
+    except:
+        return False
+
+
+def _backfill_prefetch(candidate_ids: List[str], first_start: date, last_end: date, period_days: int) -> List[str]:
+    """
+    Remplit les caches journaliers permanents sur toute la plage en une passe (requêtes groupées
+    par plage contiguë). Retourne la liste des sources restées incomplètes.
+    """
+    incomplete = []
+    for cid in candidate_ids:
+        c = CANDIDATES[cid]
+        logger.info(f"[BACKFILL] Préchargement {c['name']}")
+        # Fenêtre de référence Wikipedia (période précédente) incluse
+        _, error = get_wikipedia_daily(c["wikipedia"], first_start - timedelta(days=period_days), last_end)
+        if error:
+            incomplete.append(f"Wikipedia {c['name']}: {error}")
+        for term in c["search_terms"]:
+            get_gdelt_articles_daily(term, first_start, last_end)
+            known = load_daily_cache(GDELT_DAILY_CACHE_FILE).get(term, {})
+            if any(is_settled_day(r[0]) for r in missing_day_ranges(known, first_start, last_end)):
+                incomplete.append(f"GDELT {term}")
+    return incomplete
+
+
+def _backfill_trends(state: Dict, names: List[str], first_start: date, last_end: date, period_days: int) -> bool:
+    """
+    Séries Trends journalières couvrant la plage, par tronçons qui se chevauchent d'une période :
+    chaque fenêtre tient entièrement dans un tronçon. Les tronçons obtenus sont gardés dans l'état.
+    """
+    chunks = state.setdefault("trends", [])
+    chunk_start = first_start
+    while True:
+        chunk_end = min(chunk_start + timedelta(days=TRENDS_DAILY_MAX_DAYS - 1), last_end)
+        if not any(ch["start"] == chunk_start.isoformat() and ch["end"] == chunk_end.isoformat() for ch in chunks):
+            logger.info(f"[BACKFILL] Trends {chunk_start} → {chunk_end}")
+            fetched = fetch_trends_daily_series(names, chunk_start, chunk_end)
+            if fetched["errors"] or not fetched["series"]:
+                logger.error(f"[BACKFILL] Trends indisponible : {fetched['errors']}")
+                return False
+            chunks.append({"start": chunk_start.isoformat(), "end": chunk_end.isoformat(), "series": fetched["series"]})
+        if chunk_end >= last_end:
+            return True
+        chunk_start = chunk_end - timedelta(days=period_days - 2)
+
+
+def _backfill_window_trends(state: Dict, names: List[str], start_date: date, end_date: date) -> Dict:
+    """Scores Trends d'une fenêtre depuis le tronçon de série qui la contient"""
+    for chunk in state.get("trends", []):
+        if chunk["start"] <= start_date.isoformat() and end_date.isoformat() <= chunk["end"]:
+            return trends_scores_for_window(chunk["series"], names, start_date, end_date)
+    return {"success": False, "scores": {name: 0.0 for name in names}, "errors": ["Série Trends absente"]}
+
+
+def _flush_backfill(entries: List[Dict], state: Dict, state_file: str):
+    """
+    Écrit les entrées en attente dans l'historique, puis le point de contrôle. Une case de
+    rétention (jour, semaine, mois) touchée pour la première fois par ce backfill remplace
+    l'existant ; les suivantes s'ajoutent aux entrées déjà écrites par ce même backfill.
+    """
+    if entries:
+        written = set(state["buckets"])
+        replaced = {history_bucket(e["date"]) for e in entries} - written
+        history = [h for h in load_history() if history_bucket(h["date"]) not in replaced]
+        save_history(history + entries)
+        state["buckets"] = sorted(written | replaced)
+        logger.info(f"[BACKFILL] {len(entries)} entrées enregistrées (jusqu'au {max(e['date'] for e in entries)})")
+    save_backfill_state(state_file, state)
+
+
+def run_backfill(contexte: str, start_day: date, end_day: date, period_days: int = 14, overwrite: bool = False) -> bool:
+    """
+    Reconstruit les entrées d'historique quotidiennes de start_day à end_day (dates de fin de
+    période). Reprend au dernier point de contrôle si les paramètres sont identiques ;
+    les dates déjà présentes sont conservées sauf overwrite. Retourne True si terminé.
+    """
+    global CANDIDATES, HISTORY_FILE, YOUTUBE_CACHE_FILE, TRENDS_CACHE_FILE, PRESS_CACHE_FILE
+
+    CANDIDATES = CANDIDATES_NATIONAL if contexte == "national" else CANDIDATES_PARIS
+    context_files = get_context_files(contexte)
+    HISTORY_FILE = context_files["history"]
+    YOUTUBE_CACHE_FILE = context_files["youtube_cache"]
+    TRENDS_CACHE_FILE = context_files["trends_cache"]
+    PRESS_CACHE_FILE = context_files["press_cache"]
+    SOURCE_MIN_INTERVAL.update(BACKFILL_RATE_LIMITS)
+
+    # Pas de journée en cours ; au-delà d'un an, le recul du mode as of
+    start_day = max(start_day, date.today() - timedelta(days=AS_OF_MAX_DAYS))
+    end_day = min(end_day, date.today() - timedelta(days=1))
+
+    state_file = f"backfill_state_{contexte}.json"
+    params = {"start": start_day.isoformat(), "end": end_day.isoformat(), "period_days": period_days}
+    state = load_backfill_state(state_file)
+    if state.get("params") != params:
+        state = {"params": params, "next_date": start_day.isoformat(), "trends": [], "skipped": []}
+    state.setdefault("buckets", [])
+
+    day = date.fromisoformat(state["next_date"])
+    if day > end_day:
+        logger.info("[BACKFILL] Déjà terminé")
+        return True
+
+    candidate_ids = list(CANDIDATES.keys())
+    names = [CANDIDATES[cid]["name"] for cid in candidate_ids]
+    first_start = day - timedelta(days=period_days - 1)
+
+    incomplete = _backfill_prefetch(candidate_ids, first_start, end_day, period_days)
+    if incomplete:
+        for source in incomplete:
+            logger.error(f"[BACKFILL] Données incomplètes : {source}")
+        save_backfill_state(state_file, state)
+        return False
+    trends_ok = _backfill_trends(state, names, first_start, end_day, period_days)
+    save_backfill_state(state_file, state)
+    if not trends_ok:
+        return False
+
+    # Cases de rétention déjà présentes (hors celles écrites par ce backfill lors d'un passage précédent)
+    existing = {history_bucket(h["date"]) for h in load_history()} - set(state["buckets"])
+    pending = []
+    try:
+        while day <= end_day:
+            start_date = day - timedelta(days=period_days - 1)
+            if overwrite or history_bucket(day.isoformat()) not in existing:
+                logger.info(f"[BACKFILL] {day}")
+                trends = _backfill_window_trends(state, names, start_date, day)
+                result = collect_data(candidate_ids, start_date, day, YOUTUBE_API_KEY,
+                                      as_of=True, trends=trends, analyze=False)
+                data = result["candidates"]
+                missing = result["as_of_missing"]
+                if trends["success"] and "trends" not in missing and all(d["wikipedia"]["views"] > 0 for d in data.values()):
+                    # Entrée marquée : YouTube (et la presse avant la fenêtre 30j) hors comparaisons
+                    pending.append(make_history_entry(data, f"{start_date} à {day}", day, result["metrics"], missing))
+                else:
+                    state["skipped"].append(day.isoformat())
+            day += timedelta(days=1)
+            state["next_date"] = day.isoformat()
+            if len(pending) >= BACKFILL_CHECKPOINT_DAYS:
+                _flush_backfill(pending, state, state_file)
+                pending = []
+    finally:
+        # Interruption comprise : le travail fait est conservé, la reprise repart du jour en cours
+        _flush_backfill(pending, state, state_file)
+
+    if state["skipped"]:
+        logger.warning(f"[BACKFILL] Jours ignorés (données incomplètes) : {', '.join(state['skipped'])}")
+    return True
+
+
+def run_backfill_cli(argv: List[str]):
+    """Point d'entrée ligne de commande du backfill"""
+    parser = argparse.ArgumentParser(description="Backfill de l'historique jour par jour")
+    parser.add_argument("--backfill", nargs=2, metavar=("DEBUT", "FIN"), required=True,
+                        help="Dates de fin de période, format AAAA-MM-JJ")
+    parser.add_argument("--contexte", choices=["paris", "national"], default="paris")
+    parser.add_argument("--periode", type=int, default=14, help="Durée de chaque période en jours")
+    parser.add_argument("--ecraser", action="store_true", help="Recalcule aussi les dates déjà présentes")
+    args = parser.parse_args(argv)
+
+    done = run_backfill(
+        args.contexte,
+        date.fromisoformat(args.backfill[0]),
+        date.fromisoformat(args.backfill[1]),
+        args.periode,
+        args.ecraser
+    )
+    # Les envois cloud partent en arrière-plan : attendre leur fin avant de quitter
+    wait_history_sync()
+    sys.exit(0 if done else 1)
+
+
 # =============================================================================
 # INTERFACE PRINCIPALE
 # =============================================================================
 
+@st.fragment
+def render_chatbot(result: Dict, contexte: str, period_label_chat: str, candidate_names: List[str],
+                   snapshot_key: str):
+    """
+    Chatbot isolé dans un fragment : poser une question ne réexécute que cette fonction
+    (pas l'historique, les tableaux ni les graphiques du reste de la page).
+    snapshot_key identifie les résultats affichés (paramètres + pondération active).
+    """
+    # Initialiser le state pour persister la réponse du chatbot
+    if "chatbot_last_response" not in st.session_state:
+        st.session_state.chatbot_last_response = None
+
+    # Interface chatbot
+    question = None
+    col_chat, col_btn = st.columns([5, 1])
+    with col_chat:
+        user_question = st.text_input(
+            "Posez une question sur les données",
+            placeholder="Ex: Qui est sur une bonne dynamique ? Et pour quelle raison ?",
+            label_visibility="visible",
+            key="chatbot_input"
+        )
+    with col_btn:
+        st.markdown("<br>", unsafe_allow_html=True)  # Alignement vertical
+        if st.button("Envoyer", width="stretch", type="primary"):
+            if user_question.strip():
+                if ANTHROPIC_API_KEY:
+                    question = user_question
+                else:
+                    st.warning("Assistant non configuré.")
+            else:
+                st.warning("Veuillez entrer une question.")
+
+    response_box = st.empty()
+
+    # Question posée : la réponse s'affiche au fil de l'eau dans response_box
+    if question:
+        with st.spinner("Analyse en cours..."):
+            # Contexte avec les données des DEUX pages (Paris + National) + titres pertinents
+            full_context = get_chatbot_context(result, contexte, period_label_chat, snapshot_key, question)
+
+        response = ""
+        for chunk in stream_cached_chatbot_response(question, full_context, ANTHROPIC_API_KEY):
+            response += chunk
+            response_box.markdown(f'<div class="chatbot-response">{response} ▌</div>', unsafe_allow_html=True)
+        st.session_state.chatbot_last_response = response
+
+        # Log silencieux de la conversation
+        log_chatbot_conversation(
+            question=question,
+            response=response,
+            contexte=contexte,
+            period=period_label_chat,
+            candidats=candidate_names
+        )
+
+    # Afficher la dernière réponse si elle existe
+    if st.session_state.chatbot_last_response:
+        response_box.markdown(f'<div class="chatbot-response">{st.session_state.chatbot_last_response}</div>', unsafe_allow_html=True)
+
+
 def main():
     global CANDIDATES, HISTORY_FILE, YOUTUBE_CACHE_FILE, TRENDS_CACHE_FILE, PRESS_CACHE_FILE
 
@@ -3145,11 +5806,42 @@ def main():
         # Période
         st.markdown("### Période d'analyse")
 
-        period_options = {"24 heures": 1, "7 jours": 7, "14 jours": 14, "30 jours": 30}
+        period_options = {"24 heures": 1, "7 jours": 7, "14 jours": 14, "30 jours": 30, "Personnalisée": None}
         period_label = st.selectbox("Durée", list(period_options.keys()), index=2)  # 14 jours par défaut
-        period_days = period_options[period_label]
-        end_date = date.today()
-        start_date = end_date - timedelta(days=period_days - 1)
+        custom_period = period_options[period_label] is None
+        as_of_mode = False
+        if custom_period:
+            # Plage libre dans la fenêtre des caches 30j : presse et YouTube depuis les rollups,
+            # Trends depuis la série journalière partagée (get_trends_window)
+            today = date.today()
+            custom_range = st.date_input(
+                "Dates",
+                value=(today - timedelta(days=6), today),
+                min_value=today - timedelta(days=29),
+                max_value=today,
+                format="DD/MM/YYYY"
+            )
+            if isinstance(custom_range, (tuple, list)) and len(custom_range) == 2:
+                start_date, end_date = custom_range
+            else:
+                start_date = end_date = custom_range[0] if isinstance(custom_range, (tuple, list)) and custom_range else today
+            period_days = (end_date - start_date).days + 1
+        else:
+            period_days = period_options[period_label]
+            as_of_mode = st.toggle("Date passée", key="as_of_mode", help="Indice tel qu'il était à une date antérieure (caches journaliers permanents)")
+            if as_of_mode:
+                today = date.today()
+                end_date = st.date_input(
+                    "Jusqu'au",
+                    key="as_of_date",
+                    value=today - timedelta(days=1),
+                    min_value=today - timedelta(days=AS_OF_MAX_DAYS),
+                    max_value=today - timedelta(days=1),
+                    format="DD/MM/YYYY"
+                )
+            else:
+                end_date = date.today()
+            start_date = end_date - timedelta(days=period_days - 1)
 
         st.caption(f"{start_date.strftime('%d/%m/%Y')} → {end_date.strftime('%d/%m/%Y')}")
 
@@ -3164,7 +5856,24 @@ def main():
 
         st.markdown("---")
         st.markdown("### Pondération du score")
-        st.caption("Presse 30% · Trends 30% · Wikipedia 25% · YouTube 15%")
+        weight_labels = {"press": "Presse", "trends": "Trends", "wiki": "Wikipedia", "youtube": "YouTube"}
+        default_weights = dict(zip(SCORE_COMPONENTS, DEFAULT_SCORE_WEIGHTS))
+        raw_weights = {}
+        for name in ("press", "trends", "wiki", "youtube"):
+            # Valeur portée par le session state seul (modifiée aussi par reset_score_weights)
+            if f"weight_{name}" not in st.session_state:
+                st.session_state[f"weight_{name}"] = int(round(default_weights[name] * 100))
+            raw_weights[name] = st.slider(weight_labels[name], 0, 100, step=5, key=f"weight_{name}")
+        weight_values = np.array([raw_weights[name] for name in SCORE_COMPONENTS], dtype=np.float64)
+        if weight_values.sum() > 0:
+            score_weights = weight_values / weight_values.sum()
+        else:
+            score_weights = DEFAULT_SCORE_WEIGHTS
+        weight_pct = {name: f"{w:.0%}" for name, w in zip(SCORE_COMPONENTS, score_weights)}
+        st.caption(" · ".join(f"{weight_labels[name]} {weight_pct[name]}" for name in ("press", "trends", "wiki", "youtube")))
+        custom_weights = not np.array_equal(score_weights, DEFAULT_SCORE_WEIGHTS)
+        if custom_weights:
+            st.button("Pondération par défaut", on_click=reset_score_weights, width="stretch")
 
         st.markdown("---")
         st.caption("Kléothime Bourdon · bourdonkleothime@gmail.com")
@@ -3174,17 +5883,21 @@ def main():
         return
 
     # Clé unique pour détecter si les paramètres ont changé
-    params_key = f"{contexte}_{period_days}_{','.join(sorted(selected))}"
+    params_key = f"{contexte}_{start_date}_{end_date}_{','.join(sorted(selected))}_{'asof' if as_of_mode else 'live'}"
 
     # Utiliser le cache session si les paramètres n'ont pas changé
     if "result_cache" in st.session_state and st.session_state.get("result_params_key") == params_key:
         result = st.session_state.result_cache
     else:
-        result = collect_data(selected, start_date, end_date, YOUTUBE_API_KEY)
+        result = collect_data(selected, start_date, end_date, YOUTUBE_API_KEY, as_of=as_of_mode)
         st.session_state.result_cache = result
         st.session_state.result_params_key = params_key
 
     data = result["candidates"]
+    if custom_weights and "metrics" in result:
+        # Re-classement instantané depuis les métriques brutes du résultat (aucune collecte)
+        rescored = rescore_candidates(result["metrics"], score_weights)
+        data = {cid: dict(d, score=rescored[cid]) for cid, d in data.items()}
     sorted_data = sorted(data.items(), key=lambda x: x[1]["score"]["total"], reverse=True)
 
     # Variable pour conditionner l'affichage de Sarah Knafo en gras (dans les deux contextes)
@@ -3224,17 +5937,30 @@ def main():
         any_youtube_ok,      # Au moins 1 candidat avec YouTube
     ])
 
-    # Sauvegarder seulement si intervalle OK ET données complètes
-    if interval_ok and data_complete:
+    if as_of_mode:
+        # Date passée : comble un trou de l'historique sans écraser une entrée existante ni
+        # s'ajouter à un agrégat hebdo/mensuel déjà présent. YouTube (et la presse avant la
+        # fenêtre 30j) n'est pas reconstituable : l'entrée est marquée et ces composantes sont
+        # exclues des comparaisons. Pas d'enregistrement avec des scores Trends de secours.
+        bucket = history_bucket(end_date.strftime("%Y-%m-%d"))
+        as_of_missing = result.get("as_of_missing") or []
+        as_of_complete = all([trends_ok, all_wiki_ok, any_trends_ok, "trends" not in as_of_missing])
+        if as_of_complete and not any(history_bucket(h["date"]) == bucket for h in history):
+            period_label = f"{start_date} à {end_date}"
+            add_to_history(result["candidates"], period_label, end_date, result.get("metrics"), as_of_missing)
+    # Sauvegarder seulement si intervalle OK ET données complètes (périodes fixes uniquement)
+    elif interval_ok and data_complete and not custom_period:
         period_label = f"{start_date} à {end_date}"
-        add_to_history(data, period_label, end_date)
+        add_to_history(result["candidates"], period_label, end_date, result.get("metrics"))  # Pondération par défaut
 
     # === CHATBOT IA ===
     st.markdown("---")
 
     # Construire le label de période pour le contexte
     period_days = (end_date - start_date).days + 1
-    if period_days <= 1:
+    if custom_period:
+        period_label_chat = f"du {start_date.strftime('%d/%m/%Y')} au {end_date.strftime('%d/%m/%Y')}"
+    elif period_days <= 1:
         period_label_chat = "24 heures"
     elif period_days <= 7:
         period_label_chat = "7 jours"
@@ -3271,79 +5997,11 @@ def main():
     """
     st.markdown(chatbot_css, unsafe_allow_html=True)
 
-    # Initialiser le state pour persister la réponse du chatbot
-    if "chatbot_last_response" not in st.session_state:
-        st.session_state.chatbot_last_response = None
-    if "chatbot_question_to_process" not in st.session_state:
-        st.session_state.chatbot_question_to_process = None
-
-    # Traiter la question en attente AVANT d'afficher l'interface
-    if st.session_state.chatbot_question_to_process:
-        question = st.session_state.chatbot_question_to_process
-        st.session_state.chatbot_question_to_process = None  # Reset immédiatement
-
-        if ANTHROPIC_API_KEY:
-            with st.spinner("Analyse en cours..."):
-                # Construire le contexte avec les données des DEUX pages (Paris + National)
-                context_parts = []
-
-                # Données actuellement affichées
-                context_parts.append(build_chatbot_context(result, contexte, period_label_chat))
-
-                # Charger l'autre contexte depuis le cache
-                other_contexte = "national" if contexte == "paris" else "paris"
-                other_cache_file = get_context_files(other_contexte)["youtube_cache"]
-
-                # Pour l'autre contexte, on utilise les données en cache si disponibles
-                try:
-                    with open(other_cache_file, "r", encoding="utf-8") as f:
-                        other_cache = json.load(f)
-                    if other_cache.get("data"):
-                        context_parts.append(f"\n\n--- Données {other_contexte.upper()} (cache) ---\n")
-                        for name, cdata in other_cache.get("data", {}).items():
-                            if cdata.get("videos"):
-                                total_views = sum(v.get("views", 0) for v in cdata["videos"])
-                                context_parts.append(f"- {name}: {total_views:,} vues YouTube ({len(cdata['videos'])} vidéos)")
-                except:
-                    pass  # Pas de cache disponible pour l'autre contexte
-
-                full_context = "\n".join(context_parts)
-                response = get_chatbot_response(question, full_context, ANTHROPIC_API_KEY)
-                st.session_state.chatbot_last_response = response
-
-                # Log silencieux de la conversation
-                log_chatbot_conversation(
-                    question=question,
-                    response=response,
-                    contexte=contexte,
-                    period=period_label_chat,
-                    candidats=[d["info"]["name"] for cid, d in data.items()]
-                )
-
-    # Interface chatbot
-    col_chat, col_btn = st.columns([5, 1])
-    with col_chat:
-        user_question = st.text_input(
-            "Posez une question sur les données",
-            placeholder="Ex: Qui est sur une bonne dynamique ? Et pour quelle raison ?",
-            label_visibility="visible",
-            key="chatbot_input"
-        )
-    with col_btn:
-        st.markdown("<br>", unsafe_allow_html=True)  # Alignement vertical
-        if st.button("Envoyer", width="stretch", type="primary"):
-            if user_question.strip():
-                if ANTHROPIC_API_KEY:
-                    st.session_state.chatbot_question_to_process = user_question
-                    st.rerun()
-                else:
-                    st.warning("Assistant non configuré.")
-            else:
-                st.warning("Veuillez entrer une question.")
-
-    # Afficher la dernière réponse si elle existe
-    if st.session_state.chatbot_last_response:
-        st.markdown(f'<div class="chatbot-response">{st.session_state.chatbot_last_response}</div>', unsafe_allow_html=True)
+    # Le chatbot commente les scores affichés (pondération active comprise)
+    chat_result = dict(result, candidates=data, score_weights=score_weights) if custom_weights else result
+    weights_key = ",".join(f"{w:.4f}" for w in score_weights)
+    render_chatbot(chat_result, contexte, period_label_chat, [d["info"]["name"] for cid, d in data.items()],
+                   f"{params_key}|{weights_key}")
 
     # === CLASSEMENT ===
     st.markdown("---")
@@ -3381,6 +6039,7 @@ def main():
             'Thèmes': themes_str,
             'Top Média': top_media_str,
             'Articles': d['press']['count'],
+            'Sujets': d['press'].get('stories', d['press']['count']),
             'Trends': round(trends_val, 1) if trends_val > 0 else 0,
             'Wikipedia': d['wikipedia']['views'],
             'Vues YT': yt_views,
@@ -3514,6 +6173,7 @@ def main():
             st.plotly_chart(fig, width="stretch", config=plotly_config)
 
         with col2:
+            decomp_labels = {comp: f"{weight_labels[comp]} ({weight_pct[comp]})" for comp in ("press", "trends", "wiki", "youtube")}
             decomp_data = []
             for _, d in sorted_data:
                 s = d['score']
@@ -3521,21 +6181,18 @@ def main():
                 name_display = f"<b>{name}</b>" if (name == "Sarah Knafo" and highlight_knafo) else name
                 decomp_data.append({
                     'Candidat': name_display,
-                    'Presse (30%)': s['contrib_press'],
-                    'Trends (30%)': s['contrib_trends'],
-                    'Wikipedia (25%)': s['contrib_wiki'],
-                    'YouTube (15%)': s['contrib_youtube'],
+                    **{decomp_labels[comp]: s[f'contrib_{comp}'] for comp in decomp_labels}
                 })
 
             df_decomp = pd.DataFrame(decomp_data)
             fig = px.bar(df_decomp, x='Candidat',
-                        y=['Presse (30%)', 'Trends (30%)', 'Wikipedia (25%)', 'YouTube (15%)'],
+                        y=list(decomp_labels.values()),
                         barmode='stack', title='Decomposition du score',
                         color_discrete_map={
-                            'Presse (30%)': '#2563eb',
-                            'Trends (30%)': '#16a34a',
-                            'Wikipedia (25%)': '#eab308',
-                            'YouTube (15%)': '#dc2626'
+                            decomp_labels['press']: '#2563eb',
+                            decomp_labels['trends']: '#16a34a',
+                            decomp_labels['wiki']: '#eab308',
+                            decomp_labels['youtube']: '#dc2626'
                         })
             fig.update_layout(
                 yaxis=dict(range=[0, 100], title='Points', fixedrange=True),
@@ -3549,6 +6206,52 @@ def main():
             )
             st.plotly_chart(fig, width="stretch", config=plotly_config)
 
+        # === STABILITÉ DU CLASSEMENT ===
+        st.markdown("---")
+        st.markdown("#### Stabilité du classement")
+        if "metrics" in result and st.toggle(
+            "Analyse de sensibilité (Monte-Carlo)",
+            help=f"{SENSITIVITY_SAMPLES} tirages : pondérations autour des poids actifs + ré-échantillonnage des articles et vidéos"
+        ):
+            stability = rank_stability(data, result["metrics"], score_weights,
+                                       display_order=[cid for cid, _ in sorted_data])
+            cid_pos = {cid: i for i, cid in enumerate(stability["candidates"])}
+            n_ranks = len(stability["candidates"])
+
+            stability_rows = []
+            for current_rank, (cid, d) in enumerate(sorted_data, 1):
+                ci = cid_pos[cid]
+                cand_ranks = stability["ranks"][:, ci] + 1
+                low, median, high = np.percentile(cand_ranks, [5, 50, 95], method="nearest")
+                stability_rows.append({
+                    'Candidat': d['info']['name'],
+                    'Rang': current_rank,
+                    'Rang médian': int(median),
+                    'Intervalle 90%': f"{int(low)} – {int(high)}" if low != high else str(int(low)),
+                    'P(1er)': f"{stability['rank_probs'][ci, 0]:.0%}",
+                    'P(top 3)': f"{stability['rank_probs'][ci, :3].sum():.0%}",
+                })
+            st.dataframe(pd.DataFrame(stability_rows), width="stretch", hide_index=True)
+
+            probs = np.array([stability["rank_probs"][cid_pos[cid]] for cid, _ in sorted_data])
+            fig = go.Figure(go.Heatmap(
+                z=probs * 100,
+                x=[str(r) for r in range(1, n_ranks + 1)],
+                y=names_html,
+                colorscale="Blues",
+                zmin=0, zmax=100,
+                hovertemplate='%{y}<br>Rang %{x} : %{z:.0f}%<extra></extra>',
+                colorbar=dict(title="%")
+            ))
+            fig.update_layout(
+                title='Probabilité de chaque rang',
+                xaxis=dict(title='Rang', fixedrange=True),
+                yaxis=dict(autorange="reversed", fixedrange=True),
+                height=max(300, n_ranks * 28),
+                dragmode=False
+            )
+            st.plotly_chart(fig, width="stretch", config=plotly_config)
+
     # TAB 2: THEMES / ANALYSE QUALITATIVE
     with tab2:
         st.markdown('### Thèmes médiatiques')
@@ -3728,27 +6431,24 @@ def main():
                 # Créer les périodes de 2 jours
                 evolution_data = []
 
-                for day_offset in range(0, period_days, 2):
-                    period_start = start_date + timedelta(days=day_offset)
-                    period_end = min(period_start + timedelta(days=1), end_date)
-                    period_label = period_start.strftime("%d/%m")
+                # Table des mentions de la période, sentiment agrégé par (candidat, tranche de 2 jours)
+                evolution_table = build_mention_table(
+                    [cid for cid, _ in sorted_data],
+                    {cid: d["press"].get("articles", []) for cid, d in sorted_data},
+                    {cid: d["youtube"].get("videos", []) for cid, d in sorted_data}
+                )
+                evolution_agg = table_sentiment(evolution_table, start_date, end_date, bucket_days=2)
+                n_buckets = evolution_agg["n_buckets"]
+
+                for bucket in range(n_buckets):
+                    period_label = (start_date + timedelta(days=2 * bucket)).strftime("%d/%m")
 
-                    for _, d in sorted_data:
+                    for ci, (cid, d) in enumerate(sorted_data):
                         name = d["info"]["name"]
                         color = d["info"]["color"]
 
-                        # Filtrer les articles et vidéos pour cette période
-                        articles_period = [
-                            art for art in d["press"].get("articles", [])
-                            if art.get("date") and period_start.strftime("%Y-%m-%d") <= art["date"] <= period_end.strftime("%Y-%m-%d")
-                        ]
-                        videos_period = [
-                            vid for vid in d["youtube"].get("videos", [])
-                            if vid.get("published") and period_start.strftime("%Y-%m-%d") <= vid["published"][:10] <= period_end.strftime("%Y-%m-%d")
-                        ]
-
-                        # Calculer le sentiment pour cette période
-                        sentiment_period = compute_combined_sentiment(articles_period, videos_period)
+                        # Sentiment pour cette période
+                        sentiment_period = sentiment_entry(evolution_agg, ci * n_buckets + bucket)
 
                         # Seulement si on a des données
                         total_items = sentiment_period["press"]["total"] + sentiment_period["youtube"]["total"]
@@ -4127,6 +6827,19 @@ def main():
         #     st.caption(f"📊 Données chargées: {dates_loaded}")
 
         if history and len(history) >= 1:
+            # Re-scorer l'historique (entrées avec vecteur brut) selon la formule actuelle
+            # Pondération personnalisée : courbes et variations suivent par défaut le classement affiché
+            rescore_mode = st.radio(
+                "Scores affichés",
+                ["Enregistrés", "Formule actuelle", "Pondération active"],
+                index=2 if custom_weights else 0,
+                horizontal=True,
+                help="Re-calcule les entrées qui conservent leurs métriques brutes ; les plus anciennes gardent leur score enregistré"
+            )
+            if rescore_mode != "Enregistrés":
+                history = rescore_history(history, score_weights if rescore_mode == "Pondération active" else None)
+            full_history = history
+
             # Dédupliquer par semaine (garder 1 entrée par semaine ISO)
             from datetime import datetime as dt
             week_entries = {}
@@ -4223,10 +6936,18 @@ def main():
                     latest_entry = next(e for e in history if e["date"] == latest_date)
 
                     var_rows = []
+                    excluded_components = set()
+                    history_index = build_history_index(full_history)
                     for candidate_name in color_map.keys():
                         if candidate_name in latest_entry.get("scores", {}):
                             current = latest_entry["scores"][candidate_name]["total"]
-                            hist = get_historical_comparison(candidate_name, current, latest_date)
+                            hist = get_historical_comparison(candidate_name, current, latest_date,
+                                                             history_index=history_index,
+                                                             current_values=latest_entry["scores"][candidate_name],
+                                                             current_missing=latest_entry.get("missing", ()),
+                                                             current_version=latest_entry.get("score_version", 1))
+                            for components in hist.get("excluded", {}).values():
+                                excluded_components.update(components)
 
                             if hist.get("available"):
                                 changes = hist.get("changes", {})
@@ -4248,6 +6969,11 @@ def main():
                             var_rows.append(row)
 
                     st.dataframe(pd.DataFrame(var_rows), width="stretch", hide_index=True)
+                    if excluded_components:
+                        labels = {"trends": "Trends", "press": "Presse", "wiki": "Wikipedia", "youtube": "YouTube"}
+                        st.caption("Certaines variations sont calculées hors "
+                                   + ", ".join(labels[c] for c in SCORE_COMPONENTS if c in excluded_components)
+                                   + " (non reconstitué pour une date passée, ou calcul modifié depuis l'entrée comparée)")
         else:
             st.info("Aucun historique disponible")
 
@@ -4611,5 +7337,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    if "--backfill" in sys.argv:
+        run_backfill_cli(sys.argv[1:])
+    else:
+        main()
 
@@ -0,0 +1,465 @@
+"""
+Tests des fonctions pures de app.py (agrégations, historique, scoring, recherche)
+Lancement : python -m pytest -q
+"""
+
+import json
+import os
+import threading
+import sys
+from collections import Counter
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Chaque test tourne dans un dossier vide (caches JSON absents)"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def day_str(offset: int) -> str:
+    return (date.today() - timedelta(days=offset)).strftime("%Y-%m-%d")
+
+
+def article(url: str, domain: str, offset: int = 1, title: str = "") -> dict:
+    return {"title": title or f"Titre {url}", "url": url, "domain": domain, "date": day_str(offset)}
+
+
+def video(vid: str, views: int, offset: int = 1, is_short: bool = False) -> dict:
+    return {"id": vid, "title": f"Video {vid}", "views": views, "likes": 0, "comments": 0,
+            "published": day_str(offset) + "T08:00:00Z", "is_short": is_short, "channel": "Chaine"}
+
+
+def rollup_for(names, articles_by_name, videos_by_name):
+    table = app.build_mention_table(names, articles_by_name, videos_by_name)
+    rollup = app._new_rollup(names)
+    app.update_rollup_from_table(rollup, table)
+    return table, rollup
+
+
+# =============================================================================
+# ROLLUPS ET ESQUISSES DE DOMAINES
+# =============================================================================
+
+def test_rollup_counts_shared_video_for_each_candidate():
+    shared = video("v1", 1000)
+    _, rollup = rollup_for(["A", "B"], {}, {"A": [shared], "B": [dict(shared)]})
+    window = app.rollup_window(rollup, date.today() - timedelta(days=7), date.today())
+    assert app.rollup_youtube_stats(window, 0)["total_views"] == 1000
+    assert app.rollup_youtube_stats(window, 1)["total_views"] == 1000
+
+
+def test_rollup_forgets_items_that_left_the_cache():
+    _, rollup = rollup_for(["A"], {}, {"A": [video("v1", 1000)]})
+    table = app.build_mention_table(["A"], {}, {"A": []})
+    app.update_rollup_from_table(rollup, table)
+    window = app.rollup_window(rollup, date.today() - timedelta(days=7), date.today())
+    assert app.rollup_youtube_stats(window, 0)["total_views"] == 0
+    assert app.rollup_youtube_stats(window, 0)["video_count"] == 0
+
+
+def test_rollup_window_matches_direct_sums():
+    rng = np.random.default_rng(3)
+    videos = {n: [video(f"{n}{i}", int(rng.integers(0, 5000)), int(rng.integers(0, 30)), bool(rng.integers(0, 2)))
+                  for i in range(40)] for n in ("A", "B", "C")}
+    _, rollup = rollup_for(list(videos), {}, videos)
+    start, end = date.today() - timedelta(days=13), date.today() - timedelta(days=2)
+    window = app.rollup_window(rollup, start, end)
+    for ci, name in enumerate(videos):
+        in_window = [v for v in videos[name] if start.isoformat() <= v["published"][:10] <= end.isoformat()]
+        stats = app.rollup_youtube_stats(window, ci)
+        assert stats["total_views"] == sum(v["views"] for v in in_window)
+        assert stats["shorts_count"] == sum(v["is_short"] for v in in_window)
+        direct = app.compute_youtube_stats_from_videos(in_window)
+        assert {k: direct[k] for k in stats} == stats
+
+
+def test_incremental_rollup_update_matches_full_rebuild():
+    articles = {"A": [article("u-a1", "lemonde.fr", 3)], "B": [article("u-b1", "rtl.fr", 2)]}
+    videos = {"A": [video("a1", 500, 4)], "B": [video("b1", 800, 1)]}
+    _, rollup = rollup_for(["A", "B"], articles, videos)
+
+    # B rafraîchi : nouvelle vidéo plus ancienne (la plage de jours s'élargit), un article remplacé
+    videos["B"] = [video("b1", 900, 1), video("b2", 100, 12)]
+    articles["B"] = [article("u-b2", "lefigaro.fr", 5)]
+    table = app.build_mention_table(["A", "B"], articles, videos)
+    app.update_rollup_from_table(rollup, table, changed=[1])
+    _, full = rollup_for(["A", "B"], articles, videos)
+    assert rollup["day0"] == full["day0"]
+    assert np.array_equal(rollup["values"], full["values"])
+    assert set(rollup["domain_sketches"]) == set(full["domain_sketches"])
+
+    # Sentiment analysé après coup : seules les colonnes de sentiment bougent
+    table["sentiment"][:] = 0.5
+    app.update_rollup_from_table(rollup, table, sentiment_only=True)
+    full = app._new_rollup(["A", "B"])
+    app.update_rollup_from_table(full, table)
+    assert np.array_equal(rollup["values"], full["values"])
+
+def test_domain_sketches_match_exact_table_counts():
+    shared = article("u-shared", "lemonde.fr")
+    articles = {
+        "A": [shared, article("u-a", "lefigaro.fr")],
+        "B": [dict(shared)],
+        "C": [article(f"u-c{i}", f"media{i % 7}.fr", i % 10) for i in range(30)],
+    }
+    table, rollup = rollup_for(list(articles), articles, {})
+    start, end = date.today() - timedelta(days=30), date.today()
+    exact = app.table_press_stats(table, start, end)
+    sketched = app.rollup_distinct_domains(rollup, start, end)
+    assert list(sketched) == [exact[name]["domains"] for name in articles]
+    assert list(sketched) == [2, 1, 7]
+
+
+def test_hll_sketch_estimate_is_close_for_large_sets():
+    sketches = []
+    for d in range(5):
+        sketch = app.new_domain_sketch()
+        for i in range(400):
+            app.sketch_add(sketch, f"site{d * 200 + i}.fr")  # Recouvrement d'un jour à l'autre
+        sketches.append(sketch)
+    assert sketches[0]["registers"] is not None
+    estimate = app.sketch_count(app.merge_domain_sketches(sketches))
+    assert abs(estimate - 1200) / 1200 < 0.1
+
+
+# =============================================================================
+# HISTORIQUE - RÉTENTION PAR PALIERS ET FUSION CLOUD
+# =============================================================================
+
+TODAY = date(2026, 10, 19)
+
+
+def history_entry(day: date, total: float, timestamp: str = "2026-10-01T00:00:00") -> dict:
+    return {"date": day.isoformat(), "timestamp": timestamp, "period": "7 jours",
+            "scores": {"A": {"total": total, "press": 10}}}
+
+
+def week_days(weeks_ago: int):
+    """Lundi..vendredi d'une semaine dans le palier hebdomadaire"""
+    monday = TODAY - timedelta(days=TODAY.weekday() + 7 * weeks_ago)
+    return [monday + timedelta(days=i) for i in range(5)]
+
+
+def test_merge_histories_does_not_double_count_aggregated_days():
+    dailies = [history_entry(d, 6.0 + i) for i, d in enumerate(week_days(20))]
+    aggregate = app.compact_history(dailies, TODAY)
+    assert len(aggregate) == 1 and aggregate[0]["samples"] == 5
+
+    merged = app.merge_histories(dailies, aggregate, TODAY)
+    assert len(merged) == 1
+    assert merged[0]["samples"] == 5
+    assert merged[0]["scores"]["A"]["total"] == aggregate[0]["scores"]["A"]["total"] == 8.0
+
+    assert app.merge_histories(aggregate, dailies, TODAY) == merged
+
+
+def test_merge_histories_keeps_dailies_after_the_aggregate():
+    days = week_days(20)
+    aggregate = app.compact_history([history_entry(d, 10.0) for d in days[:4]], TODAY)
+    merged = app.merge_histories([history_entry(days[4], 20.0)], aggregate, TODAY)
+    assert merged[0]["samples"] == 5
+    assert merged[0]["scores"]["A"]["total"] == 12.0
+
+
+def test_merge_histories_newest_timestamp_wins_for_dailies():
+    day = TODAY - timedelta(days=3)
+    old = history_entry(day, 10.0, "2026-10-16T08:00:00")
+    new = history_entry(day, 30.0, "2026-10-16T20:00:00")
+    assert app.merge_histories([old], [new], TODAY) == [new]
+    assert app.merge_histories([new], [old], TODAY) == [new]
+
+
+def test_compact_history_tiers_and_idempotence():
+    history = [history_entry(TODAY - timedelta(days=k), float(k)) for k in range(500)]
+    compacted = app.compact_history(history, TODAY)
+    resolutions = Counter(h.get("resolution", "day") for h in compacted)
+    assert resolutions["day"] == app.HISTORY_DAILY_DAYS
+    assert 0 < resolutions["week"] <= 45 and resolutions["month"] > 0
+    assert sum(h.get("samples", 1) for h in compacted) == 500
+    assert app.compact_history(compacted, TODAY) == compacted
+
+
+def test_historical_comparison_excludes_components_missing_from_past_dated_entries():
+    live = {"date": "2026-10-19", "score_version": 2, "scores": {"A": {"total": 50.0, "contrib_youtube": 10.0}}}
+    as_of = {"date": "2026-10-02", "score_version": 2, "as_of": True, "missing": ["youtube"],
+             "scores": {"A": {"total": 35.0, "contrib_youtube": 0.0}}}
+    legacy = {"date": "2026-09-01", "score_version": 2, "scores": {"A": {"total": 20.0}}}
+    index = app.build_history_index([legacy, as_of, live])
+
+    comparison = app.get_historical_comparison("A", 50.0, "2026-10-19", history_index=index,
+                                               current_values=live["scores"]["A"])
+    assert comparison["changes"] == {"7j": 5.0, "14j": 5.0, "30j": 30.0}  # (50 - 10) - (35 - 0)
+    assert comparison["excluded"] == {"7j": ["youtube"], "14j": ["youtube"]}
+
+    # Entrée courante « date passée » face à une entrée sans contributions : pas comparable
+    comparison = app.get_historical_comparison("A", 50.0, "2026-10-19", history_index=index,
+                                               current_values=live["scores"]["A"], current_missing=["youtube"])
+    assert comparison["changes"]["30j"] is None
+
+
+def test_historical_comparison_excludes_press_across_score_versions():
+    before_dedup = {"date": "2026-10-05", "scores": {"A": {"total": 40.0, "contrib_press": 20.0}}}
+    current = {"total": 45.0, "contrib_press": 12.0}
+    index = app.build_history_index([before_dedup])
+
+    comparison = app.get_historical_comparison("A", 45.0, "2026-10-19", history_index=index,
+                                               current_values=current)
+    assert comparison["changes"]["14j"] == 13.0  # (45 - 12) - (40 - 20)
+    assert comparison["excluded"]["14j"] == ["press"]
+
+    # Deux entrées de la même version : totaux comparés tels quels
+    comparison = app.get_historical_comparison("A", 45.0, "2026-10-19", history_index=index,
+                                               current_values=current, current_version=1)
+    assert comparison["changes"]["14j"] == 5.0 and comparison["excluded"] == {}
+
+
+def test_aggregating_past_dated_entries_keeps_the_missing_components():
+    days = week_days(20)
+    entries = [history_entry(d, 10.0) for d in days[:3]]
+    entries[1].update(as_of=True, missing=["youtube"])
+    (aggregate,) = app.compact_history(entries, TODAY)
+    assert aggregate["as_of"] is True and aggregate["missing"] == ["youtube"]
+
+
+# =============================================================================
+# TRENDS - FENÊTRES HORS PÉRIODES FIXES
+# =============================================================================
+
+def test_trends_window_reuses_one_daily_series_and_leaves_fixed_period_state(monkeypatch):
+    app.get_trends_window.clear()
+    calls = []
+
+    def fake_series(keywords, start, end):
+        calls.append((start, end))
+        days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+        return {"series": {"A": {d: 50.0 for d in days}, "B": {d: 25.0 for d in days}}, "errors": []}
+
+    monkeypatch.setattr(app, "fetch_trends_daily_series", fake_series)
+    first = app.get_trends_window(["A", "B"], date.today() - timedelta(days=20), date.today() - timedelta(days=7))
+    second = app.get_trends_window(["B", "A"], date.today() - timedelta(days=40), date.today() - timedelta(days=27))
+    assert first["scores"] == second["scores"] == {"A": 100.0, "B": 50.0}
+    assert len(calls) == 1
+    assert not os.path.exists(app.TRENDS_CACHE_FILE)  # Ni compteur de refresh ni last_valid écrits
+
+# =============================================================================
+# RECHERCHE BM25 DES TITRES
+# =============================================================================
+
+def write_press_cache(data: dict, mtime: float):
+    path = app.get_context_files("paris")["press_cache"]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"data": data}, f)
+    os.utime(path, (mtime, mtime))
+
+
+def test_title_index_keeps_shared_articles_per_candidate_and_drops_removed_ones():
+    app.get_title_index_store.clear()
+    shared = article("u-shared", "lemonde.fr", title="Budget de la ville voté au conseil")
+    write_press_cache({
+        "Alice": {"fetched_at": "t1", "articles": [shared]},
+        "Bruno": {"fetched_at": "t1", "articles": [dict(shared), article("u-b", "lefigaro.fr", title="Métro ligne 15")]},
+    }, 1000)
+    app.refresh_title_index(("paris",))
+    hits = app.search_title_index("budget conseil")
+    assert len(hits) == 2 and any("Alice" in h for h in hits) and any("Bruno" in h for h in hits)
+
+    # Réindexation d'Alice seule : le document de Bruno reste
+    write_press_cache({
+        "Alice": {"fetched_at": "t2", "articles": [shared]},
+        "Bruno": {"fetched_at": "t1", "articles": [dict(shared), article("u-b", "lefigaro.fr", title="Métro ligne 15")]},
+    }, 2000)
+    app.refresh_title_index(("paris",))
+    assert len(app.search_title_index("budget conseil")) == 2
+
+    # Bruno quitte le cache : ses titres disparaissent de l'index
+    write_press_cache({"Alice": {"fetched_at": "t2", "articles": [shared]}}, 3000)
+    app.refresh_title_index(("paris",))
+    hits = app.search_title_index("budget conseil")
+    assert len(hits) == 1 and "Alice" in hits[0]
+    assert app.search_title_index("metro") == []
+
+
+# =============================================================================
+# CHATBOT - CACHE DES RÉPONSES ET ENVOI DES LOGS
+# =============================================================================
+
+def test_cached_chatbot_answer_is_yielded_outside_the_lock(monkeypatch):
+    app.get_chatbot_answer_store.clear()
+
+    def fake_stream(question, data_context, api_key):
+        yield "Réponse"
+        return True
+
+    monkeypatch.setattr(app, "stream_chatbot_response", fake_stream)
+    assert list(app.stream_cached_chatbot_response("Qui progresse ?", "ctx", "k")) == ["Réponse"]
+
+    hit = app.stream_cached_chatbot_response("qui progresse", "ctx", "k")
+    assert next(hit) == "Réponse"
+    assert not app.get_chatbot_answer_store()["lock"].locked()
+    hit.close()
+
+
+def run_chat_log_worker(monkeypatch, upload):
+    monkeypatch.setattr(app, "CHAT_LOG_BATCH_DELAY", 0)
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    monkeypatch.setattr(app, "upload_chat_logs", upload)
+    with open(app.CHAT_LOG_SPOOL_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"question": "q", "response": "r"}) + "\n")
+    store = {"lock": threading.Lock(), "thread": None}
+    worker = threading.Thread(target=app._chat_log_worker, args=(store,), daemon=True)
+    store["thread"] = worker
+    worker.start()
+    worker.join(5)
+    return store
+
+
+def test_chat_log_worker_counts_upload_errors_as_failures_and_releases_the_thread(monkeypatch):
+    calls = []
+
+    def broken_upload(batch):
+        calls.append(len(batch))
+        raise ValueError("record inattendu")
+
+    store = run_chat_log_worker(monkeypatch, broken_upload)
+    assert calls == [1, 1, 1]
+    assert store["thread"] is None
+    assert os.path.exists(app.CHAT_LOG_SENDING_FILE)  # Lot gardé pour le prochain envoyeur
+
+    store = run_chat_log_worker(monkeypatch, lambda batch: calls.append(len(batch)) or True)
+    assert calls[-1] == 2
+    assert store["thread"] is None
+    assert not os.path.exists(app.CHAT_LOG_SENDING_FILE)
+
+
+# =============================================================================
+# SENSIBILITÉ DU CLASSEMENT
+# =============================================================================
+
+def stability_inputs(articles_by_cid: dict):
+    cids = list(articles_by_cid)
+    data = {cid: {"press": {"articles": arts}, "youtube": {"videos": []}} for cid, arts in articles_by_cid.items()}
+    metrics = {
+        "candidates": cids,
+        "wiki_views": [1000] * len(cids),
+        "press_count": [len({a["url"] for a in arts}) for arts in articles_by_cid.values()],
+        "press_domains": [len({a["domain"] for a in arts}) for arts in articles_by_cid.values()],
+        "trends_score": [10.0] * len(cids),
+        "youtube_views": [0] * len(cids),
+        "youtube_available": [False] * len(cids),
+        "period_days": 7,
+    }
+    return data, metrics
+
+
+def test_rank_stability_breaks_ties_by_displayed_order():
+    data, metrics = stability_inputs({"a": [], "b": []})
+    stability = app.rank_stability(data, metrics, n_samples=50, display_order=["b", "a"])
+    assert stability["rank_probs"].tolist() == [[0.0, 1.0], [1.0, 0.0]]
+    stability = app.rank_stability(data, metrics, n_samples=50)
+    assert stability["rank_probs"].tolist() == [[1.0, 0.0], [0.0, 1.0]]
+
+
+def test_rank_stability_bootstrap_is_centered_on_observed_counts(monkeypatch):
+    articles = [article(f"u{i}", f"media{i}.fr") for i in range(40)]
+    data, metrics = stability_inputs({"a": articles})
+    captured = {}
+    batch = app.calculate_scores_batch
+
+    def spy(**kwargs):
+        captured.update(kwargs)
+        return batch(**kwargs)
+
+    monkeypatch.setattr(app, "calculate_scores_batch", spy)
+    app.rank_stability(data, metrics, n_samples=500)
+    assert captured["press_count"].mean() == pytest.approx(40)
+    assert captured["press_domains"].mean() == pytest.approx(40)
+    assert captured["press_count"].std() > 0
+
+
+# =============================================================================
+# DÉDUPLICATION DES TITRES (MINHASH / LSH)
+# =============================================================================
+
+def test_cluster_near_duplicates_groups_syndicated_titles_only():
+    texts = [app.normalize_title(title, domain) for title, domain in [
+        ("Paris : le budget participatif 2026 adopté au conseil municipal - Le Monde", "Le Monde"),
+        ("Paris: le budget participatif 2026 adopté au Conseil municipal - Le Figaro", "Le Figaro"),
+        ("Ligne 15 du métro : nouveau retard annoncé pour la section est", ""),
+        ("", ""),
+        ("", ""),
+    ]]
+    assert texts[0] == texts[1]
+    labels = app.cluster_near_duplicates(texts).tolist()
+    assert labels[:3] == [0, 0, 2]
+    assert labels[3:] == [3, 4]  # Titres vides jamais regroupés
+
+
+def test_cluster_near_duplicates_matches_exact_jaccard_on_variants():
+    base = "la maire de paris presente son plan velo pour les jeux et au dela"
+    texts = [base, base + " selon la prefecture", "un tout autre sujet sur les transports franciliens"]
+    labels = app.cluster_near_duplicates(texts).tolist()
+    assert labels == [0, 0, 2]
+
+
+def test_assign_story_ids_counts_distinct_stories():
+    articles = [
+        {"title": "Budget de Paris : la majorité vote le texte - Le Parisien", "domain": "Le Parisien", "url": "a"},
+        {"title": "Budget de Paris : la majorité vote le texte - RTL", "domain": "RTL", "url": "b"},
+        {"title": "Anne Hidalgo inaugure une nouvelle piste cyclable", "domain": "BFMTV", "url": "c"},
+    ]
+    assert app.assign_story_ids(articles) == 2
+    assert articles[0]["story_id"] == articles[1]["story_id"] != articles[2]["story_id"]
+
+
+# =============================================================================
+# SCORE - MOTEUR VECTORISÉ
+# =============================================================================
+
+def test_calculate_scores_batch_matches_calculate_score():
+    rng = np.random.default_rng(7)
+    n_cand, n_periods = 6, 4
+    wiki = rng.integers(0, 50000, size=(n_cand, n_periods))
+    press = rng.integers(0, 80, size=(n_cand, n_periods))
+    domains = np.minimum(press, rng.integers(0, 30, size=(n_cand, n_periods)))
+    trends = rng.uniform(0, 100, size=(n_cand, n_periods))
+    views = rng.integers(0, 2_000_000, size=(n_cand, n_periods))
+    available = rng.integers(0, 2, size=(n_cand, n_periods)).astype(bool)
+    available[0] = True  # Au moins une chaîne disponible par période
+    period_days = [1, 7, 14, 30]
+
+    batch = app.calculate_scores_batch(wiki, press, domains, trends, views, available, period_days)
+    for col, days in enumerate(period_days):
+        for ci in range(n_cand):
+            scalar = app.calculate_score(
+                int(wiki[ci, col]), int(press[ci, col]), int(domains[ci, col]), float(trends[ci, col]),
+                int(views[ci, col]), bool(available[ci, col]), days,
+                all_candidates_press=press[:, col].tolist(), all_candidates_wiki=wiki[:, col].tolist(),
+                all_candidates_youtube=views[:, col].tolist())
+            for key in scalar:
+                assert batch[key][ci, col] == scalar[key], (key, ci, col)
+
+
+def test_tv_radio_mentions_are_searchable_and_deduplicated_with_press():
+    app.get_title_index_store.clear()
+    title = "Sarah Knafo invitée de la matinale"
+    write_press_cache({"Sarah Knafo": {"fetched_at": "t1", "articles": [
+        {"title": title, "url": "u-press", "domain": "BFMTV", "date": day_str(1)}]}}, 1000)
+    app.refresh_title_index(("paris",))
+    mention = app.Mention(title=title, source="BFMTV", media="BFMTV", date=day_str(1), url="u-tv")
+    app.index_tv_radio_mentions("Sarah Knafo", [mention])
+    assert app.search_title_index("matinale") == [
+        f'- [TV/Radio] Sarah Knafo: "{title}" (BFMTV, {day_str(1)})']
+
+    radio = app.Mention(title="Sarah Knafo sur RTL ce matin", source="RTL", media="RTL", date=day_str(1), url="u-rtl")
+    app.index_tv_radio_mentions("Sarah Knafo", [radio])
+    assert len(app.search_title_index("rtl matin")) == 1
+    assert app.search_title_index("matinale") == [f'- [TV/Radio] Sarah Knafo: "{title}" (BFMTV, {day_str(1)})']